@@ -12,6 +12,25 @@ What this program does:
 ==================================================
 """
 
+import asyncio
+import bisect
+import gc
+import json
+import operator
+import os
+import pickle
+import random
+import shlex
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import zlib
+
 # ============================================================
 # GLOBAL DATA STRUCTURES
 # ============================================================
@@ -23,6 +42,49 @@ reservations_list = []
 # It's like organizing by room instead of by order
 room_reservations = {}
 
+# This dictionary finds a reservation straight from its ID (like "RES1000")
+reservation_index = {}
+
+# Where each reservation sits in reservations_list, so deleting one doesn't need a search
+# After a delete, the positions from positions_valid_until onward can be off -
+# they get renumbered the next time we need one of them
+reservation_positions = {}
+positions_valid_until = 0
+
+# Guest name search index (names are stored in lower case)
+# name_groups["maria santos"] = every reservation made under that name
+# name_trigrams["ari"] = the set of names that contain "ari" somewhere
+name_groups = {}
+name_trigrams = {}
+
+# Every reservation sorted by check-in day and by check-out day (2 matching lists each)
+# so date range searches, arrivals and departures are a binary search plus a slice
+checkin_index = {"days": [], "records": []}
+checkout_index = {"days": [], "records": []}
+
+# Which reservation IDs have each status and each payment status
+# status_index["Active"] = {"RES1000", ...}, payment_status_index["Paid"] = {...}
+# Updated every time a reservation is saved, so screens that only want (say) the unpaid
+# bookings don't have to look through the whole history
+status_index = {}
+payment_status_index = {}
+
+# Which reservation IDs belong to each group booking
+# group_index["GRP1000"] = {"RES1000", "RES1001", ...}
+group_index = {}
+
+# Active reservations that still owe money, biggest balance first
+# "entries" is a sorted list of (-balance in centavos, ID length, ID) - the ID parts keep ties
+# in the order the reservations were made (RES999 before RES1000)
+# "keys" remembers each reservation's entry so it can be found again, "total" is the sum owed
+outstanding_index = {"entries": [], "keys": {}, "total": 0}
+
+# This dictionary keeps the nights each room is booked for (Active reservations only)
+# Every room has 3 lists sorted by check-in day so we can binary search them:
+#   "starts" = check-in day numbers, "ends" = check-out day numbers, "ids" = reservation IDs
+# A stay covers the nights from check-in up to (but not including) check-out
+room_calendar = {}
+
 # All the different room types we have and their prices
 room_types = {
     "1": {"type": "Standard Single", "price": 1500, "capacity": 1},
@@ -41,6 +103,37 @@ available_rooms = {
     "5": [501, 502]
 }
 
+# Nightly inventory calendar for each room type
+# room_type_nights["1"][day_number] is a bitset (stored as an int) with one bit per room:
+# bit i is switched on when available_rooms["1"][i] is booked for that night
+# Nights with nothing booked are simply left out of the dictionary
+room_type_nights = {}
+
+# Which room type and which bit each room number uses in those bitsets
+room_bits = {}
+
+# Answers to quote searches we already worked out (see get_quotes)
+# quote_cache[(check-in, check-out, guests)] = the quotes
+# quote_cache_nights[night] = the cache keys whose stay includes that night, so a booking
+# only throws away the quotes for the nights it changes
+quote_cache = {}
+quote_cache_nights = {}
+
+# Start over once this many different searches are remembered
+QUOTE_CACHE_SIZE = 10000
+for _type_key, _rooms in available_rooms.items():
+    room_type_nights[_type_key] = {}
+    for _position, _room in enumerate(_rooms):
+        room_bits[_room] = (_type_key, 1 << _position)
+
+# Sorted copies of reservations_list we keep around, so sorting the same way again is instant
+# sorted_views[(fields, descending)] = {"records": [...sorted...], "keys": {reservation_id: sort key}}
+# A view is only thrown away when a change touches one of the fields it is sorted by
+sorted_views = {}
+
+# The most guests one reservation screen takes (more than 6 becomes a group booking over several rooms)
+GROUP_MAX_GUESTS = 100
+
 # Keeps track of what number to use for the next reservation ID
 reservation_id_counter = 1000
 
@@ -58,6 +151,55 @@ reservation_payments = {}
 # Keeps track of what number to use for the next payment ID
 payment_id_counter = 5000
 
+# Running totals for the reports, updated with every booking change, payment and refund
+# Money is kept in centavos (whole numbers) so adding and taking away never drifts,
+# which means the totals always match adding everything up from scratch
+ledger = {
+    "payments_total": 0,            # money received (payments only)
+    "refunds_total": 0,             # money given back (as a positive number)
+    "transaction_count": 0,         # payments + refunds
+    "payment_count": 0,             # payments only
+    "method_totals": {},            # payment method -> money received
+    "method_counts": {},            # payment method -> number of payments
+    "reservation_count": 0,
+    "status_counts": {},            # "Active"/"Cancelled" -> number of reservations
+    "revenue_total": 0,             # total_cost of every reservation
+    "active_revenue": 0,            # total_cost of active reservations
+    "type_revenues": {},            # room type -> total_cost of its reservations
+    "active_guests": 0,             # guests on active reservations
+    "guest_count_distribution": {}  # number of guests -> active reservations with that many
+}
+
+# Day-by-day buckets for the date range reports (centavos, days with nothing are left out)
+#   rollups[("payments", "Cash")][day] = cash received on that day (by payment date)
+#   rollups[("refunds", "Cash")][day]  = cash refunded on that day
+#   rollups[("room_nights", "Deluxe Suite")][day] = change in the nightly room rate total on that day
+#       (an active booking adds its rate on its check-in night and takes it away on its check-out day)
+#   rollups[("rooms_booked", "Deluxe Suite")][day] = change in the number of rooms booked on that day
+#       (+1 on an active booking's check-in night, -1 on its check-out day - a difference array)
+rollups = {}
+
+# The series whose buckets hold changes (a night's value is all the changes up to it added together)
+change_series = ("room_nights", "rooms_booked")
+
+# Fenwick trees (binary indexed trees) over those buckets, so the total for any date range
+# takes two O(log n) walks, and a change to a bucket is one O(log n) update of its tree
+# rollup_trees[series] = {"first_day": day, "sums": [...], "weighted": [...] or None}
+# (see get_rollup_tree). A tree is only built the first time its series is asked about
+rollup_trees = {}
+
+# The same totals for whole months (key = day number of the 1st of the month)
+#   rollup_months[("payments", "Cash")][month] = cash received in that month
+#   rollup_months[("room_nights", "Deluxe Suite")][month] = room revenue earned on that month's nights
+#   rollup_months[("rooms_booked", "Deluxe Suite")][month] = room nights booked in that month
+rollup_months = {}
+
+# (1st of the month, 1st of the next month) for each day number we've looked up
+month_bounds = {}
+
+# When this is on (--verify-ledger), the totals are checked against a full recount after every menu option
+ledger_verify = False
+
 # Different ways guests can pay
 payment_methods = {
     "1": "Cash",
@@ -67,6 +209,190 @@ payment_methods = {
     "5": "Digital Wallet"
 }
 
+# ============================================================
+# DATA PERSISTENCE (JOURNAL)
+# ============================================================
+
+# Every change gets written to this file so nothing is lost if the program crashes
+JOURNAL_FILE = "hotel_data.journal"
+
+# Group commit: changes wait in memory and get written + synced to disk together
+# once this many are waiting, or once this many seconds have passed
+JOURNAL_GROUP_SIZE = 256
+JOURNAL_GROUP_SECONDS = 0.05
+
+# The open journal file (None means we're not saving anything, e.g. in tests)
+journal_file = None
+
+# Changes waiting for the next group commit: (sequence number, operation, data)
+journal_buffer = []
+
+# When the last group commit happened, the number given to the last change,
+# and the number of the last change that's safely on disk
+journal_last_commit = 0.0
+journal_sequence = 0
+journal_synced_sequence = 0
+
+# While this is True the journal never commits on its own, so a group booking's rooms
+# all end up in the same block (they're either all saved or, after a crash, none are)
+journal_holding = False
+
+# The network service sets this while it runs: then only its background thread commits
+# (see commit_regularly), so engine calls made on the event loop never wait for the disk
+journal_background = False
+
+# Only one thread at a time writes to the journal (journal_writing is True while one does).
+# Engine calls don't wait for it - they only need engine_lock for a moment to add their changes
+# to journal_buffer - so while one thread waits for the disk, the others keep booking, and
+# their changes all go in the next block. Threads waiting to commit sleep on journal_writer
+# and are all woken when a block is done; the ones whose changes it had can go straight on
+journal_writer = threading.Condition()
+journal_writing = False
+
+# A snapshot is a copy of all the data in one compact file. Once it's saved, the
+# journal only needs the changes made after it, so startup is "load snapshot, replay the rest"
+SNAPSHOT_FILE = "hotel_data.snapshot"
+
+# Take a new snapshot once the journal has this many changes, or once this many
+# seconds have passed since the last one (and something changed)
+SNAPSHOT_EVERY_CHANGES = 50000
+SNAPSHOT_EVERY_SECONDS = 3600
+
+# Where snapshots get saved (None means snapshots are off), the number of the
+# last change the current snapshot includes, and when it was taken
+snapshot_path = None
+snapshot_sequence = 0
+snapshot_last_time = 0.0
+
+# ============================================================
+# DATA PERSISTENCE (SQLITE DATABASE - OPTIONAL)
+# ============================================================
+
+# Instead of the journal, data can be kept in a SQLite database (start with --db)
+# Then only the "working set" is loaded into memory: active reservations, and
+# cancelled ones that still have money paid (so they can be refunded)
+# Everything else stays in the database, and the search, sort, payment history
+# and report screens ask the database directly
+DATABASE_FILE = "hotel_data.db"
+
+# Which stored reservations make up the working set (the reservations_working index holds just these)
+DATABASE_WORKING_SET = "status = 'Active' OR total_paid > 0"
+
+# The open database connection (None means we're using the journal instead)
+db_connection = None
+
+
+# ============================================================
+# RECORD CLASSES
+# ============================================================
+
+class Record:
+    """
+    Base class for our reservation and payment records
+    Each record type lists its fields in __slots__, so Python stores just those
+    values instead of giving every record its own dictionary (uses way less memory)
+    It still works like a dictionary - record["guest_name"], record.get(...),
+    "balance" in record - so all the display code keeps working
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+    
+    def __setitem__(self, field, value):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        setattr(self, field, value)
+    
+    def __contains__(self, field):
+        return field in self.__slots__
+    
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+    
+    def keys(self):
+        return list(self.__slots__)
+    
+    def to_row(self):
+        """Returns the field values in __slots__ order (Reservation(*row) builds it back)"""
+        return [getattr(self, field) for field in self.__slots__]
+
+
+class Reservation(Record):
+    """
+    One hotel booking
+    Dates are day numbers (see date_to_ordinal) and times are minutes after midnight
+    group_id is the same for every room of a group booking (see book_group), None otherwise
+    room_locked is True when the room was picked by hand, so optimize_room_assignments leaves it alone
+    night_cents is what each night was booked at in centavos, in order - total_cost is their sum
+    and price_per_night only their average, for showing (None for bookings saved before it existed)
+    """
+    __slots__ = (
+        "id", "guest_name", "phone", "email", "num_guests",
+        "room_type", "room_number",
+        "check_in_date", "check_out_date", "check_in_time", "check_out_time",
+        "nights", "price_per_night", "total_cost",
+        "additional_charges", "total_paid", "balance",
+        "payment_status", "status", "group_id", "room_locked",
+        "night_cents"
+    )
+    
+    def __init__(self, id, guest_name, phone, email, num_guests, room_type, room_number,
+                 check_in_date, check_out_date, check_in_time, check_out_time,
+                 nights, price_per_night, total_cost,
+                 additional_charges=0.0, total_paid=0.0, balance=None,
+                 payment_status="Pending", status="Active", group_id=None, room_locked=False,
+                 night_cents=None):
+        self.id = id
+        self.guest_name = guest_name
+        self.phone = phone
+        self.email = email
+        self.num_guests = num_guests
+        self.room_type = room_type
+        self.room_number = room_number
+        self.check_in_date = check_in_date
+        self.check_out_date = check_out_date
+        self.check_in_time = check_in_time
+        self.check_out_time = check_out_time
+        self.nights = nights
+        self.price_per_night = price_per_night
+        self.total_cost = total_cost
+        self.additional_charges = additional_charges  # For room service, minibar, etc.
+        self.total_paid = total_paid  # Total amount paid so far
+        self.balance = total_cost if balance is None else balance  # Remaining balance
+        self.payment_status = payment_status  # Pending, Partial, Paid
+        self.status = status
+        self.group_id = group_id
+        self.room_locked = room_locked
+        self.night_cents = night_cents
+
+
+class Payment(Record):
+    """
+    One payment (or refund, stored with a negative amount) for a reservation
+    payment_date is a day number and payment_time is minutes after midnight
+    """
+    __slots__ = (
+        "id", "reservation_id", "guest_name", "amount", "payment_method",
+        "reference", "payment_date", "payment_time", "notes", "status"
+    )
+    
+    def __init__(self, id, reservation_id, guest_name, amount, payment_method,
+                 reference, payment_date, payment_time, notes, status):
+        self.id = id
+        self.reservation_id = reservation_id
+        self.guest_name = guest_name
+        self.amount = amount
+        self.payment_method = payment_method
+        self.reference = reference
+        self.payment_date = payment_date
+        self.payment_time = payment_time
+        self.notes = notes
+        self.status = status
+
 
 # ============================================================
 # UTILITY FUNCTIONS
@@ -316,110 +642,162 @@ def validate_email_input(prompt):
         return value
 
 
+def parse_date(value):
+    """
+    Turns a DD/MM/YYYY string (like 25/12/2026) into a day number (see date_to_ordinal)
+    Checks if it's a real date (no Feb 30th or stuff like that) - even handles leap years!
+    Raises ValueError saying what's wrong if it isn't
+    """
+    value = value.strip()
+    
+    # Check format
+    if value.count('/') != 2:
+        raise ValueError("Date must be in format DD/MM/YYYY.")
+    
+    parts = value.split('/')
+    
+    # Validate each part is numeric
+    if not (parts[0].isdigit() and parts[1].isdigit() and parts[2].isdigit()):
+        raise ValueError("Date must contain only numbers.")
+    
+    day = int(parts[0])
+    month = int(parts[1])
+    year = int(parts[2])
+    
+    # Validate ranges (updated for 2026)
+    if year < 2026 or year > 2035:
+        raise ValueError("Year must be between 2026 and 2035.")
+    
+    if month < 1 or month > 12:
+        raise ValueError("Month must be between 1 and 12.")
+    
+    # Days in each month (February has 29 in leap years)
+    days_in_month = get_days_in_month(year)
+    
+    if day < 1 or day > days_in_month[month - 1]:
+        raise ValueError(f"Day must be between 1 and {days_in_month[month - 1]} for month {month}.")
+    
+    return date_to_ordinal(day, month, year)
+
+
 def validate_date_input(prompt):
     """
     Makes sure dates are in the right format: DD/MM/YYYY (like 25/12/2026)
-    Checks if it's a real date (no Feb 30th or stuff like that)
-    Even handles leap years!
-    Returns the date broken down into day, month, and year
+    Keeps asking until they give us a real date (see parse_date)
+    Returns the date as a day number (see date_to_ordinal)
     """
     while True:
-        value = input(prompt).strip()
-        
-        # Check format
-        if value.count('/') != 2:
-            print("Error: Date must be in format DD/MM/YYYY. Please try again.")
-            continue
-        
-        parts = value.split('/')
-        
-        if len(parts) != 3:
-            print("Error: Date must be in format DD/MM/YYYY. Please try again.")
-            continue
-        
-        # Validate each part is numeric
-        if not (parts[0].isdigit() and parts[1].isdigit() and parts[2].isdigit()):
-            print("Error: Date must contain only numbers. Please try again.")
-            continue
-        
-        day = int(parts[0])
-        month = int(parts[1])
-        year = int(parts[2])
-        
-        # Validate ranges (updated for 2026)
-        if year < 2026 or year > 2035:
-            print("Error: Year must be between 2026 and 2035. Please try again.")
-            continue
-        
-        if month < 1 or month > 12:
-            print("Error: Month must be between 1 and 12. Please try again.")
-            continue
-        
-        # Days in each month
-        days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
-        
-        # Check for leap year
-        if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
-            days_in_month[1] = 29
-        
-        if day < 1 or day > days_in_month[month - 1]:
-            print(f"Error: Day must be between 1 and {days_in_month[month - 1]} for month {month}. Please try again.")
-            continue
-        
-        return {
-            "day": day,
-            "month": month,
-            "year": year,
-            "formatted": value
-        }
+        try:
+            return parse_date(input(prompt))
+        except ValueError as error:
+            print(f"Error: {error} Please try again.")
+
+
+def parse_time(value):
+    """
+    Turns a 24-hour HH:MM string (like 14:30 for 2:30 PM) into minutes after midnight (870)
+    Checks that hours are 0-23 and minutes are 0-59
+    Raises ValueError saying what's wrong if it isn't a good time
+    """
+    value = value.strip()
+    
+    # Check format
+    if value.count(':') != 1:
+        raise ValueError("Time must be in format HH:MM (e.g., 14:30).")
+    
+    parts = value.split(':')
+    
+    # Validate each part is numeric
+    if not (parts[0].isdigit() and parts[1].isdigit()):
+        raise ValueError("Time must contain only numbers.")
+    
+    hour = int(parts[0])
+    minute = int(parts[1])
+    
+    # Validate ranges
+    if hour < 0 or hour > 23:
+        raise ValueError("Hour must be between 0 and 23.")
+    
+    if minute < 0 or minute > 59:
+        raise ValueError("Minute must be between 0 and 59.")
+    
+    return hour * 60 + minute
 
 
 def validate_time_input(prompt):
     """
     Makes sure time is in 24-hour format: HH:MM (like 14:30 for 2:30 PM)
-    Checks that hours are 0-23 and minutes are 0-59
-    Automatically adds zeros so 1:00 becomes 01:00
-    Returns the time broken down into hours and minutes
+    Keeps asking until they give us a good time (see parse_time)
+    Returns the time as minutes after midnight (14:30 becomes 870)
+    format_time turns it back into HH:MM with zeros added, so 1:00 shows as 01:00
     """
     while True:
-        value = input(prompt).strip()
-        
-        # Check format
-        if value.count(':') != 1:
-            print("Error: Time must be in format HH:MM (e.g., 14:30). Please try again.")
-            continue
-        
-        parts = value.split(':')
-        
-        if len(parts) != 2:
-            print("Error: Time must be in format HH:MM. Please try again.")
-            continue
-        
-        # Validate each part is numeric
-        if not (parts[0].isdigit() and parts[1].isdigit()):
-            print("Error: Time must contain only numbers. Please try again.")
-            continue
-        
-        hour = int(parts[0])
-        minute = int(parts[1])
-        
-        # Validate ranges
-        if hour < 0 or hour > 23:
-            print("Error: Hour must be between 0 and 23. Please try again.")
-            continue
-        
-        if minute < 0 or minute > 59:
-            print("Error: Minute must be between 0 and 59. Please try again.")
-            continue
-        
-        # Normalize format to HH:MM (pad with zeros)
-        formatted_time = f"{hour:02d}:{minute:02d}"
-        
-        return {
-            "hour": hour,
-            "minute": minute,
-            "formatted": formatted_time
-        }
+        try:
+            return parse_time(input(prompt))
+        except ValueError as error:
+            print(f"Error: {error} Please try again.")
+
+
+def format_time(minutes):
+    """Turns minutes after midnight into an HH:MM string (pads with zeros)"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def is_leap_year(year):
+    """Leap years are every 4 years, except centuries that aren't divisible by 400"""
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def get_days_in_month(year):
+    """Returns how many days each month has in a year (February gets 29 in leap years)"""
+    if is_leap_year(year):
+        return [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    return [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+# How many days come before the 1st of each month in a normal (non-leap) year
+days_before_month = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+
+
+def date_to_ordinal(day, month, year):
+    """
+    Turns a date into one big day number (days since 1/1/0001, which is day 1)
+    Counts leap years properly so the numbers line up across years
+    Reservations and payments store dates like this, so two dates can be
+    compared or subtracted like normal numbers
+    """
+    prev_year = year - 1
+    days = prev_year * 365 + prev_year // 4 - prev_year // 100 + prev_year // 400
+    days += days_before_month[month - 1]
+    if month > 2 and is_leap_year(year):
+        days += 1
+    return days + day
+
+
+def ordinal_to_date(ordinal):
+    """Turns a day number back into (day, month, year)"""
+    # Jump close to the right year (400 years always have 146097 days), then fine tune
+    year = (ordinal - 1) * 400 // 146097 + 1
+    while date_to_ordinal(1, 1, year + 1) <= ordinal:
+        year += 1
+    while date_to_ordinal(1, 1, year) > ordinal:
+        year -= 1
+    
+    day = ordinal - date_to_ordinal(1, 1, year) + 1
+    month = 1
+    for days in get_days_in_month(year):
+        if day <= days:
+            break
+        day -= days
+        month += 1
+    
+    return day, month, year
+
+
+def format_date(ordinal):
+    """Turns a day number into a DD/MM/YYYY string for showing on screen"""
+    day, month, year = ordinal_to_date(ordinal)
+    return f"{day:02d}/{month:02d}/{year}"
 
 
 def compare_dates(date1, date2):
@@ -427,34 +805,19 @@ def compare_dates(date1, date2):
     Figures out which date comes first
     Returns: -1 if date1 is earlier, 0 if they're the same, 1 if date1 is later
     """
-    if date1["year"] != date2["year"]:
-        return -1 if date1["year"] < date2["year"] else 1
-    if date1["month"] != date2["month"]:
-        return -1 if date1["month"] < date2["month"] else 1
-    if date1["day"] != date2["day"]:
-        return -1 if date1["day"] < date2["day"] else 1
+    if date1 < date2:
+        return -1
+    if date1 > date2:
+        return 1
     return 0
 
 
 def calculate_nights(check_in, check_out):
     """
     Figures out how many nights someone is staying
-    Converts both dates to total days and then subtracts them
+    Both dates are day numbers, so it's just a subtraction
     """
-    # Convert dates to day numbers for simple calculation
-    days_in_month = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
-    
-    def date_to_days(date):
-        total = date["year"] * 365
-        for m in range(date["month"] - 1):
-            total += days_in_month[m]
-        total += date["day"]
-        return total
-    
-    in_days = date_to_days(check_in)
-    out_days = date_to_days(check_out)
-    
-    return out_days - in_days
+    return check_out - check_in
 
 
 def generate_reservation_id():
@@ -539,18 +902,20 @@ def find_reservation_with_search(reservations_to_search, title="Recent Reservati
     elif search_choice == 2:
         # By ID - allow alphanumeric (RES1000, etc)
         res_id = validate_string_input("Enter Reservation ID: ", min_length=4, max_length=20, allow_numbers=True)
-        for res in reservations_to_search:
-            if res["id"].lower() == res_id.lower():
-                reservation = res
-                break
+        reservation = get_reservation(res_id)
+        # Only accept it if it's one of the reservations we were asked to pick from
+        if reservation is not None and reservations_to_search is not reservations_list:
+            if reservation not in reservations_to_search:
+                reservation = None
     
     elif search_choice == 3:
         # By name
         guest_name = validate_string_input("Enter Guest Name: ", min_length=2, max_length=50)
-        matches = []
-        for res in reservations_to_search:
-            if guest_name.lower() in res["guest_name"].lower():
-                matches.append(res)
+        matches = search_guest_names(guest_name)
+        # Keep only the ones we were asked to pick from
+        if matches and reservations_to_search is not reservations_list:
+            allowed = set(map(id, reservations_to_search))
+            matches = [res for res in matches if id(res) in allowed]
         
         if not matches:
             print("\nNo matching reservations found.")
@@ -570,176 +935,3016 @@ def find_reservation_with_search(reservations_to_search, title="Recent Reservati
 
 
 # ============================================================
-# CORE FUNCTIONS - CRUDS OPERATIONS
+# ROOM AVAILABILITY FUNCTIONS
 # ============================================================
 
-def create_reservation():
+def get_room_type_key(room_type_name):
+    """Finds the room type key (1-5) that goes with a room type name"""
+    for key, info in room_types.items():
+        if info["type"] == room_type_name:
+            return key
+    return None
+
+
+def is_room_available(room, start, end, ignore_id=None):
     """
-    CREATE Operation - Makes a new hotel reservation
-    This shows how we add data to both our list and dictionary
-    Gets all the guest info, picks a room, sets dates, calculates cost
+    Checks if a room is free for the nights from start up to end (day numbers)
+    Uses binary search on the room's sorted calendar instead of looking at
+    every reservation the room ever had
+    ignore_id lets a reservation skip itself (useful when moving a booking)
     """
-    clear_screen()
-    print_header("CREATE NEW RESERVATION")
-    
-    print("\nPlease provide guest information:")
-    print_separator()
+    return find_room_conflict(room, start, end, ignore_id) is None
+
+
+def find_room_conflict(room, start, end, ignore_id=None):
+    """
+    Same check as is_room_available, but gives back the ID of a booking that's in the way
+    (None if the room is free for the nights from start up to end)
+    """
+    calendar = room_calendar.get(room)
+    if not calendar:
+        return None
     
-    # Collect guest information with validation
-    guest_name = validate_string_input("Guest Full Name: ", min_length=2, max_length=50)
-    guest_phone = validate_phone_input("Contact Number: ")
-    guest_email = validate_email_input("Email Address: ")
-    num_guests = validate_integer_input("Number of Guests: ", min_val=1, max_val=10)
+    # Every booking that starts before our check-out is left of this spot
+    pos = bisect.bisect_left(calendar["starts"], end)
     
-    print("\n")
-    print_separator()
-    print("ROOM SELECTION")
-    print_separator()
-    display_room_types()
+    # Bookings in a room never overlap, so their check-outs are sorted too
+    # We only need to walk back while a booking still runs past our check-in
+    idx = pos - 1
+    while idx >= 0 and calendar["ends"][idx] > start:
+        if calendar["ids"][idx] != ignore_id:
+            return calendar["ids"][idx]
+        idx -= 1
     
-    # Select room type with capacity validation
-    while True:
-        room_type_choice = validate_integer_input("\nSelect Room Type (1-5): ", min_val=1, max_val=5)
-        room_type_key = str(room_type_choice)
-        
-        # Check capacity
-        if num_guests > room_types[room_type_key]["capacity"]:
-            print(f"\nError: Selected room type can accommodate maximum {room_types[room_type_key]['capacity']} guest(s).")
-            print(f"You have {num_guests} guest(s). Please select a room type with sufficient capacity.")
-            
-            # Find suitable room types
-            suitable_rooms = []
-            for key, info in room_types.items():
-                if info["capacity"] >= num_guests:
-                    suitable_rooms.append((key, info))
-            
-            if suitable_rooms:
-                print(f"\nSuggested room types for {num_guests} guest(s):")
-                for key, info in suitable_rooms:
-                    print(f"  {key}. {info['type']} (capacity: {info['capacity']} guest(s), ₱{info['price']:,.2f}/night)")
+    return None
+
+
+def get_added_nights(old_start, old_end, new_start, new_end):
+    """
+    The nights a stay gets when it moves from old_start - old_end to new_start - new_end
+    Returns a list of (start, end) pieces: at most one before the old stay and one after it
+    """
+    added = []
+    if new_start < old_start:
+        added.append((new_start, min(new_end, old_start)))
+    if new_end > old_end:
+        added.append((max(new_start, old_end), new_end))
+    return added
+
+
+def find_date_change_conflict(reservation, new_start, new_end):
+    """
+    Checks if an active reservation's room is free for new dates - only the nights the change adds
+    are looked up (the nights it already has are its own), each with one binary search
+    Gives back the ID of a booking in the way, or None if the change is fine
+    """
+    if reservation["status"] != "Active":
+        return None
+    for start, end in get_added_nights(reservation["check_in_date"], reservation["check_out_date"], new_start, new_end):
+        conflict = find_room_conflict(reservation["room_number"], start, end, reservation["id"])
+        if conflict is not None:
+            return conflict
+    return None
+
+
+def get_free_room_bits(room_type_key, start, end):
+    """
+    Returns a bitset of the rooms of one type that are free for every night from start to end
+    ORs together the booked bits of each night, then flips them to get the free rooms
+    (the same as ANDing the free bitsets of every night)
+    """
+    nights = room_type_nights[room_type_key]
+    booked = 0
+    for night in range(start, end):
+        booked |= nights.get(night, 0)
+    all_rooms = (1 << len(available_rooms[room_type_key])) - 1
+    return all_rooms & ~booked
+
+
+def find_available_rooms(room_type_key, start, end, ignore_id=None):
+    """Returns the rooms of one type that are free for every night from start to end"""
+    free_bits = get_free_room_bits(room_type_key, start, end)
+    available = []
+    for position, room in enumerate(available_rooms[room_type_key]):
+        if free_bits >> position & 1:
+            available.append(room)
+        elif ignore_id is not None and is_room_available(room, start, end, ignore_id):
+            # Booked only by the reservation we're moving, so it still counts as free
+            available.append(room)
+    return available
+
+
+# Runs of free nights this short with a booking right after them are hard to sell
+# (hardly anyone books exactly that stay), so room assignment tries not to leave them
+ORPHAN_NIGHTS = 1
+
+
+def get_room_gaps(room, start, end, ignore_id=None):
+    """
+    How many free nights a room would have left right before and right after a stay
+    from start to end (the room must be free for it) - None on a side with no booking at all
+    """
+    calendar = room_calendar.get(room)
+    if not calendar:
+        return None, None
+    starts = calendar["starts"]
+    
+    # Bookings from pos onward start on or after our check-out, the ones before end by our check-in
+    pos = bisect.bisect_left(starts, end)
+    after = None
+    idx = pos
+    while idx < len(starts) and calendar["ids"][idx] == ignore_id:
+        idx += 1
+    if idx < len(starts):
+        after = starts[idx] - end
+    
+    before = None
+    idx = pos - 1
+    while idx >= 0 and calendar["ids"][idx] == ignore_id:
+        idx -= 1
+    if idx >= 0:
+        before = start - calendar["ends"][idx]
+    return before, after
+
+
+def pick_room(room_type_key, start, end, ignore_id=None):
+    """
+    Auto-assign: picks the free room of a type where a stay from start to end fits best
+    First choice is a room where it leaves no short hole (see ORPHAN_NIGHTS), then one with
+    bookings close by on both sides (best fit), so long free stretches stay in one piece
+    Returns None if no room of that type is free
+    """
+    best_room = None
+    best_score = None
+    for room in find_available_rooms(room_type_key, start, end, ignore_id):
+        short_holes = 0
+        open_sides = 0
+        free_nights = 0
+        for gap in get_room_gaps(room, start, end, ignore_id):
+            if gap is None:
+                open_sides += 1
             else:
-                print(f"\nSorry, no single room can accommodate {num_guests} guest(s).")
-                print(f"Maximum capacity per room is 6 guests (Presidential Suite).")
-                print("\nSuggestions:")
-                print("  1. Book multiple rooms for your group")
-                print("  2. Reduce number of guests")
-                print("  3. Cancel and create separate reservations")
-                
-                print("\nWould you like to:")
-                print("1. Continue anyway (select best available room)")
-                print("2. Cancel this reservation")
-                
-                choice = validate_integer_input("\nSelect option (1-2): ", min_val=1, max_val=2)
-                if choice == 2:
-                    print("\nReservation cancelled.")
-                    pause()
-                    return
-                else:
-                    print(f"\nContinuing with room selection. Note: Room may not fit all {num_guests} guests.")
-            
+                free_nights += gap
+                if 0 < gap <= ORPHAN_NIGHTS:
+                    short_holes += 1
+        score = (short_holes, open_sides, free_nights)
+        if best_score is None or score < best_score:
+            best_room = room
+            best_score = score
+    return best_room
+
+
+def plan_room_assignments(rooms, busy_until, locked_stays, stays):
+    """
+    Works out new rooms for stays of one room type (interval scheduling - the same problem as
+    colouring an interval graph with as few colours as possible)
+    rooms = the room numbers, busy_until[room] = the night the room is free from (a stay that
+    can't move may still be running), locked_stays[room] = sorted (check-in, check-out) of the
+    stays that can't move and check in later (rooms picked by hand, and the first stay after
+    the window), stays = list of (check-in, check-out, reservation ID, current room)
+    Stays go in check-in order, each into the room that frees up closest before its check-in
+    without leaving a short hole (best fit). That packs bookings tightly into the fewest
+    rooms and leaves long free stretches in the others. When the stay's own room fits just as
+    well it keeps it, so only moves that help get made
+    Returns {reservation ID: room}, or None if some stay didn't fit anywhere
+    """
+    # (night the room is free from, room), sorted so a binary search finds the closest fit
+    free_from = sorted((busy_until[room], room) for room in rooms)
+    room_free = dict(busy_until)
+    next_locked = {room: 0 for room in rooms}
+    
+    # Locked stays go through in check-in order too (reservation ID None), so their room is taken when they start
+    events = list(stays)
+    for room in rooms:
+        for start, end in locked_stays[room]:
+            events.append((start, end, None, room))
+    events.sort(key=lambda stay: (stay[0], -stay[1]))
+    
+    assignment = {}
+    for start, end, reservation_id, current_room in events:
+        if reservation_id is None:
+            free_from.pop(bisect.bisect_left(free_from, (room_free[current_room], current_room)))
+            room_free[current_room] = end
+            bisect.insort(free_from, (end, current_room))
+            next_locked[current_room] += 1
             continue
-        else:
+        
+        # Every room left of pos is free by the check-in night
+        pos = bisect.bisect_right(free_from, (start, float("inf")))
+        chosen = None
+        short_hole = None
+        for idx in range(pos - 1, -1, -1):
+            room = free_from[idx][1]
+            if not fits_before_locked(room, end, locked_stays, next_locked):
+                continue
+            if 0 < start - free_from[idx][0] <= ORPHAN_NIGHTS:
+                # Only use a room that would be left with a short hole if nothing else fits
+                if short_hole is None:
+                    short_hole = idx
+                continue
+            chosen = idx
             break
-    
-    # Display and select available room
-    print(f"\nAvailable {room_types[room_type_key]['type']} Rooms:")
-    available = []
-    for room in available_rooms[room_type_key]:
-        # Check if room has any active reservations
-        is_available = True
-        if room in room_reservations and room_reservations[room]:
-            for res in room_reservations[room]:
-                if res["status"] == "Active":
-                    is_available = False
-                    break
+        if chosen is None:
+            chosen = short_hole
+        if chosen is None:
+            return None
         
-        if is_available:
-            available.append(room)
-            print(f"  - Room {room}")
-    
-    if not available:
-        print("\nSorry, no rooms available for this type.")
-        print("Please try again later or select a different room type.")
-        pause()
-        return
-    
-    room_number = validate_integer_input(f"\nSelect Room Number: ", min_val=min(available), max_val=max(available))
-    
+        # A tie (the stay's own room is free from the same night) goes to the room it already has
+        if free_from[chosen][1] != current_room:
+            own = bisect.bisect_left(free_from, (free_from[chosen][0], current_room))
+            if (own < len(free_from) and free_from[own] == (free_from[chosen][0], current_room)
+                    and fits_before_locked(current_room, end, locked_stays, next_locked)):
+                chosen = own
+        
+        room = free_from.pop(chosen)[1]
+        assignment[reservation_id] = room
+        room_free[room] = end
+        bisect.insort(free_from, (end, room))
+    return assignment
+
+
+def fits_before_locked(room, end, locked_stays, next_locked):
+    """True if a stay ending on end is out of a room before its next locked stay (see plan_room_assignments)"""
+    position = next_locked[room]
+    return position >= len(locked_stays[room]) or end <= locked_stays[room][position][0]
+
+
+def measure_fragmentation(room_stays, first_night, last_night):
+    """
+    How broken up the free nights are from first_night up to last_night (not included)
+    room_stays[room] = list of (check-in, check-out) for every room of the group we measure
+    A gap is a run of free nights; orphan nights are in gaps of at most ORPHAN_NIGHTS nights
+    with a booking right after (too short to sell); empty rooms are free for the whole window
+    """
+    figures = {"free_gaps": 0, "free_nights": 0, "orphan_nights": 0, "longest_gap": 0, "empty_rooms": 0}
+    for stays in room_stays.values():
+        night = first_night
+        gaps = []
+        for start, end in sorted(stays):
+            if start > night:
+                gaps.append((min(start, last_night) - night, start < last_night))
+            night = max(night, end)
+            if night >= last_night:
+                break
+        if night < last_night:
+            gaps.append((last_night - night, False))
+        
+        for nights, booked_after in gaps:
+            figures["free_gaps"] += 1
+            figures["free_nights"] += nights
+            figures["longest_gap"] = max(figures["longest_gap"], nights)
+            if booked_after and nights <= ORPHAN_NIGHTS:
+                figures["orphan_nights"] += nights
+            if nights == last_night - first_night:
+                figures["empty_rooms"] += 1
+    return figures
+
+
+def forget_quotes(start, end):
+    """Throws away the remembered quotes for any stay that includes a night from start to end"""
+    for night in range(start, end):
+        for key in quote_cache_nights.pop(night, ()):
+            quote_cache.pop(key, None)
+
+
+def mark_room_nights(room, start, end, booked):
+    """Switches a room's bit on (booked) or off (freed) for each night from start to end"""
+    if room not in room_bits:
+        return
+    if quote_cache:
+        forget_quotes(start, end)
+    room_type_key, bit = room_bits[room]
+    nights = room_type_nights[room_type_key]
+    for night in range(start, end):
+        if booked:
+            nights[night] = nights.get(night, 0) | bit
+        else:
+            remaining = nights.get(night, 0) & ~bit
+            if remaining:
+                nights[night] = remaining
+            else:
+                nights.pop(night, None)
+
+
+def occupy_room(reservation):
+    """Adds a reservation's nights to its room's calendar (keeps it sorted) and its type's nightly bitsets"""
+    room = reservation["room_number"]
+    start = reservation["check_in_date"]
+    end = reservation["check_out_date"]
+    
+    if room not in room_calendar:
+        room_calendar[room] = {"starts": [], "ends": [], "ids": []}
+    calendar = room_calendar[room]
+    
+    pos = bisect.bisect_right(calendar["starts"], start)
+    calendar["starts"].insert(pos, start)
+    calendar["ends"].insert(pos, end)
+    calendar["ids"].insert(pos, reservation["id"])
+    
+    mark_room_nights(room, start, end, True)
+
+
+def release_room(reservation):
+    """Takes a reservation's nights back out of its room's calendar and its type's nightly bitsets"""
+    calendar = room_calendar.get(reservation["room_number"])
+    if not calendar:
+        return
+    
+    start = reservation["check_in_date"]
+    
+    # Jump straight to the bookings with the same check-in day
+    pos = bisect.bisect_left(calendar["starts"], start)
+    while pos < len(calendar["starts"]) and calendar["starts"][pos] == start:
+        if calendar["ids"][pos] == reservation["id"]:
+            mark_room_nights(reservation["room_number"], start, calendar["ends"][pos], False)
+            del calendar["starts"][pos]
+            del calendar["ends"][pos]
+            del calendar["ids"][pos]
+            return
+        pos += 1
+
+
+def shift_room_stay(reservation, new_start, new_end):
+    """
+    Moves an active reservation's nights in its room's calendar to new_start - new_end in one step
+    (call it before changing the reservation's dates). If the stay keeps its place among the room's
+    other bookings - it always does when the old and new nights overlap - its calendar entry is
+    just updated, and only the nights that change get their bits switched in the type's bitsets
+    """
+    room = reservation["room_number"]
+    old_start = reservation["check_in_date"]
+    old_end = reservation["check_out_date"]
+    if room not in room_calendar:
+        room_calendar[room] = {"starts": [], "ends": [], "ids": []}
+    calendar = room_calendar[room]
+    starts = calendar["starts"]
+    ends = calendar["ends"]
+    ids = calendar["ids"]
+    
+    # Jump straight to the bookings with the same check-in day (like release_room)
+    pos = bisect.bisect_left(starts, old_start)
+    while pos < len(starts) and starts[pos] == old_start and ids[pos] != reservation["id"]:
+        pos += 1
+    found = pos < len(starts) and ids[pos] == reservation["id"]
+    
+    if found and (pos == 0 or ends[pos - 1] <= new_start) and (pos + 1 == len(starts) or starts[pos + 1] >= new_end):
+        starts[pos] = new_start
+        ends[pos] = new_end
+    else:
+        if found:
+            del starts[pos]
+            del ends[pos]
+            del ids[pos]
+        pos = bisect.bisect_right(starts, new_start)
+        starts.insert(pos, new_start)
+        ends.insert(pos, new_end)
+        ids.insert(pos, reservation["id"])
+    
+    # Free the nights the stay gives up, then book the ones it gets
+    for start, end in get_added_nights(new_start, new_end, old_start, old_end):
+        mark_room_nights(room, start, end, False)
+    for start, end in get_added_nights(old_start, old_end, new_start, new_end):
+        mark_room_nights(room, start, end, True)
+
+
+def note_used_id(record_id):
+    """Makes sure the ID counters never hand out an ID that was already used (e.g. RES1005)"""
+    global reservation_id_counter, payment_id_counter
+    
+    number = int(record_id[3:])
+    if record_id.startswith("RES"):
+        if number >= reservation_id_counter:
+            reservation_id_counter = number + 1
+    elif number >= payment_id_counter:
+        payment_id_counter = number + 1
+
+
+def rebuild_indexes():
+    """
+    Rebuilds every lookup structure from reservations_list and payments_list
+    Used after loading saved data - building everything in one go is much faster
+    than adding records one at a time
+    (reads fields as attributes here - a bit faster than reservation["..."] on big data)
+    """
+    room_reservations.clear()
+    room_calendar.clear()
+    quote_cache.clear()
+    quote_cache_nights.clear()
+    for type_key in room_type_nights:
+        room_type_nights[type_key] = {}
+    reservation_payments.clear()
+    sorted_views.clear()
+    rebuild_reservation_index()
+    rebuild_ledger()
+    
+    # Gather each room's active stays first, then sort each room once
+    stays_by_room = {}
+    for reservation in reservations_list:
+        room = reservation.room_number
+        if room in room_reservations:
+            room_reservations[room].append(reservation)
+        else:
+            room_reservations[room] = [reservation]
+        reservation_payments[reservation.id] = []
+        
+        if reservation.status == "Active":
+            if room not in stays_by_room:
+                stays_by_room[room] = []
+            stays_by_room[room].append((reservation.check_in_date, reservation.check_out_date, reservation.id))
+            mark_room_nights(room, reservation.check_in_date, reservation.check_out_date, True)
+    
+    for room, stays in stays_by_room.items():
+        stays.sort()
+        room_calendar[room] = {
+            "starts": [stay[0] for stay in stays],
+            "ends": [stay[1] for stay in stays],
+            "ids": [stay[2] for stay in stays]
+        }
+    
+    for payment in payments_list:
+        if payment.reservation_id not in reservation_payments:
+            reservation_payments[payment.reservation_id] = []
+        reservation_payments[payment.reservation_id].append(payment)
+
+
+# ============================================================
+# RATE CALENDAR (NIGHTLY PRICES)
+# ============================================================
+# room_types has each type's normal price. Rate rules raise or lower it on some nights:
+#   {"name": "Summer", "kind": "season", "first_day": "01/04", "last_day": "31/05", "percent": 20}
+#       every year from 1 April to 31 May (DD/MM - a season may run past New Year)
+#   {"name": "Weekend", "kind": "weekday", "weekdays": ["Fri", "Sat"], "percent": 15}
+#   {"name": "Fiesta", "kind": "event", "first_day": "10/01/2027", "last_day": "12/01/2027", "percent": 50}
+# Add "room_types": ["4", "5"] to only change some room types (otherwise it's all of them).
+# Every rule that matches a night is applied, one after another (+20% then +15% = +38%).
+# A reservation keeps the price it was booked at - changing the rules only affects new prices.
+
+# The rules in use (the same dictionaries that are saved in the rates file)
+rate_rules = []
+
+# The rates file lives next to the journal or database; rates_path is None when rules aren't saved
+RATES_FILE = "hotel_rates.json"
+rates_path = None
+
+# Each room type's nightly prices (in centavos) as prefix sums, so any stay is priced with one
+# subtraction however long it is: rate_prefix["1"][i] = the total for the i nights starting at
+# RATE_FIRST_NIGHT. Built the first time a type is priced, thrown away when the rules change
+rate_prefix = {}
+
+# Nights the prefix sums cover (the years parse_date accepts); nights outside get the normal price
+RATE_FIRST_NIGHT = date_to_ordinal(1, 1, 2026)
+RATE_LAST_NIGHT = date_to_ordinal(31, 12, 2035)
+
+weekday_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def parse_day_month(value):
+    """Turns a DD/MM string into (month, day) - raises ValueError if it isn't a real day of the year"""
+    parts = value.strip().split("/")
+    if len(parts) != 2 or not (parts[0].isdigit() and parts[1].isdigit()):
+        raise ValueError(f"Season days must be in format DD/MM, got {value}.")
+    day = int(parts[0])
+    month = int(parts[1])
+    if month < 1 or month > 12 or day < 1 or day > get_days_in_month(2028)[month - 1]:
+        raise ValueError(f"{value} is not a real day of the year.")
+    return month, day
+
+
+def check_rate_rule(rule):
+    """
+    Makes sure a rate rule is complete and gives back the version the calendar works with
+    (dates turned into numbers, weekdays into 0-6). Raises ValueError saying what's wrong
+    """
+    if not isinstance(rule, dict):
+        raise ValueError("Each rate rule must be a dictionary.")
+    kind = rule.get("kind")
+    percent = rule.get("percent")
+    if not isinstance(percent, (int, float)) or percent <= -100:
+        raise ValueError(f"Rule {rule.get('name')}: percent must be a number above -100.")
+    
+    checked = {"kind": kind, "percent": percent, "types": None}
+    if rule.get("room_types") is not None:
+        checked["types"] = {str(key) for key in rule["room_types"]}
+        for key in checked["types"]:
+            if key not in room_types:
+                raise ValueError(f"Rule {rule.get('name')}: there is no room type {key}.")
+    
+    if kind == "season":
+        checked["first"] = parse_day_month(rule.get("first_day", ""))
+        checked["last"] = parse_day_month(rule.get("last_day", ""))
+    elif kind == "event":
+        checked["first"] = parse_date(rule.get("first_day", ""))
+        checked["last"] = parse_date(rule.get("last_day", ""))
+        if checked["last"] < checked["first"]:
+            raise ValueError(f"Rule {rule.get('name')}: the last day is before the first day.")
+    elif kind == "weekday":
+        checked["weekdays"] = set()
+        if not rule.get("weekdays"):
+            raise ValueError(f"Rule {rule.get('name')}: a weekday rule needs a list of weekdays.")
+        for name in rule["weekdays"]:
+            if name not in weekday_names:
+                raise ValueError(f"Rule {rule.get('name')}: weekdays are written {', '.join(weekday_names)}.")
+            checked["weekdays"].add(weekday_names.index(name))
+    else:
+        raise ValueError(f"Rule {rule.get('name')}: kind must be season, weekday or event.")
+    return checked
+
+
+def rule_applies(rule, night, month, day):
+    """Checks if a checked rate rule covers one night (month and day are that night's date)"""
+    if rule["kind"] == "event":
+        return rule["first"] <= night <= rule["last"]
+    if rule["kind"] == "weekday":
+        # Day 1 (1/1/0001) was a Monday
+        return (night - 1) % 7 in rule["weekdays"]
+    if rule["first"] <= rule["last"]:
+        return rule["first"] <= (month, day) <= rule["last"]
+    # A season running past New Year (like 15/12 - 15/01)
+    return (month, day) >= rule["first"] or (month, day) <= rule["last"]
+
+
+def build_rate_prefix(room_type_key):
+    """Works out one room type's price for every night in the calendar and stores the prefix sums"""
+    base = room_types[room_type_key]["price"] * 100
+    rules = []
+    for rule in rate_rules:
+        checked = check_rate_rule(rule)
+        if checked["types"] is None or room_type_key in checked["types"]:
+            rules.append(checked)
+    
+    prefix = [0]
+    total = 0
+    day, month, year = 1, 1, 2026
+    days_in_month = get_days_in_month(year)
+    for night in range(RATE_FIRST_NIGHT, RATE_LAST_NIGHT + 1):
+        rate = base
+        for rule in rules:
+            if rule_applies(rule, night, month, day):
+                rate = rate * (100 + rule["percent"]) / 100
+        total += int(round(rate))
+        prefix.append(total)
+        
+        # Step to the next day's date (cheaper than working it out from the day number)
+        day += 1
+        if day > days_in_month[month - 1]:
+            day = 1
+            month += 1
+            if month > 12:
+                month = 1
+                year += 1
+                days_in_month = get_days_in_month(year)
+    rate_prefix[room_type_key] = prefix
+    return prefix
+
+
+def get_stay_cents(room_type_key, start, end):
+    """What the nights from start to end cost in a room type, in centavos (two lookups, any length)"""
+    prefix = rate_prefix.get(room_type_key)
+    if prefix is None:
+        prefix = build_rate_prefix(room_type_key)
+    
+    # Nights outside the calendar are charged the normal price
+    inside_start = min(max(start, RATE_FIRST_NIGHT), RATE_LAST_NIGHT + 1)
+    inside_end = min(max(end, RATE_FIRST_NIGHT), RATE_LAST_NIGHT + 1)
+    outside_nights = (end - start) - (inside_end - inside_start)
+    return (prefix[inside_end - RATE_FIRST_NIGHT] - prefix[inside_start - RATE_FIRST_NIGHT]
+            + outside_nights * room_types[room_type_key]["price"] * 100)
+
+
+def get_stay_price(room_type_key, start, end):
+    """What the nights from start to end cost in a room type, in pesos (see the rate calendar)"""
+    return get_stay_cents(room_type_key, start, end) / 100
+
+
+def get_night_cents(room_type_key, start, end):
+    """Each night's price from start to end in a room type, in centavos (one number per night)"""
+    return [get_stay_cents(room_type_key, night, night + 1) for night in range(start, end)]
+
+
+def load_rate_rules(path):
+    """Reads the rate rules from the rates file (no file = no rules) and remembers where to save them"""
+    global rates_path
+    
+    rates_path = path
+    rules = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+        if not isinstance(rules, list):
+            raise ValueError(f"Rates file {path} must hold a list of rules")
+        for rule in rules:
+            check_rate_rule(rule)
+    rate_rules[:] = rules
+    rate_prefix.clear()
+    quote_cache.clear()
+    quote_cache_nights.clear()
+
+
+def save_rate_rules():
+    """Writes the rate rules to the rates file (through a temporary file, like the snapshot)"""
+    if rates_path is None:
+        return
+    temp_path = rates_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(rate_rules, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, rates_path)
+
+
+# ============================================================
+# RESERVATION INDEXES
+# ============================================================
+
+def rebuild_reservation_index():
+    """Builds the ID index and the list positions for everything in reservations_list"""
+    global positions_valid_until
+    reservation_index.clear()
+    reservation_positions.clear()
+    name_groups.clear()
+    name_trigrams.clear()
+    status_index.clear()
+    payment_status_index.clear()
+    group_index.clear()
+    for position, reservation in enumerate(reservations_list):
+        reservation_index[reservation.id] = reservation
+        reservation_positions[reservation.id] = position
+        if reservation.status not in status_index:
+            status_index[reservation.status] = set()
+        status_index[reservation.status].add(reservation.id)
+        if reservation.payment_status not in payment_status_index:
+            payment_status_index[reservation.payment_status] = set()
+        payment_status_index[reservation.payment_status].add(reservation.id)
+        if reservation.group_id is not None:
+            if reservation.group_id not in group_index:
+                group_index[reservation.group_id] = set()
+            group_index[reservation.group_id].add(reservation.id)
+        name = reservation.guest_name.lower()
+        if name in name_groups:
+            name_groups[name].append(reservation)
+        else:
+            name_groups[name] = [reservation]
+    positions_valid_until = len(reservations_list)
+    
+    # Each different name only has to be cut into trigrams once
+    for name in name_groups:
+        for trigram in get_trigrams(name):
+            if trigram in name_trigrams:
+                name_trigrams[trigram].add(name)
+            else:
+                name_trigrams[trigram] = {name}
+    
+    # Outstanding balances - collect them all, then sort once
+    outstanding_index["keys"].clear()
+    outstanding_index["total"] = 0
+    for reservation in reservations_list:
+        key = get_outstanding_key(reservation)
+        if key is not None:
+            outstanding_index["keys"][reservation.id] = key
+            outstanding_index["total"] -= key[0]
+    outstanding_index["entries"] = sorted(outstanding_index["keys"].values())
+    
+    # Sort once for each date index (the sort is stable, so same-day ties keep their order)
+    by_checkin = sorted(reservations_list, key=lambda reservation: reservation.check_in_date)
+    checkin_index["records"] = by_checkin
+    checkin_index["days"] = [reservation.check_in_date for reservation in by_checkin]
+    by_checkout = sorted(reservations_list, key=lambda reservation: reservation.check_out_date)
+    checkout_index["records"] = by_checkout
+    checkout_index["days"] = [reservation.check_out_date for reservation in by_checkout]
+
+
+def get_reservation(reservation_id):
+    """
+    Finds a reservation by its ID in one step, no matter how many are on file
+    IDs are always made in upper case (RES1000), so "res1000" works too
+    Returns None if there is no such reservation
+    """
+    return reservation_index.get(reservation_id.strip().upper())
+
+
+def index_reservation(reservation):
+    """Adds a reservation that was just appended to reservations_list to the indexes"""
+    global positions_valid_until
+    position = len(reservations_list) - 1
+    reservation_index[reservation["id"]] = reservation
+    reservation_positions[reservation["id"]] = position
+    if positions_valid_until == position:
+        positions_valid_until += 1
+    add_name_to_index(reservation)
+    add_to_date_index(checkin_index, reservation["check_in_date"], reservation)
+    add_to_date_index(checkout_index, reservation["check_out_date"], reservation)
+    if reservation["group_id"] is not None:
+        if reservation["group_id"] not in group_index:
+            group_index[reservation["group_id"]] = set()
+        group_index[reservation["group_id"]].add(reservation["id"])
+
+
+def renumber_positions():
+    """Fixes every list position from the first delete onward"""
+    global positions_valid_until
+    for idx in range(positions_valid_until, len(reservations_list)):
+        reservation_positions[reservations_list[idx].id] = idx
+    positions_valid_until = len(reservations_list)
+
+
+def get_reservation_position(reservation):
+    """Tells where a reservation sits in reservations_list (renumbers after deletes if needed)"""
+    position = reservation_positions[reservation["id"]]
+    if position >= positions_valid_until:
+        renumber_positions()
+        position = reservation_positions[reservation["id"]]
+    return position
+
+
+def unindex_reservation(reservation, position):
+    """Removes a reservation that was taken out of reservations_list at the given position"""
+    global positions_valid_until
+    del reservation_index[reservation["id"]]
+    del reservation_positions[reservation["id"]]
+    # Everything after it moved one spot to the left
+    positions_valid_until = min(positions_valid_until, position)
+    remove_name_from_index(reservation)
+    remove_from_date_index(checkin_index, reservation["check_in_date"], reservation)
+    remove_from_date_index(checkout_index, reservation["check_out_date"], reservation)
+    for ids in list(status_index.values()) + list(payment_status_index.values()):
+        ids.discard(reservation["id"])
+    remove_outstanding(reservation["id"])
+    group = group_index.get(reservation["group_id"])
+    if group is not None:
+        group.discard(reservation["id"])
+        if not group:
+            del group_index[reservation["group_id"]]
+
+
+def refresh_status_indexes(reservation):
+    """Moves a saved reservation to the right group if its status or payment status changed"""
+    reservation_id = reservation["id"]
+    for index, value in ((status_index, reservation["status"]), (payment_status_index, reservation["payment_status"])):
+        if reservation_id in index.get(value, ()):
+            continue
+        # New reservation or the value changed - there are only a few groups to take it out of
+        for ids in index.values():
+            ids.discard(reservation_id)
+        if value not in index:
+            index[value] = set()
+        index[value].add(reservation_id)
+
+
+def get_outstanding_key(reservation):
+    """The entry a reservation gets in outstanding_index, or None if it doesn't owe anything"""
+    if reservation.status != "Active":
+        return None
+    cents = to_cents(reservation.balance)
+    if cents <= 0:
+        return None
+    return (-cents, len(reservation.id), reservation.id)
+
+
+def remove_outstanding(reservation_id):
+    """Takes a reservation out of the outstanding balances (if it's there)"""
+    key = outstanding_index["keys"].pop(reservation_id, None)
+    if key is None:
+        return
+    position = bisect.bisect_left(outstanding_index["entries"], key)
+    del outstanding_index["entries"][position]
+    outstanding_index["total"] += key[0]
+
+
+def refresh_outstanding(reservation):
+    """Moves a saved reservation to its new place in the outstanding balances (if its balance changed)"""
+    key = get_outstanding_key(reservation)
+    if outstanding_index["keys"].get(reservation["id"]) == key:
+        return
+    remove_outstanding(reservation["id"])
+    if key is not None:
+        bisect.insort(outstanding_index["entries"], key)
+        outstanding_index["keys"][reservation["id"]] = key
+        outstanding_index["total"] -= key[0]
+
+
+def get_outstanding_page(start=0, count=20):
+    """
+    Gives count reservations from the outstanding balances, starting at position start
+    (0 = the biggest balance) - the list is already sorted, so this is just a slice
+    """
+    page = outstanding_index["entries"][start:start + count]
+    return [reservation_index[entry[2]] for entry in page]
+
+
+def get_reservations_by_ids(reservation_ids):
+    """Turns a group of reservation IDs into the reservations, in reservations_list order"""
+    if positions_valid_until < len(reservations_list):
+        renumber_positions()
+    ordered_ids = sorted(reservation_ids, key=lambda reservation_id: reservation_positions[reservation_id])
+    return [reservation_index[reservation_id] for reservation_id in ordered_ids]
+
+
+def get_reservations_with_status(status):
+    """Every reservation with the given status ("Active" or "Cancelled")"""
+    return get_reservations_by_ids(status_index.get(status, set()))
+
+
+def get_trigrams(text):
+    """Cuts text into every 3-letter piece it has ("maria" -> "mar", "ari", "ria")"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def add_name_to_index(reservation):
+    """Puts a reservation under its guest name in the name search index"""
+    name = reservation["guest_name"].lower()
+    if name in name_groups:
+        name_groups[name].append(reservation)
+        return
+    
+    # First reservation with this name - the name itself goes into the trigram lists
+    name_groups[name] = [reservation]
+    for trigram in get_trigrams(name):
+        if trigram in name_trigrams:
+            name_trigrams[trigram].add(name)
+        else:
+            name_trigrams[trigram] = {name}
+
+
+def remove_name_from_index(reservation):
+    """Takes a reservation out of the name search index (and the name too, if nobody else has it)"""
+    name = reservation["guest_name"].lower()
+    group = name_groups.get(name)
+    if group is None or reservation not in group:
+        return
+    
+    group.remove(reservation)
+    if not group:
+        del name_groups[name]
+        for trigram in get_trigrams(name):
+            name_trigrams[trigram].discard(name)
+            if not name_trigrams[trigram]:
+                del name_trigrams[trigram]
+
+
+def is_in_name_group(group, reservation):
+    """
+    Checks if a reservation is in a name group without looking through the whole group
+    A group is kept in reservations_list order, so we can binary search it by list position
+    (a common name can have thousands of reservations)
+    """
+    if group[-1] is reservation:
+        return True  # Just booked - it's always the last one
+    if positions_valid_until < len(reservations_list):
+        renumber_positions()
+    target = reservation_positions[reservation.id]
+    low = 0
+    high = len(group)
+    while low < high:
+        middle = (low + high) // 2
+        if reservation_positions[group[middle].id] < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low < len(group) and group[low] is reservation
+
+
+def refresh_name_index(reservation):
+    """
+    Makes sure a saved reservation can be found under its current guest name
+    If the name was changed, the old entry is left behind - searches double check
+    the name, so it never shows up under the old one
+    """
+    group = name_groups.get(reservation["guest_name"].lower())
+    if not group or not is_in_name_group(group, reservation):
+        add_name_to_index(reservation)
+
+
+def add_to_date_index(date_index, day, reservation):
+    """Slots a reservation into a date index (after any others on the same day)"""
+    position = bisect.bisect_right(date_index["days"], day)
+    date_index["days"].insert(position, day)
+    date_index["records"].insert(position, reservation)
+
+
+def remove_from_date_index(date_index, day, reservation):
+    """Takes a reservation out of a date index - only the entries for that day are checked"""
+    low = bisect.bisect_left(date_index["days"], day)
+    high = bisect.bisect_right(date_index["days"], day)
+    for position in range(low, high):
+        if date_index["records"][position] is reservation:
+            del date_index["days"][position]
+            del date_index["records"][position]
+            return
+
+
+def move_in_date_index(date_index, old_day, new_day, reservation):
+    """Moves a reservation in a date index when its date is changed"""
+    remove_from_date_index(date_index, old_day, reservation)
+    add_to_date_index(date_index, new_day, reservation)
+
+
+def get_reservations_between(date_index, first_day, last_day):
+    """
+    Gives every reservation in a date index from first_day to last_day (both included)
+    Two binary searches and a slice - the time depends on how many we find, not on
+    how many reservations are on file
+    """
+    low = bisect.bisect_left(date_index["days"], first_day)
+    high = bisect.bisect_right(date_index["days"], last_day)
+    return date_index["records"][low:high]
+
+
+def search_guest_names(text):
+    """
+    Finds every reservation whose guest name contains text (upper/lower case doesn't matter)
+    Instead of checking every reservation we look up the names that have all of
+    text's trigrams, then only double check those few names
+    Results come back in the same order as reservations_list
+    """
+    text = text.lower()
+    
+    if len(text) < 3:
+        # Too short for trigrams - check each different name (still far fewer than reservations)
+        names = [name for name in name_groups if text in name]
+    else:
+        # Start from the shortest trigram list so the intersection stays small
+        postings = sorted([name_trigrams.get(trigram, set()) for trigram in get_trigrams(text)], key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        names = [name for name in candidates if text in name]
+    
+    # (attribute access here - a bit faster than res["..."] when there are lots of matches)
+    results = []
+    for name in names:
+        for res in name_groups[name]:
+            if res.guest_name.lower() == name:
+                results.append(res)
+    
+    # Each name's list is already in order, so we only sort when several names matched
+    if len(names) > 1:
+        if positions_valid_until < len(reservations_list):
+            renumber_positions()
+        results.sort(key=lambda res: reservation_positions[res.id])
+    return results
+
+
+# ============================================================
+# RUNNING TOTALS (LEDGER)
+# ============================================================
+
+def to_cents(amount):
+    """Turns a peso amount into whole centavos"""
+    return int(round(amount * 100))
+
+
+def add_to_total(totals, key, amount):
+    """Adds amount to totals[key] - keys that drop back to zero are removed"""
+    totals[key] = totals.get(key, 0) + amount
+    if totals[key] == 0:
+        del totals[key]
+
+
+def count_reservation(totals, reservation, direction):
+    """
+    Adds one reservation's share to the totals (direction 1) or takes it away (direction -1)
+    (reads fields as attributes - this also runs over every reservation when loading)
+    """
+    cost = to_cents(reservation.total_cost) * direction
+    totals["reservation_count"] += direction
+    add_to_total(totals["status_counts"], reservation.status, direction)
+    totals["revenue_total"] += cost
+    add_to_total(totals["type_revenues"], reservation.room_type, cost)
+    if reservation.status == "Active":
+        totals["active_revenue"] += cost
+        totals["active_guests"] += reservation.num_guests * direction
+        add_to_total(totals["guest_count_distribution"], reservation.num_guests, direction)
+
+
+def count_payment(totals, payment):
+    """Adds a payment (or a refund, which has a negative amount) to the totals"""
+    amount = to_cents(payment.amount)
+    totals["transaction_count"] += 1
+    if amount > 0:
+        totals["payments_total"] += amount
+        totals["payment_count"] += 1
+        add_to_total(totals["method_totals"], payment.payment_method, amount)
+        add_to_total(totals["method_counts"], payment.payment_method, 1)
+    else:
+        totals["refunds_total"] -= amount
+
+
+def ledger_add_reservation(reservation):
+    """Counts a new (or just changed) reservation in the running totals"""
+    count_reservation(ledger, reservation, 1)
+    rollup_reservation(rollups, reservation, 1)
+
+
+def ledger_remove_reservation(reservation):
+    """Takes a reservation out of the running totals (call it before changing the reservation)"""
+    count_reservation(ledger, reservation, -1)
+    rollup_reservation(rollups, reservation, -1)
+
+
+def ledger_add_payment(payment):
+    """Counts a new payment or refund in the running totals"""
+    count_payment(ledger, payment)
+    rollup_payment(rollups, payment)
+
+
+def add_to_rollup(buckets, series, day, amount):
+    """Adds amount to one day's bucket of a series (and to that series' Fenwick tree)"""
+    if series not in buckets:
+        buckets[series] = {}
+    add_to_total(buckets[series], day, amount)
+    if not buckets[series]:
+        del buckets[series]
+    if buckets is rollups:
+        update_rollup_tree(series, day, amount)
+
+
+def get_month_bounds(day):
+    """Day numbers of the 1st of day's month and of the 1st of the month after"""
+    bounds = month_bounds.get(day)
+    if bounds is None:
+        date_day, month, year = ordinal_to_date(day)
+        first = day - date_day + 1
+        bounds = (first, first + get_days_in_month(year)[month - 1])
+        month_bounds[day] = bounds
+    return bounds
+
+
+def add_to_month(months, series, month, amount):
+    """Adds amount to one month's bucket of a series (month = day number of the 1st)"""
+    if series not in months:
+        months[series] = {}
+    add_to_total(months[series], month, amount)
+    if not months[series]:
+        del months[series]
+
+
+def add_stay_to_months(months, reservation, direction):
+    """Adds an active booking's nights (and what they cost) to the months they fall in (direction 1 adds, -1 takes away)"""
+    night = reservation.check_in_date
+    month, next_month = get_month_bounds(night)
+    month_cents = 0
+    month_nights = 0
+    for cents in get_booked_night_cents(reservation):
+        if night >= next_month:
+            add_to_month(months, ("room_nights", reservation.room_type), month, month_cents * direction)
+            add_to_month(months, ("rooms_booked", reservation.room_type), month, month_nights * direction)
+            month, next_month = get_month_bounds(night)
+            month_cents = 0
+            month_nights = 0
+        month_cents += cents
+        month_nights += 1
+        night += 1
+    add_to_month(months, ("room_nights", reservation.room_type), month, month_cents * direction)
+    add_to_month(months, ("rooms_booked", reservation.room_type), month, month_nights * direction)
+
+
+def rollup_reservation(buckets, reservation, direction):
+    """Puts each night of an active booking at the price it was booked at (direction 1 adds, -1 takes away)"""
+    if reservation.status != "Active":
+        return
+    # The buckets hold changes, so a night only needs one when its price differs from the night before
+    series = ("room_nights", reservation.room_type)
+    previous = 0
+    night = reservation.check_in_date
+    for cents in get_booked_night_cents(reservation):
+        if cents != previous:
+            add_to_rollup(buckets, series, night, (cents - previous) * direction)
+            previous = cents
+        night += 1
+    add_to_rollup(buckets, series, reservation.check_out_date, -previous * direction)
+    series = ("rooms_booked", reservation.room_type)
+    add_to_rollup(buckets, series, reservation.check_in_date, direction)
+    add_to_rollup(buckets, series, reservation.check_out_date, -direction)
+    if buckets is rollups:
+        add_stay_to_months(rollup_months, reservation, direction)
+
+
+def rollup_payment(buckets, payment):
+    """Puts a payment (or refund) into its payment day's bucket (and its month's)"""
+    amount = to_cents(payment.amount)
+    if amount > 0:
+        series = ("payments", payment.payment_method)
+    else:
+        series = ("refunds", payment.payment_method)
+        amount = -amount
+    add_to_rollup(buckets, series, payment.payment_date, amount)
+    if buckets is rollups:
+        add_to_month(rollup_months, series, get_month_bounds(payment.payment_date)[0], amount)
+
+
+def compute_rollups():
+    """
+    Fills the day and month buckets from scratch - gives fresh dictionaries shaped like rollups
+    and rollup_months. Does the same as rollup_reservation/rollup_payment, written out so loading
+    a big history is quicker (and so --verify-ledger compares two separate ways of counting)
+    """
+    buckets = {}
+    months = {}
+    for reservation in reservations_list:
+        if reservation.status == "Active":
+            series = ("room_nights", reservation.room_type)
+            if series not in buckets:
+                buckets[series] = {}
+            day_buckets = buckets[series]
+            previous = 0
+            night = reservation.check_in_date
+            for cents in get_booked_night_cents(reservation):
+                if cents != previous:
+                    day_buckets[night] = day_buckets.get(night, 0) + cents - previous
+                    previous = cents
+                night += 1
+            day_buckets[reservation.check_out_date] = day_buckets.get(reservation.check_out_date, 0) - previous
+            
+            series = ("rooms_booked", reservation.room_type)
+            if series not in buckets:
+                buckets[series] = {}
+            day_buckets = buckets[series]
+            day_buckets[reservation.check_in_date] = day_buckets.get(reservation.check_in_date, 0) + 1
+            day_buckets[reservation.check_out_date] = day_buckets.get(reservation.check_out_date, 0) - 1
+            
+            add_stay_to_months(months, reservation, 1)
+    
+    for payment in payments_list:
+        amount = to_cents(payment.amount)
+        series = ("payments", payment.payment_method) if amount > 0 else ("refunds", payment.payment_method)
+        if series not in buckets:
+            buckets[series] = {}
+        day_buckets = buckets[series]
+        day_buckets[payment.payment_date] = day_buckets.get(payment.payment_date, 0) + abs(amount)
+        add_to_month(months, series, get_month_bounds(payment.payment_date)[0], abs(amount))
+    
+    # Leave out the days (and series) that came to nothing, like add_to_rollup does
+    for series in list(buckets):
+        buckets[series] = {day: amount for day, amount in buckets[series].items() if amount != 0}
+        if not buckets[series]:
+            del buckets[series]
+    return buckets, months
+
+
+def get_rollup_tree(series):
+    """
+    Gives the Fenwick tree for a series, building it from the day buckets if needed
+    sums[i] holds the buckets of a block of days ending on first_day + i - 1 (i & -i days long),
+    so any running total adds up at most log2(days) of them. For the change series, weighted
+    holds the same blocks with each change times its distance from first_day (see get_rollup_running_total)
+    The tree covers every night the rate calendar does (and any bucket outside that)
+    """
+    tree = rollup_trees.get(series)
+    if tree is not None:
+        return tree
+    
+    day_buckets = rollups.get(series, {})
+    first_day = min([RATE_FIRST_NIGHT] + list(day_buckets))
+    last_day = max([RATE_LAST_NIGHT + 1] + list(day_buckets))
+    size = last_day - first_day + 1
+    sums = [0] * (size + 1)
+    weighted = [0] * (size + 1) if series[0] in change_series else None
+    for day, amount in day_buckets.items():
+        sums[day - first_day + 1] = amount
+        if weighted is not None:
+            weighted[day - first_day + 1] = (day - first_day) * amount
+    
+    # Build it in one pass: each block adds itself into the next bigger block that holds it
+    for position in range(1, size + 1):
+        parent = position + (position & -position)
+        if parent <= size:
+            sums[parent] += sums[position]
+            if weighted is not None:
+                weighted[parent] += weighted[position]
+    
+    tree = {"first_day": first_day, "sums": sums, "weighted": weighted}
+    rollup_trees[series] = tree
+    return tree
+
+
+def update_rollup_tree(series, day, amount):
+    """Adds amount to one day in a series' Fenwick tree - O(log n) (no tree yet = nothing to do)"""
+    tree = rollup_trees.get(series)
+    if tree is None:
+        return
+    sums = tree["sums"]
+    weighted = tree["weighted"]
+    offset = day - tree["first_day"]
+    position = offset + 1
+    if position < 1 or position >= len(sums):
+        # A day the tree doesn't cover: build a bigger one the next time it's needed
+        del rollup_trees[series]
+        return
+    while position < len(sums):
+        sums[position] += amount
+        if weighted is not None:
+            weighted[position] += offset * amount
+        position += position & -position
+
+
+def get_rollup_running_total(tree, day):
+    """Total of a series from the start of its tree up to day (included) - O(log n)"""
+    offset = day - tree["first_day"]
+    if offset < 0:
+        return 0
+    sums = tree["sums"]
+    weighted = tree["weighted"]
+    position = min(offset + 1, len(sums) - 1)
+    total = 0
+    weighted_total = 0
+    while position > 0:
+        total += sums[position]
+        if weighted is not None:
+            weighted_total += weighted[position]
+        position -= position & -position
+    if weighted is None:
+        return total
+    # Each night's value is all the changes up to it, so a change made i days after
+    # first_day counts once for every night from there up to day: offset - i + 1 times
+    return (offset + 1) * total - weighted_total
+
+
+def get_rollup_total(series, first_day, last_day):
+    """
+    Total of a series from first_day to last_day (both included), in centavos
+    Two O(log n) walks of the series' Fenwick tree, however long the range is
+    """
+    tree = get_rollup_tree(series)
+    return get_rollup_running_total(tree, last_day) - get_rollup_running_total(tree, first_day - 1)
+
+
+def get_month_total(series, month):
+    """A series' total for one month (month = day number of the 1st), in centavos - one lookup"""
+    return rollup_months.get(series, {}).get(month, 0)
+
+
+def compute_ledger():
+    """Adds everything up from scratch - gives a fresh dictionary shaped like ledger"""
+    totals = {}
+    for key, value in ledger.items():
+        totals[key] = {} if isinstance(value, dict) else 0
+    
+    for reservation in reservations_list:
+        count_reservation(totals, reservation, 1)
+    for payment in payments_list:
+        count_payment(totals, payment)
+    return totals
+
+
+def rebuild_ledger():
+    """Starts the running totals over from the data we have (used after loading)"""
+    ledger.update(compute_ledger())
+    buckets, months = compute_rollups()
+    rollups.clear()
+    rollups.update(buckets)
+    rollup_months.clear()
+    rollup_months.update(months)
+    rollup_trees.clear()
+
+
+def verify_ledger():
+    """
+    Checks the running totals against a full recount
+    Returns a list of the totals that don't match (empty when everything agrees)
+    """
+    recount = compute_ledger()
+    mismatches = []
+    for key, value in recount.items():
+        if ledger[key] != value:
+            mismatches.append(f"{key}: running {ledger[key]} vs recount {value}")
+    
+    recount, recount_months = compute_rollups()
+    for series in set(rollups) | set(recount):
+        if rollups.get(series) != recount.get(series):
+            mismatches.append(f"daily rollup {series[0]} / {series[1]} doesn't match the recount")
+    for series in set(rollup_months) | set(recount_months):
+        if rollup_months.get(series) != recount_months.get(series):
+            mismatches.append(f"monthly rollup {series[0]} / {series[1]} doesn't match the recount")
+    return mismatches
+
+
+def check_ledger():
+    """Used by --verify-ledger: warns (and waits) if the running totals stopped matching a recount"""
+    mismatches = verify_ledger()
+    if mismatches:
+        print("\n⚠️  Running report totals don't match a full recount:")
+        for mismatch in mismatches:
+            print(f"   {mismatch}")
+        pause()
+
+
+# ============================================================
+# DATA PERSISTENCE FUNCTIONS
+# ============================================================
+
+def journal_append(op, data):
+    """
+    Adds one change to the journal (called with engine_lock held)
+    The change waits in journal_buffer and gets written at the next group commit
+    (see journal_commit_if_due)
+    """
+    global journal_sequence
+    
+    if journal_file is None:
+        return
+    
+    journal_sequence += 1
+    journal_buffer.append((journal_sequence, op, data))
+
+
+def journal_commit_if_due():
+    """
+    Does a group commit once enough changes are waiting or enough time has passed
+    Engine calls use this after letting go of their locks, never while holding one
+    """
+    if journal_file is None or journal_holding or journal_background:
+        return
+    if len(journal_buffer) >= JOURNAL_GROUP_SIZE or time.time() - journal_last_commit >= JOURNAL_GROUP_SECONDS:
+        journal_commit()
+
+
+def claim_journal(wanted_sequence=None):
+    """
+    Waits until no other thread is writing to the journal, then claims it (give it back with release_journal)
+    Returns False without claiming it if the changes up to wanted_sequence got on disk while we waited
+    """
+    global journal_writing
+    
+    with journal_writer:
+        while True:
+            if wanted_sequence is not None and journal_synced_sequence >= wanted_sequence:
+                return False
+            if not journal_writing:
+                journal_writing = True
+                return True
+            journal_writer.wait()
+
+
+def release_journal():
+    """Gives the journal back and wakes every thread waiting for it"""
+    global journal_writing
+    
+    with journal_writer:
+        journal_writing = False
+        journal_writer.notify_all()
+
+
+def journal_commit():
+    """
+    Group commit: makes sure every change made so far is really on disk
+    If another thread is already writing, we wait for it - its block may have our changes too
+    (never call this while holding engine_lock or a room type lock)
+    """
+    if not claim_journal(journal_sequence):
+        return
+    try:
+        write_journal_block()
+    finally:
+        release_journal()
+
+
+def write_journal_block():
+    """
+    Writes all waiting changes as one block (the caller must have claimed the journal)
+    Each block is: length, checksum, then the changes (pickled) - so a block that was
+    only half written when the program crashed can be spotted and ignored
+    One fsync covers the whole block, which is what keeps busy periods fast
+    engine_lock is only held while the waiting changes are taken, not while the disk works
+    """
+    global journal_last_commit, journal_synced_sequence
+    
+    with engine_lock:
+        journal_last_commit = time.time()
+        if journal_file is None or not journal_buffer:
+            return
+        block = journal_buffer[:]
+        journal_buffer.clear()
+    
+    payload = pickle.dumps(block, pickle.HIGHEST_PROTOCOL)
+    journal_file.write(struct.pack("<II", len(payload), zlib.crc32(payload)) + payload)
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+    journal_synced_sequence = block[-1][0]
+
+
+def journal_log_reservation(reservation):
+    """Saves the latest version of a reservation to the journal"""
+    journal_append("reservation", reservation.to_row())
+
+
+def journal_log_payment(payment):
+    """Saves a payment (or refund) to the journal"""
+    journal_append("payment", payment.to_row())
+
+
+def journal_log_delete(reservation_id):
+    """Records that a reservation was deleted"""
+    journal_append("delete", reservation_id)
+
+
+def read_journal(path, reservation_rows, payment_rows, after_sequence=0, deleted_ids=None):
+    """
+    Reads the journal and applies every change to reservation_rows and payment_rows
+    (dictionaries of ID -> field values). Deleted reservation IDs also go into
+    deleted_ids if given. Changes numbered after_sequence or lower are skipped
+    (the snapshot already has them). Stops at the first damaged block and cuts it off the file, since
+    that's where a crash interrupted a write
+    Returns the number of the last change read and how many changes were read
+    """
+    last_sequence = after_sequence
+    count = 0
+    
+    if not os.path.exists(path):
+        return last_sequence, count
+    
+    with open(path, "rb") as f:
+        content = f.read()
+    
+    good_length = 0
+    while good_length + 8 <= len(content):
+        length, checksum = struct.unpack_from("<II", content, good_length)
+        payload = content[good_length + 8:good_length + 8 + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            break
+        good_length += 8 + length
+        
+        for sequence, op, data in pickle.loads(payload):
+            count += 1
+            if sequence <= after_sequence:
+                continue
+            last_sequence = sequence
+            
+            if op == "reservation":
+                reservation_rows[data[0]] = data
+            elif op == "payment":
+                payment_rows[data[0]] = data
+            elif op == "delete":
+                reservation_rows.pop(data, None)
+                if deleted_ids is not None:
+                    deleted_ids.add(data)
+                note_used_id(data)  # so the deleted ID is never handed out again
+    
+    if good_length < len(content):
+        with open(path, "r+b") as f:
+            f.truncate(good_length)
+    
+    return last_sequence, count
+
+
+def merge_rows(records, record_class, rows, deleted_ids):
+    """
+    Applies journal changes on top of records loaded from a snapshot
+    rows (ID -> field values) replace or add records, deleted_ids get removed
+    """
+    if not rows and not deleted_ids:
+        return records
+    
+    positions = {}
+    for position, record in enumerate(records):
+        positions[record.id] = position
+    
+    for record_id, row in rows.items():
+        if record_id in positions:
+            records[positions[record_id]] = record_class(*row)
+        else:
+            positions[record_id] = len(records)
+            records.append(record_class(*row))
+    
+    if deleted_ids:
+        records = [record for record in records if record.id not in deleted_ids]
+    return records
+
+
+def load_records(snapshot, reservation_rows, payment_rows, deleted_ids):
+    """
+    Replaces all in-memory data with the snapshot (if there is one) plus the
+    journal changes made after it, then rebuilds the lookups
+    """
+    global reservation_id_counter, payment_id_counter
+    
+    reservations = []
+    payments = []
+    if snapshot is not None:
+        # Snapshots store one list per field, so map() can build every record in one go
+        if snapshot["reservations"]:
+            reservations = list(map(Reservation, *snapshot["reservations"]))
+        if snapshot["payments"]:
+            payments = list(map(Payment, *snapshot["payments"]))
+        reservation_id_counter = max(reservation_id_counter, snapshot["reservation_id_counter"])
+        payment_id_counter = max(payment_id_counter, snapshot["payment_id_counter"])
+    
+    reservations_list[:] = merge_rows(reservations, Reservation, reservation_rows, deleted_ids)
+    payments_list[:] = merge_rows(payments, Payment, payment_rows, set())
+    
+    # Keep the ID counters ahead of every ID the journal used
+    # (the snapshot already remembered the counters for everything before it)
+    if reservation_rows:
+        note_used_id(max(reservation_rows, key=lambda record_id: int(record_id[3:])))
+    if payment_rows:
+        note_used_id(max(payment_rows, key=lambda record_id: int(record_id[3:])))
+    
+    rebuild_indexes()
+
+
+def records_to_columns(records, record_class):
+    """Turns a list of records into one list per field (packs smaller and loads faster)"""
+    return [[getattr(record, field) for record in records] for field in record_class.__slots__]
+
+
+def write_snapshot():
+    """
+    Saves all the data to the snapshot file, then empties the journal
+    Writes to a temporary file first and renames it over the old snapshot, so
+    there's always a complete snapshot on disk even if we crash halfway through
+    """
+    global snapshot_sequence, snapshot_last_time
+    
+    if snapshot_path is None:
+        return
+    
+    # No other block can be written until we're done, so the journal we empty at the end
+    # only has changes the snapshot includes (changes still waiting get numbers the snapshot
+    # covers, and replay skips them). engine_lock is only held while the data is copied out
+    claim_journal()
+    try:
+        write_journal_block()
+        with engine_lock:
+            sequence = journal_sequence
+            snapshot = {
+                "sequence": sequence,
+                "reservation_id_counter": reservation_id_counter,
+                "payment_id_counter": payment_id_counter,
+                "reservations": records_to_columns(reservations_list, Reservation),
+                "payments": records_to_columns(payments_list, Payment)
+            }
+        payload = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+        
+        temp_path = snapshot_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(struct.pack("<II", len(payload), zlib.crc32(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, snapshot_path)
+        
+        # Make sure the rename itself is saved (only possible where folders can be opened)
+        if hasattr(os, "O_DIRECTORY"):
+            folder = os.open(os.path.dirname(os.path.abspath(snapshot_path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(folder)
+            finally:
+                os.close(folder)
+        
+        snapshot_sequence = sequence
+        snapshot_last_time = time.time()
+        
+        # The snapshot has everything now, so the journal can start over
+        # (if we crash before this, replay skips changes the snapshot already has)
+        if journal_file is not None:
+            journal_file.truncate(0)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+    finally:
+        release_journal()
+
+
+def read_snapshot(path):
+    """Loads the snapshot file, or returns None if there isn't one"""
+    if not os.path.exists(path):
+        return None
+    
+    with open(path, "rb") as f:
+        content = f.read()
+    
+    length, checksum = struct.unpack_from("<II", content, 0)
+    payload = content[8:8 + length]
+    if len(payload) != length or zlib.crc32(payload) != checksum:
+        raise ValueError(f"Snapshot file {path} is damaged")
+    return pickle.loads(payload)
+
+
+def maybe_write_snapshot():
+    """Takes a new snapshot if the journal has grown big enough or it's been long enough"""
+    changes = journal_sequence - snapshot_sequence
+    if changes <= 0:
+        return
+    if changes >= SNAPSHOT_EVERY_CHANGES or time.time() - snapshot_last_time >= SNAPSHOT_EVERY_SECONDS:
+        write_snapshot()
+
+
+def start_persistence(path=JOURNAL_FILE, snapshot_file=SNAPSHOT_FILE):
+    """
+    Called when the program starts: loads the latest snapshot, replays the
+    journal changes made after it, then opens the journal so new changes get
+    added to the end
+    Returns how many journal changes were replayed
+    """
+    global journal_file, journal_sequence, journal_synced_sequence, journal_last_commit
+    global snapshot_path, snapshot_sequence, snapshot_last_time
+    
+    # Python's garbage collector keeps re-checking every new object while we load
+    # hundreds of thousands of them, so switch it off until loading is done
+    gc.disable()
+    try:
+        snapshot = read_snapshot(snapshot_file) if snapshot_file else None
+        snapshot_sequence = snapshot["sequence"] if snapshot is not None else 0
+        
+        reservation_rows = {}
+        payment_rows = {}
+        deleted_ids = set()
+        journal_sequence, count = read_journal(path, reservation_rows, payment_rows, snapshot_sequence, deleted_ids)
+        if snapshot is not None or reservation_rows or payment_rows:
+            load_records(snapshot, reservation_rows, payment_rows, deleted_ids)
+        snapshot = None
+    finally:
+        gc.enable()
+    
+    # The loaded records will live until the program exits, so let the collector skip them
+    gc.freeze()
+    
+    load_rate_rules(os.path.join(os.path.dirname(path), RATES_FILE))
+    
+    journal_file = open(path, "ab")
+    journal_synced_sequence = journal_sequence
+    journal_last_commit = time.time()
+    snapshot_path = snapshot_file
+    snapshot_last_time = time.time()
+    return count
+
+
+def stop_persistence():
+    """Writes anything still waiting, snapshots if it's due, and closes the journal (called on exit)"""
+    global journal_file
+    
+    if journal_file is None:
+        return
+    journal_commit()
+    maybe_write_snapshot()
+    journal_file.close()
+    journal_file = None
+
+
+# ============================================================
+# SQLITE STORAGE FUNCTIONS
+# ============================================================
+
+def start_database(path=DATABASE_FILE):
+    """
+    Opens (or creates) the SQLite database and loads the working set into memory
+    Returns how many reservations are stored in the database altogether
+    """
+    global db_connection, reservation_id_counter, payment_id_counter
+    
+    # The network service commits from a background thread (always holding engine_lock, see commit_changes)
+    db_connection = sqlite3.connect(path, check_same_thread=False)
+    reservation_columns = ", ".join(Reservation.__slots__)
+    payment_columns = ", ".join(Payment.__slots__)
+    db_connection.executescript(f"""
+        CREATE TABLE IF NOT EXISTS reservations ({reservation_columns}, PRIMARY KEY (id));
+        CREATE TABLE IF NOT EXISTS payments ({payment_columns}, PRIMARY KEY (id));
+        CREATE TABLE IF NOT EXISTS counters (name PRIMARY KEY, value);
+    """)
+    
+    # Databases made by an older version are missing the newer fields (like group_id)
+    stored_columns = {row[1] for row in db_connection.execute("PRAGMA table_info(reservations)")}
+    for field in Reservation.__slots__:
+        if field not in stored_columns:
+            db_connection.execute(f"ALTER TABLE reservations ADD COLUMN {field}")
+    
+    db_connection.executescript("""
+        CREATE INDEX IF NOT EXISTS reservations_room ON reservations (room_number);
+        CREATE INDEX IF NOT EXISTS reservations_guest ON reservations (guest_name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS reservations_status ON reservations (status);
+        CREATE INDEX IF NOT EXISTS reservations_payment_status ON reservations (payment_status);
+        CREATE INDEX IF NOT EXISTS reservations_check_in ON reservations (check_in_date);
+        CREATE INDEX IF NOT EXISTS reservations_check_out ON reservations (check_out_date);
+        CREATE INDEX IF NOT EXISTS reservations_group ON reservations (group_id);
+        CREATE INDEX IF NOT EXISTS payments_reservation ON payments (reservation_id);
+        CREATE INDEX IF NOT EXISTS payments_date ON payments (payment_date);
+    """)
+    
+    # Only the working set goes in this index, so startup reads just those rows instead of the whole table
+    db_connection.execute(f"CREATE INDEX IF NOT EXISTS reservations_working ON reservations (id) WHERE {DATABASE_WORKING_SET}")
+    
+    for name, value in db_connection.execute("SELECT name, value FROM counters"):
+        if name == "reservation":
+            reservation_id_counter = max(reservation_id_counter, value)
+        elif name == "payment":
+            payment_id_counter = max(payment_id_counter, value)
+    
+    load_rate_rules(os.path.join(os.path.dirname(path), RATES_FILE))
+    
+    # INDEXED BY makes SQLite use the working set index (or fail loudly), even before it has any statistics
+    reservations_list[:] = db_query_reservations(DATABASE_WORKING_SET, index="reservations_working")
+    payments_list[:] = db_query_payments(
+        f"reservation_id IN (SELECT id FROM reservations INDEXED BY reservations_working WHERE {DATABASE_WORKING_SET})"
+    )
+    rebuild_indexes()
+    
+    return db_count("reservations")
+
+
+def stop_database():
+    """Saves anything still waiting and closes the database (called on exit)"""
+    global db_connection
+    
+    if db_connection is None:
+        return
+    db_commit()
+    db_connection.close()
+    db_connection = None
+
+
+def db_commit():
+    """Makes all changes since the last commit permanent (one transaction = one disk sync)"""
+    db_connection.execute(
+        "INSERT OR REPLACE INTO counters (name, value) VALUES ('reservation', ?), ('payment', ?)",
+        (reservation_id_counter, payment_id_counter)
+    )
+    db_connection.commit()
+
+
+def db_save_record(table, record):
+    """Inserts a record, or updates it if a record with that ID is already stored"""
+    fields = record.__slots__
+    updates = ", ".join(f"{field} = excluded.{field}" for field in fields[1:])
+    row = record.to_row()
+    if isinstance(record, Reservation) and record.night_cents is not None:
+        # SQLite can't store lists, so the nightly prices go in as text like "150000,150000,300000"
+        row[fields.index("night_cents")] = ",".join(str(cents) for cents in record.night_cents)
+    db_connection.execute(
+        f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))}) "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}",
+        row
+    )
+
+
+def db_query_reservations(where="", params=(), order_by="rowid", index=None):
+    """
+    Returns the stored reservations that match a SQL condition, in the given order
+    index names an index SQLite has to use for it (see start_database)
+    """
+    sql = f"SELECT {', '.join(Reservation.__slots__)} FROM reservations"
+    if index is not None:
+        sql += f" INDEXED BY {index}"
+    if where:
+        sql += f" WHERE {where}"
+    sql += f" ORDER BY {order_by}"
+    reservations = [Reservation(*row) for row in db_connection.execute(sql, params)]
+    for reservation in reservations:
+        if isinstance(reservation.night_cents, str):
+            reservation.night_cents = [int(value) for value in reservation.night_cents.split(",")]
+    return reservations
+
+
+def db_query_payments(where="", params=(), order_by="rowid"):
+    """Returns the stored payments that match a SQL condition, in the given order"""
+    sql = f"SELECT {', '.join(Payment.__slots__)} FROM payments"
+    if where:
+        sql += f" WHERE {where}"
+    sql += f" ORDER BY {order_by}"
+    return [Payment(*row) for row in db_connection.execute(sql, params)]
+
+
+def db_count(table, where="", params=()):
+    """Counts the rows in a table (optionally only the ones matching a condition)"""
+    sql = f"SELECT COUNT(*) FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    return db_connection.execute(sql, params).fetchone()[0]
+
+
+# ============================================================
+# SORTED VIEWS
+# ============================================================
+
+# Every sort option: the fields to sort by (the first one matters most) and whether it goes high to low
+sort_orders = {
+    1: (("guest_name",), False),
+    2: (("guest_name",), True),
+    3: (("room_number",), False),
+    4: (("room_number",), True),
+    5: (("total_cost",), False),
+    6: (("total_cost",), True),
+    7: (("check_in_date",), False),
+    8: (("check_in_date",), True),
+    9: (("room_number", "check_in_date"), False)
+}
+
+
+def get_sort_key(reservation, fields):
+    """Builds the value a reservation is sorted by (guest names ignore upper/lower case)"""
+    key = []
+    for field in fields:
+        value = reservation[field]
+        if field == "guest_name":
+            value = value.lower()
+        key.append(value)
+    return tuple(key)
+
+
+def get_sorted_view(fields, descending=False):
+    """
+    Gives back the reservations sorted by the given fields
+    The first time we sort with Python's built-in sort (O(n log n)) and remember the result,
+    so asking again before anything changes is instant
+    (the built-in sort is stable, so ties stay in the order they were made - even high to low)
+    """
+    view_key = (fields, descending)
+    view = sorted_views.get(view_key)
+    
+    if view is None:
+        keys = {}
+        for reservation in reservations_list:
+            keys[reservation["id"]] = get_sort_key(reservation, fields)
+        records = sorted(reservations_list, key=lambda reservation: keys[reservation["id"]], reverse=descending)
+        view = {"records": records, "keys": keys}
+        sorted_views[view_key] = view
+    
+    return view["records"]
+
+
+def refresh_sorted_views(reservation):
+    """Throws away the sorted views that a new or changed reservation would put out of order"""
+    for view_key in list(sorted_views):
+        old_key = sorted_views[view_key]["keys"].get(reservation["id"])
+        if old_key is None or old_key != get_sort_key(reservation, view_key[0]):
+            del sorted_views[view_key]
+
+
+def remove_from_sorted_views(reservation_id):
+    """Takes a deleted reservation out of the sorted views (the rest stay in order)"""
+    for view in sorted_views.values():
+        if reservation_id in view["keys"]:
+            del view["keys"][reservation_id]
+            view["records"] = [res for res in view["records"] if res["id"] != reservation_id]
+
+
+# ============================================================
+# SAVING CHANGES (JOURNAL OR DATABASE)
+# ============================================================
+
+def save_reservation(reservation):
+    """Saves the latest version of a reservation to whichever storage is in use"""
+    refresh_sorted_views(reservation)
+    refresh_name_index(reservation)
+    refresh_status_indexes(reservation)
+    refresh_outstanding(reservation)
+    if db_connection is not None:
+        db_save_record("reservations", reservation)
+    else:
+        journal_log_reservation(reservation)
+
+
+def save_payment(payment):
+    """Saves a payment (or refund) to whichever storage is in use"""
+    if db_connection is not None:
+        db_save_record("payments", payment)
+    else:
+        journal_log_payment(payment)
+
+
+def save_deletion(reservation_id):
+    """Records that a reservation was deleted"""
+    remove_from_sorted_views(reservation_id)
+    if db_connection is not None:
+        db_connection.execute("DELETE FROM reservations WHERE id = ?", (reservation_id,))
+    else:
+        journal_log_delete(reservation_id)
+
+
+def commit_changes():
+    """Makes sure every saved change is safely on disk (called after each menu option)"""
+    if db_connection is not None:
+        with engine_lock:
+            db_commit()
+    else:
+        journal_commit()
+        maybe_write_snapshot()
+
+
+def count_reservations():
+    """How many reservations there are - in the database if we use one, otherwise in memory"""
+    if db_connection is not None:
+        return db_count("reservations")
+    return len(reservations_list)
+
+
+def count_payments():
+    """How many payments there are - in the database if we use one, otherwise in memory"""
+    if db_connection is not None:
+        return db_count("payments")
+    return len(payments_list)
+
+
+# ============================================================
+# RESERVATION ENGINE (NO INPUT OR PRINTING)
+# ============================================================
+# Every change to the hotel's data goes through these functions. They never ask
+# the user anything and never print - they take plain values (day numbers, minutes
+# after midnight, amounts in pesos), give back the record they made or changed,
+# and raise EngineError when something isn't allowed. The menus below just collect
+# the answers and call them, and other programs can call them directly too.
+# Saving to disk stays with the caller (commit_changes), so many changes can share one commit.
+
+# Engine calls from several threads at once are kept apart by two kinds of locks:
+# - room_type_locks[type key] is held from a booking's "is it free?" check until its nights are
+#   marked as booked, so nobody can book the same room in between (see book). Bookings for
+#   different room types don't wait for each other. Rooms that aren't in available_rooms share
+#   the "" lock
+# - engine_lock is held only while the shared structures change (ID counters, indexes, ledger,
+#   journal_buffer), and for the whole of the calls that only read or change those
+# A room's calendar and bitsets only change while both its type's lock and engine_lock are held,
+# so either one is enough to read them. Locks are always taken in the same order - room type
+# locks (sorted by key), then engine_lock - and the journal is written after letting go of them,
+# so threads don't wait for each other's disk writes (see journal_commit).
+# Both kinds are re-entrant, so engine functions can call each other (see book_group)
+engine_lock = threading.RLock()
+room_type_locks = {"": threading.RLock()}
+for _type_key in available_rooms:
+    room_type_locks[_type_key] = threading.RLock()
+
+
+class EngineError(Exception):
+    """
+    What the engine raises when it can't do something
+    code is a short name a program can check (like "room_unavailable"),
+    message is the explanation to show a person
+    """
+    
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+    
+    def to_dict(self):
+        """The error as a plain dictionary (handy for sending it back as JSON)"""
+        return {"error": self.code, "message": self.message}
+
+
+def require_reservation(reservation_id):
+    """Finds a reservation by ID, or raises a not_found error"""
+    reservation = get_reservation(reservation_id)
+    if reservation is None:
+        raise EngineError("not_found", f"Reservation {reservation_id} was not found.")
+    return reservation
+
+
+def get_room_lock_key(room):
+    """Which room_type_locks lock covers a room ("" for a room that isn't in available_rooms)"""
+    return room_bits[room][0] if room in room_bits else ""
+
+
+def lock_room_types(type_keys):
+    """Takes the locks of some room types, in sorted order so two threads never wait for each other"""
+    for type_key in sorted(type_keys):
+        room_type_locks[type_key].acquire()
+
+
+def unlock_room_types(type_keys):
+    """Lets go of the locks taken by lock_room_types"""
+    for type_key in type_keys:
+        room_type_locks[type_key].release()
+
+
+def lock_reservation_room(reservation_id, other_room=None):
+    """
+    Finds a reservation and locks its room's type (and other_room's type too, if given)
+    Gives back the reservation and the locked type keys (pass them to unlock_room_types)
+    The reservation might move room while we wait for the lock, so that's checked once we have it
+    """
+    while True:
+        reservation = require_reservation(reservation_id)
+        type_keys = {get_room_lock_key(reservation["room_number"])}
+        if other_room is not None:
+            type_keys.add(get_room_lock_key(other_room))
+        lock_room_types(type_keys)
+        if get_reservation(reservation_id) is reservation and get_room_lock_key(reservation["room_number"]) in type_keys:
+            return reservation, type_keys
+        unlock_room_types(type_keys)
+
+
+def check_amount(amount, most=None):
+    """Makes sure an amount of money is more than zero (and not more than most, if given)"""
+    if amount <= 0:
+        raise EngineError("invalid_amount", "Amount must be more than ₱0.00.")
+    if most is not None and to_cents(amount) > to_cents(most):
+        raise EngineError("invalid_amount", f"Amount can't be more than ₱{most:,.2f}.")
+
+
+def check_payment_method(payment_method):
+    """Makes sure the payment method is one we accept"""
+    if payment_method not in payment_methods.values():
+        raise EngineError("invalid_method", f"Unknown payment method: {payment_method}.")
+
+
+def update_balance(reservation):
+    """Works out the balance and payment status again after the reservation's cost changed"""
+    reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
+    if reservation["balance"] <= 0:
+        reservation["payment_status"] = "Paid"
+        reservation["balance"] = 0
+    elif reservation["total_paid"] > 0:
+        reservation["payment_status"] = "Partial"
+    else:
+        reservation["payment_status"] = "Pending"
+
+
+def move_to_room(reservation, new_room):
+    """Moves a reservation from its room's list to another room's list"""
+    old_room = reservation["room_number"]
+    if old_room in room_reservations:
+        room_reservations[old_room] = [r for r in room_reservations[old_room] if r["id"] != reservation["id"]]
+    if new_room not in room_reservations:
+        room_reservations[new_room] = []
+    room_reservations[new_room].append(reservation)
+    reservation["room_number"] = new_room
+
+
+def record_payment(reservation, amount, payment_method, payment_date, payment_time, reference, notes, status):
+    """Makes a payment record (negative amount for a refund) and adds it to the payment structures"""
+    payment = Payment(
+        id=generate_payment_id(),
+        reservation_id=reservation["id"],
+        guest_name=reservation["guest_name"],
+        amount=amount,
+        payment_method=payment_method,
+        reference=reference,
+        payment_date=payment_date,
+        payment_time=payment_time,
+        notes=notes,
+        status=status
+    )
+    
+    # Add to Linear Structure (List) and the running totals
+    payments_list.append(payment)
+    ledger_add_payment(payment)
+    
+    # Add to Non-Linear Structure (Dictionary by reservation ID)
+    if reservation["id"] not in reservation_payments:
+        reservation_payments[reservation["id"]] = []
+    reservation_payments[reservation["id"]].append(payment)
+    return payment
+
+
+def book(guest_name, phone, email, num_guests, room_type_key, check_in, check_out,
+         room_number=None, check_in_time=14 * 60, check_out_time=12 * 60, group_id=None, lock_room=True):
+    """
+    Books a room and gives back the new Reservation
+    room_type_key is "1" to "5" (see room_types), check_in and check_out are day numbers
+    If room_number is left out, the best free room of that type is picked (see pick_room).
+    A room picked by hand is locked so the re-optimization job won't move it, unless lock_room is False
+    group_id is only given by book_group
+    """
+    room_type_key = str(room_type_key)
+    if room_type_key not in room_types:
+        raise EngineError("invalid_room_type", f"There is no room type {room_type_key}.")
+    room_info = room_types[room_type_key]
+    
+    if not guest_name.strip():
+        raise EngineError("invalid_name", "Guest name can't be empty.")
+    if num_guests < 1:
+        raise EngineError("invalid_guests", "A reservation needs at least 1 guest.")
+    if num_guests > room_info["capacity"]:
+        raise EngineError("over_capacity", f"{room_info['type']} rooms fit at most {room_info['capacity']} guest(s).")
+    if check_out <= check_in:
+        raise EngineError("invalid_dates", "Check-out date must be after check-in date.")
+    
+    room_locked = room_number is not None and lock_room
+    
+    # Only bookings for the same room type wait here (see room_type_locks)
+    with room_type_locks[room_type_key]:
+        # Pick (or check) a room that is free for the whole stay
+        if room_number is None:
+            room_number = pick_room(room_type_key, check_in, check_out)
+            if room_number is None:
+                raise EngineError("room_unavailable", f"No {room_info['type']} rooms are free for those dates.")
+        elif room_number not in available_rooms[room_type_key]:
+            raise EngineError("invalid_room", f"Room {room_number} is not a {room_info['type']} room.")
+        elif not is_room_available(room_number, check_in, check_out):
+            raise EngineError("room_unavailable", f"Room {room_number} is already booked for those dates.")
+        
+        with engine_lock:
+            # Price every night from the rate calendar (price_per_night is just the average rate)
+            nights = calculate_nights(check_in, check_out)
+            night_cents = get_night_cents(room_type_key, check_in, check_out)
+            total_cost = sum(night_cents) / 100
+            price_per_night = round(total_cost / nights, 2)
+            
+            # Create reservation record (slotted record - see Reservation class)
+            reservation = Reservation(
+                id=generate_reservation_id(),
+                guest_name=guest_name,
+                phone=phone,
+                email=email,
+                num_guests=num_guests,
+                room_type=room_info["type"],
+                room_number=room_number,
+                check_in_date=check_in,
+                check_out_date=check_out,
+                check_in_time=check_in_time,
+                check_out_time=check_out_time,
+                nights=nights,
+                price_per_night=price_per_night,
+                total_cost=total_cost,
+                group_id=group_id,
+                room_locked=room_locked,
+                night_cents=night_cents
+            )
+            
+            # Add to Linear Structure (List)
+            reservations_list.append(reservation)
+            
+            # Add to the ID index (Non-Linear Structure) and the running totals
+            index_reservation(reservation)
+            ledger_add_reservation(reservation)
+            
+            # Add to Non-Linear Structure (Dictionary by room number)
+            if room_number not in room_reservations:
+                room_reservations[room_number] = []
+            room_reservations[room_number].append(reservation)
+            
+            # Block the room's nights in the availability calendar
+            occupy_room(reservation)
+            
+            # Initialize payment tracking (Non-Linear Structure)
+            reservation_payments[reservation["id"]] = []
+            
+            save_reservation(reservation)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+# How plan_group_rooms can pick a group's rooms
+group_preferences = {"price": "Lowest total price", "rooms": "Fewest rooms"}
+
+
+def plan_group_rooms(party_size, check_in, check_out, prefer="price", room_type_keys=None):
+    """
+    Works out which rooms a group should get for the nights from check_in to check_out
+    prefer="price" finds the cheapest set of free rooms that fits everyone (fewest rooms on a tie),
+    prefer="rooms" the fewest rooms (cheapest on a tie); room_type_keys limits the types used
+    Gives back a list of (room type key, number of guests), biggest rooms first
+    
+    It's a bin-packing style search: best[g] is the best set of rooms found so far that fits
+    at least g guests (g stops at party_size), and each free room either goes in or it doesn't,
+    like the 0/1 knapsack problem but filling beds instead of a bag
+    """
+    if party_size < 1:
+        raise EngineError("invalid_guests", "A group needs at least 1 guest.")
+    if prefer not in group_preferences:
+        raise EngineError("invalid_preference", f"prefer must be one of: {', '.join(group_preferences)}.")
+    if check_out <= check_in:
+        raise EngineError("invalid_dates", "Check-out date must be after check-in date.")
+    
+    type_keys = list(room_types) if room_type_keys is None else [str(key) for key in room_type_keys]
+    for key in type_keys:
+        if key not in room_types:
+            raise EngineError("invalid_room_type", f"There is no room type {key}.")
+    
+    # best[g] = (total price in centavos, number of rooms, how many rooms of each type), None if nothing fits g yet
+    best = [None] * (party_size + 1)
+    best[0] = (0, 0, (0,) * len(type_keys))
+    for position, key in enumerate(type_keys):
+        capacity = room_types[key]["capacity"]
+        price = get_stay_cents(key, check_in, check_out)
+        free_count = bin(get_free_room_bits(key, check_in, check_out)).count("1")
+        
+        # More rooms of one type than it takes to fit the whole group in them never helps
+        for _ in range(min(free_count, -(-party_size // capacity))):
+            # Top down, so each pass adds this room at most once
+            for guests in range(party_size - 1, -1, -1):
+                if best[guests] is None:
+                    continue
+                cost, rooms, counts = best[guests]
+                option = (cost + price, rooms + 1, counts[:position] + (counts[position] + 1,) + counts[position + 1:])
+                target = min(party_size, guests + capacity)
+                current = best[target]
+                if current is None:
+                    best[target] = option
+                elif prefer == "price" and (option[0], option[1]) < (current[0], current[1]):
+                    best[target] = option
+                elif prefer == "rooms" and (option[1], option[0]) < (current[1], current[0]):
+                    best[target] = option
+    
+    if best[party_size] is None:
+        raise EngineError("room_unavailable", f"There aren't enough free rooms for a group of {party_size} on those dates.")
+    
+    chosen = []
+    for position, key in enumerate(type_keys):
+        chosen += [key] * best[party_size][2][position]
+    chosen.sort(key=lambda key: -room_types[key]["capacity"])
+    
+    # Fill the big rooms first, but leave at least 1 guest for every room still to come
+    plan = []
+    remaining = party_size
+    for index, key in enumerate(chosen):
+        guests = min(room_types[key]["capacity"], remaining - (len(chosen) - index - 1))
+        plan.append((key, guests))
+        remaining -= guests
+    return plan
+
+
+def book_group(guest_name, phone, email, party_size, check_in, check_out, prefer="price",
+               room_type_keys=None, check_in_time=14 * 60, check_out_time=12 * 60):
+    """
+    Books enough rooms for a whole group in one go (see plan_group_rooms) and gives back the Reservations
+    Every room is booked under the lead guest's name with the same group_id ("GRP" plus
+    the first room's reservation number). It's all or nothing: if one room fails, the ones
+    already booked are deleted again, and the journal keeps the whole group in one block
+    (every room type is locked until the whole group is in)
+    """
+    global journal_holding
+    
+    lock_room_types(room_type_locks)
+    try:
+        with engine_lock:
+            plan = plan_group_rooms(party_size, check_in, check_out, prefer, room_type_keys)
+            group_id = f"GRP{reservation_id_counter}"
+            booked = []
+            journal_holding = True
+            try:
+                for room_type_key, num_guests in plan:
+                    booked.append(book(guest_name, phone, email, num_guests, room_type_key, check_in, check_out,
+                                       None, check_in_time, check_out_time, group_id))
+            except BaseException:
+                # Anything that stops the group partway (not only a rule saying no) undoes the rooms already booked
+                for reservation in booked:
+                    delete(reservation["id"])
+                raise
+            finally:
+                journal_holding = False
+    finally:
+        unlock_room_types(room_type_locks)
+    
+    journal_commit_if_due()
+    return booked
+
+
+def apply_room_moves(moves):
+    """
+    Moves reservations to new rooms of the same type all together: moves is a list of (reservation, room)
+    Every moved stay leaves its old room first, so two stays can swap rooms. The cost doesn't change
+    (same room type), and the journal keeps all the moves in one block
+    """
+    global journal_holding
+    
+    journal_holding = True
+    try:
+        for reservation, room in moves:
+            release_room(reservation)
+        for reservation, room in moves:
+            move_to_room(reservation, room)
+            occupy_room(reservation)
+            save_reservation(reservation)
+    finally:
+        journal_holding = False
+
+
+def optimize_room_assignments(first_night, horizon=90, apply=True):
+    """
+    Re-optimization job: moves future bookings between rooms of the same type so the free nights
+    form fewer, longer stretches (and fewer one-night holes nobody books)
+    Only stays checking in from first_night to horizon nights later can move - stays that already
+    started or start later, and rooms picked by hand (room_locked), stay where they are. A room type only changes if the new plan is
+    better (fewer orphan nights, or as many but fewer gaps). With apply=False nothing moves
+    Returns a report of the fragmentation before and after, per room type and for the hotel
+    """
+    lock_room_types(room_type_locks)
+    try:
+        with engine_lock:
+            if horizon < 1 or horizon > 366:
+                raise EngineError("invalid_dates", "The horizon must be 1 to 366 nights.")
+            last_night = first_night + horizon
+            
+            report = {
+                "first_night": format_date(first_night),
+                "last_night": format_date(last_night - 1),
+                "stays_considered": 0,
+                "moved": 0,
+                "room_types": {}
+            }
+            moves = []
+            for type_key, rooms in available_rooms.items():
+                busy_until = {}
+                locked_stays = {}
+                fixed_stays = {}
+                current_stays = {}
+                stays = []
+                for room in rooms:
+                    busy_until[room] = first_night
+                    locked_stays[room] = []
+                    fixed_stays[room] = []
+                    current_stays[room] = []
+                    calendar = room_calendar.get(room)
+                    if not calendar:
+                        continue
+                    
+                    # Stays in a room never overlap, so the check-outs are sorted too:
+                    # jump straight to the first stay still running on first_night
+                    starts = calendar["starts"]
+                    ends = calendar["ends"]
+                    idx = bisect.bisect_right(ends, first_night)
+                    while idx < len(starts) and starts[idx] < last_night:
+                        current_stays[room].append((starts[idx], ends[idx]))
+                        if starts[idx] < first_night:
+                            busy_until[room] = ends[idx]
+                            fixed_stays[room].append((starts[idx], ends[idx]))
+                        elif reservation_index[calendar["ids"][idx]]["room_locked"]:
+                            # The room was picked by hand, so the stay stays in it
+                            locked_stays[room].append((starts[idx], ends[idx]))
+                            fixed_stays[room].append((starts[idx], ends[idx]))
+                        else:
+                            stays.append((starts[idx], ends[idx], calendar["ids"][idx], room))
+                        idx += 1
+                    if idx < len(starts):
+                        locked_stays[room].append((starts[idx], ends[idx]))
+                
+                before = measure_fragmentation(current_stays, first_night, last_night)
+                after = before
+                type_moves = []
+                assignment = plan_room_assignments(rooms, busy_until, locked_stays, stays)
+                if assignment is not None:
+                    for start, end, reservation_id, room in stays:
+                        fixed_stays[assignment[reservation_id]].append((start, end))
+                    planned = measure_fragmentation(fixed_stays, first_night, last_night)
+                    if (planned["orphan_nights"], planned["free_gaps"]) < (before["orphan_nights"], before["free_gaps"]):
+                        after = planned
+                        for start, end, reservation_id, room in stays:
+                            if assignment[reservation_id] != room:
+                                type_moves.append((reservation_index[reservation_id], assignment[reservation_id]))
+                
+                report["stays_considered"] += len(stays)
+                report["moved"] += len(type_moves)
+                report["room_types"][room_types[type_key]["type"]] = {"before": before, "after": after, "moved": len(type_moves)}
+                moves += type_moves
+            
+            # Hotel totals (the longest gap is the longest anywhere, the rest add up)
+            for side in ("before", "after"):
+                totals = {}
+                for figures in report["room_types"].values():
+                    for name, value in figures[side].items():
+                        if name == "longest_gap":
+                            totals[name] = max(totals.get(name, 0), value)
+                        else:
+                            totals[name] = totals.get(name, 0) + value
+                report[side] = totals
+            
+            if apply and moves:
+                apply_room_moves(moves)
+    finally:
+        unlock_room_types(room_type_locks)
+    
+    journal_commit_if_due()
+    return report
+
+
+def pay(reservation_id, amount, payment_method, payment_date, payment_time, reference="N/A", notes="N/A"):
+    """
+    Records a payment (full or part of the balance) for an active reservation
+    Gives back the new Payment; the reservation's balance and payment status are updated
+    """
+    with engine_lock:
+        reservation = require_reservation(reservation_id)
+        if reservation["status"] != "Active":
+            raise EngineError("not_active", "Payments can only be made for active reservations.")
+        if reservation["payment_status"] == "Paid":
+            raise EngineError("already_paid", "This reservation is already fully paid.")
+        check_amount(amount, reservation["balance"])
+        check_payment_method(payment_method)
+        
+        payment = record_payment(reservation, amount, payment_method, payment_date, payment_time,
+                                 reference, notes, "Completed")
+        
+        # Update reservation payment status
+        reservation["total_paid"] += amount
+        reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
+        if reservation["balance"] <= 0:
+            reservation["payment_status"] = "Paid"
+            reservation["balance"] = 0
+        elif reservation["total_paid"] > 0:
+            reservation["payment_status"] = "Partial"
+        
+        # Save both the payment and the updated reservation
+        save_payment(payment)
+        save_reservation(reservation)
+    
+    journal_commit_if_due()
+    return payment
+
+
+def add_charge(reservation_id, amount):
+    """Adds an extra charge (room service, minibar, ...) to an active reservation's bill"""
+    with engine_lock:
+        reservation = require_reservation(reservation_id)
+        if reservation["status"] != "Active":
+            raise EngineError("not_active", "Charges can only be added to active reservations.")
+        check_amount(amount)
+        
+        reservation["additional_charges"] += amount
+        reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
+        
+        # Update payment status if balance increased
+        if reservation["payment_status"] == "Paid" and reservation["balance"] > 0:
+            reservation["payment_status"] = "Partial"
+        
+        save_reservation(reservation)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def refund(reservation_id, amount, payment_method, refund_date, refund_time, reference="N/A", notes="REFUND"):
+    """
+    Gives money back for a cancelled reservation (up to what was paid)
+    The refund is stored as a payment with a negative amount, and that Payment is given back
+    """
+    with engine_lock:
+        reservation = require_reservation(reservation_id)
+        if reservation["status"] != "Cancelled":
+            raise EngineError("not_cancelled", "Refunds can only be issued for cancelled reservations.")
+        if reservation["total_paid"] <= 0:
+            raise EngineError("nothing_to_refund", "No payments found for this reservation. Nothing to refund.")
+        check_amount(amount, reservation["total_paid"])
+        check_payment_method(payment_method)
+        
+        refund_payment = record_payment(reservation, -amount, payment_method, refund_date, refund_time,
+                                        reference, notes, "Refunded")
+        
+        reservation["total_paid"] -= amount
+        reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
+        if reservation["total_paid"] <= 0:
+            reservation["payment_status"] = "Refunded"
+        else:
+            reservation["payment_status"] = "Partial Refund"
+        
+        # Save both the refund and the updated reservation
+        save_payment(refund_payment)
+        save_reservation(reservation)
+    
+    journal_commit_if_due()
+    return refund_payment
+
+
+def get_booked_night_cents(reservation):
+    """
+    What each night of a reservation was booked at, in centavos (see Reservation)
+    Bookings saved before night_cents existed get their room charges spread evenly over the nights
+    """
+    if reservation["night_cents"] is not None:
+        return reservation["night_cents"]
+    total = to_cents(reservation["total_cost"])
+    nights = reservation["nights"]
+    return [total // nights + (1 if night < total % nights else 0) for night in range(nights)]
+
+
+def change_dates(reservation_id, check_in=None, check_out=None, check_in_time=None, check_out_time=None):
+    """
+    Moves a reservation's check-in and/or check-out (anything left as None stays the same)
+    The room must be free on the nights the change adds (room_unavailable otherwise)
+    The nights, total cost, balance and payment status are worked out again: nights the
+    reservation already had keep the rate it was booked at, new nights get the rate calendar's price
+    """
+    reservation, type_keys = lock_reservation_room(reservation_id)
+    try:
+        with engine_lock:
+            new_check_in = reservation["check_in_date"] if check_in is None else check_in
+            new_check_out = reservation["check_out_date"] if check_out is None else check_out
+            if new_check_out <= new_check_in:
+                raise EngineError("invalid_dates", "Check-in date must be before check-out date.")
+            
+            conflict = find_date_change_conflict(reservation, new_check_in, new_check_out)
+            if conflict is not None:
+                raise EngineError("room_unavailable",
+                                  f"Room {reservation['room_number']} is booked by {conflict} on some of those nights.")
+            
+            # Price the stay: booked rate for the nights it keeps, today's rates for any new nights
+            old_check_in = reservation["check_in_date"]
+            old_check_out = reservation["check_out_date"]
+            room_type_key = get_room_type_key(reservation["room_type"])
+            booked_nights = get_booked_night_cents(reservation)
+            kept_from = max(old_check_in, new_check_in)
+            kept_to = min(old_check_out, new_check_out)
+            night_cents = []
+            if new_check_in < old_check_in:
+                night_cents += get_night_cents(room_type_key, new_check_in, min(new_check_out, old_check_in))
+            if kept_to > kept_from:
+                night_cents += booked_nights[kept_from - old_check_in:kept_to - old_check_in]
+            if new_check_out > old_check_out:
+                night_cents += get_night_cents(room_type_key, max(new_check_in, old_check_out), new_check_out)
+            
+            # The cost changes, so take the old one out of the running totals first
+            ledger_remove_reservation(reservation)
+            
+            # Move the booking's nights in the room calendar and the date indexes
+            if reservation["status"] == "Active":
+                shift_room_stay(reservation, new_check_in, new_check_out)
+            if new_check_in != reservation["check_in_date"]:
+                move_in_date_index(checkin_index, reservation["check_in_date"], new_check_in, reservation)
+                reservation["check_in_date"] = new_check_in
+            if new_check_out != reservation["check_out_date"]:
+                move_in_date_index(checkout_index, reservation["check_out_date"], new_check_out, reservation)
+                reservation["check_out_date"] = new_check_out
+            if check_in_time is not None:
+                reservation["check_in_time"] = check_in_time
+            if check_out_time is not None:
+                reservation["check_out_time"] = check_out_time
+            
+            reservation["nights"] = calculate_nights(new_check_in, new_check_out)
+            reservation["night_cents"] = night_cents
+            reservation["total_cost"] = sum(night_cents) / 100
+            reservation["price_per_night"] = round(reservation["total_cost"] / reservation["nights"], 2)
+            ledger_add_reservation(reservation)
+            update_balance(reservation)
+            
+            save_reservation(reservation)
+    finally:
+        unlock_room_types(type_keys)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def change_room(reservation_id, new_room):
+    """
+    Moves a reservation to another room that is free for its nights
+    If the new room is a different type, the rate and total cost change to match.
+    The new room was picked by hand, so it gets locked (see Reservation)
+    """
+    # Both the old and the new room's types are locked
+    reservation, type_keys = lock_reservation_room(reservation_id, new_room)
+    try:
+        with engine_lock:
+            if new_room not in room_bits:
+                raise EngineError("invalid_room", f"There is no room {new_room}.")
+            if new_room == reservation["room_number"]:
+                raise EngineError("same_room", f"The reservation is already in room {new_room}.")
+            
+            new_type_key = room_bits[new_room][0]
+            room_info = room_types[new_type_key]
+            if reservation["num_guests"] > room_info["capacity"]:
+                raise EngineError("over_capacity", f"{room_info['type']} rooms fit at most {room_info['capacity']} guest(s).")
+            if not is_room_available(new_room, reservation["check_in_date"], reservation["check_out_date"], ignore_id=reservation["id"]):
+                raise EngineError("room_unavailable", f"Room {new_room} is already booked for those dates.")
+            
+            # Take the old room type and cost out of the running totals
+            ledger_remove_reservation(reservation)
+            
+            if reservation["status"] == "Active":
+                release_room(reservation)
+            move_to_room(reservation, new_room)
+            reservation["room_locked"] = True
+            
+            type_changed = room_info["type"] != reservation["room_type"]
+            if type_changed:
+                reservation["room_type"] = room_info["type"]
+                reservation["night_cents"] = get_night_cents(new_type_key, reservation["check_in_date"], reservation["check_out_date"])
+                reservation["total_cost"] = sum(reservation["night_cents"]) / 100
+                reservation["price_per_night"] = round(reservation["total_cost"] / reservation["nights"], 2)
+            if reservation["status"] == "Active":
+                occupy_room(reservation)
+            ledger_add_reservation(reservation)
+            if type_changed:
+                update_balance(reservation)
+            
+            save_reservation(reservation)
+    finally:
+        unlock_room_types(type_keys)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def change_guests(reservation_id, num_guests):
+    """Changes the number of guests (it has to fit in the reservation's room)"""
+    with engine_lock:
+        reservation = require_reservation(reservation_id)
+        if num_guests < 1:
+            raise EngineError("invalid_guests", "A reservation needs at least 1 guest.")
+        room_type_key = get_room_type_key(reservation["room_type"])
+        if room_type_key and num_guests > room_types[room_type_key]["capacity"]:
+            raise EngineError("over_capacity", f"Current room can only accommodate {room_types[room_type_key]['capacity']} guest(s).")
+        
+        ledger_remove_reservation(reservation)
+        reservation["num_guests"] = num_guests
+        ledger_add_reservation(reservation)
+        save_reservation(reservation)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def update_contact(reservation_id, phone=None, email=None):
+    """Changes the guest's phone number and/or email (None leaves one as it is)"""
+    with engine_lock:
+        reservation = require_reservation(reservation_id)
+        if phone:
+            reservation["phone"] = phone
+        if email:
+            reservation["email"] = email
+        if phone or email:
+            save_reservation(reservation)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def cancel(reservation_id):
+    """Marks a reservation as cancelled (it stays on file) and frees its room's nights"""
+    reservation, type_keys = lock_reservation_room(reservation_id)
+    try:
+        with engine_lock:
+            if reservation["status"] == "Cancelled":
+                raise EngineError("already_cancelled", "This reservation is already cancelled.")
+            
+            release_room(reservation)
+            ledger_remove_reservation(reservation)
+            reservation["status"] = "Cancelled"
+            ledger_add_reservation(reservation)
+            save_reservation(reservation)
+    finally:
+        unlock_room_types(type_keys)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def delete(reservation_id):
+    """Removes a reservation completely (its payment records stay) and gives it back"""
+    reservation, type_keys = lock_reservation_room(reservation_id)
+    try:
+        with engine_lock:
+            # Delete from Linear structure (List), the ID index and the running totals
+            index = get_reservation_position(reservation)
+            reservations_list.pop(index)
+            unindex_reservation(reservation, index)
+            ledger_remove_reservation(reservation)
+            
+            # Free up the room's nights if the booking was still active
+            if reservation["status"] == "Active":
+                release_room(reservation)
+            
+            # Delete from Non-Linear structure (Dictionary)
+            room_num = reservation["room_number"]
+            if room_num in room_reservations:
+                room_reservations[room_num] = [r for r in room_reservations[room_num] if r["id"] != reservation["id"]]
+            
+            save_deletion(reservation["id"])
+    finally:
+        unlock_room_types(type_keys)
+    
+    journal_commit_if_due()
+    return reservation
+
+
+def query(reservation_id=None, guest_name=None, room_number=None, status=None, check_in_from=None, check_in_to=None,
+          group_id=None):
+    """
+    Finds the reservations that match every filter given (filters left as None are skipped)
+    guest_name matches part of a name, check_in_from/check_in_to are day numbers (both included),
+    group_id gives every room of a group booking
+    Results come back in the order the reservations were made
+    """
+    with engine_lock:
+        if db_connection is not None:
+            # The database has every reservation, not just the working set
+            conditions = []
+            params = []
+            if reservation_id is not None:
+                conditions.append("id = ?")
+                params.append(reservation_id.strip().upper())
+            if guest_name is not None:
+                conditions.append("guest_name LIKE ?")
+                params.append(f"%{guest_name}%")
+            if room_number is not None:
+                conditions.append("room_number = ?")
+                params.append(room_number)
+            if status is not None:
+                conditions.append("status = ?")
+                params.append(status)
+            if check_in_from is not None:
+                conditions.append("check_in_date >= ?")
+                params.append(check_in_from)
+            if check_in_to is not None:
+                conditions.append("check_in_date <= ?")
+                params.append(check_in_to)
+            if group_id is not None:
+                conditions.append("group_id = ?")
+                params.append(group_id.strip().upper())
+            return db_query_reservations(" AND ".join(conditions), params)
+        
+        # Start from the smallest group one of the indexes can give us...
+        if reservation_id is not None:
+            reservation = get_reservation(reservation_id)
+            matches = [reservation] if reservation else []
+        elif group_id is not None:
+            matches = get_reservations_by_ids(group_index.get(group_id.strip().upper(), set()))
+        elif guest_name is not None:
+            matches = search_guest_names(guest_name)
+        elif check_in_from is not None or check_in_to is not None:
+            first_day = check_in_from if check_in_from is not None else 0
+            last_day = check_in_to if check_in_to is not None else checkin_index["days"][-1] if checkin_index["days"] else 0
+            matches = get_reservations_between(checkin_index, first_day, last_day)
+        elif room_number is not None:
+            matches = room_reservations.get(room_number, [])
+        elif status is not None:
+            matches = get_reservations_with_status(status)
+        else:
+            matches = reservations_list
+        
+        # ...then check the other filters on just those
+        results = []
+        guest_text = guest_name.lower() if guest_name is not None else None
+        for reservation in matches:
+            if guest_text is not None and guest_text not in reservation["guest_name"].lower():
+                continue
+            if room_number is not None and reservation["room_number"] != room_number:
+                continue
+            if status is not None and reservation["status"] != status:
+                continue
+            if check_in_from is not None and reservation["check_in_date"] < check_in_from:
+                continue
+            if check_in_to is not None and reservation["check_in_date"] > check_in_to:
+                continue
+            if group_id is not None and reservation["group_id"] != group_id.strip().upper():
+                continue
+            results.append(reservation)
+        
+        # The date index and room lists aren't in booking order, so put them back in order
+        if len(results) > 1 and matches is not reservations_list:
+            results = get_reservations_by_ids({reservation["id"] for reservation in results})
+        return results
+
+
+def get_quotes(check_in, check_out, num_guests):
+    """
+    Quote search: every room type that fits num_guests and has a room free for the whole stay,
+    cheapest first - [{"room_type_key", "room_type", "capacity", "free_rooms", "price_per_night",
+    "total_price"}, ...]. Prices come from the rate calendar (price_per_night is the average).
+    An empty list means no single room works (try book_group)
+    The same search again is answered from quote_cache until something is booked, moved or
+    freed on one of its nights or the rate rules change (please don't change the list you get
+    back - it's shared)
+    """
+    with engine_lock:
+        if check_out <= check_in:
+            raise EngineError("invalid_dates", "Check-out date must be after check-in date.")
+        if num_guests < 1:
+            raise EngineError("invalid_guests", "A reservation needs at least 1 guest.")
+        
+        key = (check_in, check_out, num_guests)
+        quotes = quote_cache.get(key)
+        if quotes is not None:
+            return quotes
+        
+        nights = calculate_nights(check_in, check_out)
+        quotes = []
+        for room_type_key, room_info in room_types.items():
+            if room_info["capacity"] < num_guests:
+                continue
+            free_rooms = bin(get_free_room_bits(room_type_key, check_in, check_out)).count("1")
+            if free_rooms:
+                total_price = get_stay_price(room_type_key, check_in, check_out)
+                quotes.append({
+                    "room_type_key": room_type_key,
+                    "room_type": room_info["type"],
+                    "capacity": room_info["capacity"],
+                    "free_rooms": free_rooms,
+                    "price_per_night": round(total_price / nights, 2),
+                    "total_price": total_price
+                })
+        quotes.sort(key=lambda quote: quote["total_price"])
+        
+        if len(quote_cache) >= QUOTE_CACHE_SIZE:
+            quote_cache.clear()
+            quote_cache_nights.clear()
+        quote_cache[key] = quotes
+        for night in range(check_in, check_out):
+            if night not in quote_cache_nights:
+                quote_cache_nights[night] = set()
+            quote_cache_nights[night].add(key)
+        return quotes
+
+
+def set_rate_rules(rules):
+    """
+    Replaces all the rate rules (see RATE CALENDAR) and saves them to the rates file
+    Reservations keep the prices they were booked at - only new prices use the new rules
+    Gives back the rules now in use
+    """
+    with engine_lock:
+        for rule in rules:
+            try:
+                check_rate_rule(rule)
+            except ValueError as error:
+                raise EngineError("invalid_rule", str(error))
+        rate_rules[:] = rules
+        rate_prefix.clear()
+        quote_cache.clear()
+        quote_cache_nights.clear()
+        save_rate_rules()
+        return rate_rules
+
+
+def get_nightly_rates(first_night, last_night):
+    """
+    Each room type's price for every night from first_night to last_night (both included, at most 366)
+    Returns a list of {"night": DD/MM/YYYY, room type name: price in pesos, ...}
+    """
+    with engine_lock:
+        if last_night < first_night or last_night - first_night >= 366:
+            raise EngineError("invalid_dates", "Last night must be on or after the first night, at most 366 nights later.")
+        nights = []
+        for night in range(first_night, last_night + 1):
+            rates = {"night": format_date(night)}
+            for room_type_key, room_info in room_types.items():
+                rates[room_info["type"]] = get_stay_price(room_type_key, night, night + 1)
+            nights.append(rates)
+        return nights
+
+
+# ============================================================
+# CORE FUNCTIONS - CRUDS OPERATIONS
+# ============================================================
+
+def create_reservation():
+    """
+    CREATE Operation - Makes a new hotel reservation
+    This shows how we add data to both our list and dictionary
+    Gets all the guest info, sets dates, picks a room that's free on those nights, calculates cost
+    """
+    clear_screen()
+    print_header("CREATE NEW RESERVATION")
+    
+    print("\nPlease provide guest information:")
+    print_separator()
+    
+    # Collect guest information with validation
+    guest_name = validate_string_input("Guest Full Name: ", min_length=2, max_length=50)
+    guest_phone = validate_phone_input("Contact Number: ")
+    guest_email = validate_email_input("Email Address: ")
+    num_guests = validate_integer_input("Number of Guests: ", min_val=1, max_val=GROUP_MAX_GUESTS)
+    
+    print("\n")
+    print_separator()
+    print("CHECK-IN & CHECK-OUT DATES")
+    print_separator()
+    print("Enter dates in DD/MM/YYYY format")
+    
+    check_in = validate_date_input("\nCheck-in Date (DD/MM/YYYY): ")
+    
+    # Validate check-out is after check-in
+    while True:
+        check_out = validate_date_input("Check-out Date (DD/MM/YYYY): ")
+        if compare_dates(check_out, check_in) <= 0:
+            print("Error: Check-out date must be after check-in date. Please try again.")
+        else:
+            break
+    
+    check_in_time = validate_time_input("Check-in Time (HH:MM, 24-hour format): ")
+    check_out_time = validate_time_input("Check-out Time (HH:MM, 24-hour format): ")
+    
+    print("\n")
+    print_separator()
+    print("ROOM SELECTION")
+    print_separator()
+    display_room_types()
+    display_quotes(check_in, check_out, num_guests)
+    
+    # Select room type with capacity validation
+    while True:
+        room_type_choice = validate_integer_input("\nSelect Room Type (1-5): ", min_val=1, max_val=5)
+        room_type_key = str(room_type_choice)
+        
+        # Check capacity
+        if num_guests > room_types[room_type_key]["capacity"]:
+            print(f"\nError: Selected room type can accommodate maximum {room_types[room_type_key]['capacity']} guest(s).")
+            print(f"You have {num_guests} guest(s). Please select a room type with sufficient capacity.")
+            
+            # Find suitable room types
+            suitable_rooms = []
+            for key, info in room_types.items():
+                if info["capacity"] >= num_guests:
+                    suitable_rooms.append((key, info))
+            
+            if suitable_rooms:
+                print(f"\nSuggested room types for {num_guests} guest(s):")
+                for key, info in suitable_rooms:
+                    print(f"  {key}. {info['type']} (capacity: {info['capacity']} guest(s), ₱{info['price']:,.2f}/night)")
+            else:
+                print(f"\nSorry, no single room can accommodate {num_guests} guest(s).")
+                print(f"Maximum capacity per room is 6 guests (Presidential Suite).")
+                
+                print("\nWould you like to:")
+                print("1. Book several rooms as a group (rooms are picked for you)")
+                print("2. Continue anyway (select best available room)")
+                print("3. Cancel this reservation")
+                
+                choice = validate_integer_input("\nSelect option (1-3): ", min_val=1, max_val=3)
+                if choice == 1:
+                    create_group_reservation(guest_name, guest_phone, guest_email, num_guests,
+                                             check_in, check_out, check_in_time, check_out_time)
+                    return
+                elif choice == 3:
+                    print("\nReservation cancelled.")
+                    pause()
+                    return
+                else:
+                    print(f"\nContinuing with room selection. Note: Room may not fit all {num_guests} guests.")
+            
+            continue
+        else:
+            break
+    
+    # Display and select a room that is free for the whole stay
+    print(f"\nAvailable {room_types[room_type_key]['type']} Rooms ({format_date(check_in)} - {format_date(check_out)}):")
+    available = find_available_rooms(room_type_key, check_in, check_out)
+    for room in available:
+        print(f"  - Room {room}")
+    
+    if not available:
+        print("\nSorry, no rooms of this type are free for those dates.")
+        print("Please try again later or select a different room type.")
+        pause()
+        return
+    
+    print(f"  (or 0 to let the system pick - it would choose Room {pick_room(room_type_key, check_in, check_out)})")
+    
+    room_number = validate_integer_input(f"\nSelect Room Number: ", min_val=0, max_val=max(available))
+    
     # Validate selected room is in available list
-    while room_number not in available:
+    while room_number != 0 and room_number not in available:
         print(f"Error: Room {room_number} is not available. Please select from the list above.")
-        room_number = validate_integer_input(f"Select Room Number: ", min_val=min(available), max_val=max(available))
+        room_number = validate_integer_input(f"Select Room Number: ", min_val=0, max_val=max(available))
+    
+    # 0 = auto-assign (book picks the room that leaves the fewest hard-to-sell holes)
+    if room_number == 0:
+        room_number = None
+    
+    try:
+        reservation = book(guest_name, guest_phone, guest_email, num_guests, room_type_key,
+                           check_in, check_out, room_number, check_in_time, check_out_time)
+    except EngineError as error:
+        print(f"\nError: {error.message}")
+        pause()
+        return
+    
+    # Display confirmation
+    print("\n")
+    print_separator()
+    print("RESERVATION CONFIRMED!")
+    print_separator()
+    display_reservation_details(reservation)
     
+    pause()
+
+
+def create_group_reservation(guest_name, guest_phone, guest_email, num_guests,
+                             check_in, check_out, check_in_time, check_out_time):
+    """
+    Books a whole group into several rooms under one group ID (called from create_reservation)
+    Shows the rooms the group would get and only books them once the user says yes
+    """
     print("\n")
     print_separator()
-    print("CHECK-IN & CHECK-OUT DATES")
+    print(f"GROUP BOOKING FOR {num_guests} GUESTS")
     print_separator()
-    print("Enter dates in DD/MM/YYYY format")
-    
-    check_in = validate_date_input("\nCheck-in Date (DD/MM/YYYY): ")
-    
-    # Validate check-out is after check-in
-    while True:
-        check_out = validate_date_input("Check-out Date (DD/MM/YYYY): ")
-        if compare_dates(check_out, check_in) <= 0:
-            print("Error: Check-out date must be after check-in date. Please try again.")
-        else:
-            break
+    print("Pick the rooms for:")
+    for number, (prefer, description) in enumerate(group_preferences.items(), 1):
+        print(f"{number}. {description}")
+    choice = validate_integer_input(f"\nSelect option (1-{len(group_preferences)}): ", min_val=1, max_val=len(group_preferences))
+    prefer = list(group_preferences)[choice - 1]
     
-    check_in_time = validate_time_input("Check-in Time (HH:MM, 24-hour format): ")
-    check_out_time = validate_time_input("Check-out Time (HH:MM, 24-hour format): ")
+    try:
+        plan = plan_group_rooms(num_guests, check_in, check_out, prefer)
+    except EngineError as error:
+        print(f"\nError: {error.message}")
+        pause()
+        return
     
-    # Calculate total cost
     nights = calculate_nights(check_in, check_out)
-    if nights < 1:
-        nights = 1
-    
-    price_per_night = room_types[room_type_key]["price"]
-    total_cost = price_per_night * nights
-    
-    # Generate reservation ID
-    res_id = generate_reservation_id()
-    
-    # Create reservation record (Dictionary - Non-Linear Structure)
-    reservation = {
-        "id": res_id,
-        "guest_name": guest_name,
-        "phone": guest_phone,
-        "email": guest_email,
-        "num_guests": num_guests,
-        "room_type": room_types[room_type_key]["type"],
-        "room_number": room_number,
-        "check_in_date": check_in,
-        "check_out_date": check_out,
-        "check_in_time": check_in_time,
-        "check_out_time": check_out_time,
-        "nights": nights,
-        "price_per_night": price_per_night,
-        "total_cost": total_cost,
-        "additional_charges": 0.0,  # For room service, minibar, etc.
-        "total_paid": 0.0,  # Total amount paid so far
-        "balance": total_cost,  # Remaining balance
-        "payment_status": "Pending",  # Pending, Partial, Paid
-        "status": "Active"
-    }
-    
-    # Add to Linear Structure (List)
-    reservations_list.append(reservation)
-    
-    # Add to Non-Linear Structure (Dictionary by room number)
-    if room_number not in room_reservations:
-        room_reservations[room_number] = []
-    room_reservations[room_number].append(reservation)
+    print(f"\nRooms for {format_date(check_in)} - {format_date(check_out)} ({nights} night(s)):")
+    total = 0
+    for room_type_key, guests in plan:
+        price = get_stay_price(room_type_key, check_in, check_out)
+        total += price
+        print(f"  - {room_types[room_type_key]['type']:<20} {guests} guest(s)   ₱{price:>12,.2f}")
+    print(f"\n{len(plan)} room(s), total ₱{total:,.2f}")
+    
+    confirm = validate_string_input("\nBook these rooms? (yes/no): ", min_length=2, max_length=3)
+    if confirm.lower() != "yes":
+        print("\nGroup booking cancelled.")
+        pause()
+        return
     
-    # Initialize payment tracking (Non-Linear Structure)
-    reservation_payments[res_id] = []
+    try:
+        group = book_group(guest_name, guest_phone, guest_email, num_guests, check_in, check_out,
+                           prefer, None, check_in_time, check_out_time)
+    except EngineError as error:
+        print(f"\nError: {error.message}")
+        pause()
+        return
     
-    # Display confirmation
     print("\n")
     print_separator()
-    print("RESERVATION CONFIRMED!")
+    print(f"GROUP BOOKING CONFIRMED! Group ID: {group[0]['group_id']}")
     print_separator()
-    display_reservation_details(reservation)
+    for reservation in group:
+        display_reservation_summary(reservation)
+        print_separator()
     
     pause()
 
@@ -752,15 +3957,18 @@ def read_reservations():
     clear_screen()
     print_header("VIEW ALL RESERVATIONS")
     
-    if not reservations_list:
+    # With a database, older reservations aren't in memory, so read them all from there
+    all_reservations = db_query_reservations() if db_connection is not None else reservations_list
+    
+    if not all_reservations:
         print("\nNo reservations found in the system.")
         pause()
         return
     
-    print(f"\nTotal Reservations: {len(reservations_list)}")
+    print(f"\nTotal Reservations: {len(all_reservations)}")
     print_separator()
     
-    for reservation in reservations_list:
+    for reservation in all_reservations:
         display_reservation_summary(reservation)
         print_separator()
     
@@ -819,17 +4027,16 @@ def update_reservation():
         print("(Press Enter to skip any field)")
         new_phone = validate_phone_input_optional("New Contact Number: ")
         if new_phone:
-            reservation["phone"] = new_phone
             print("✓ Phone number updated")
         
         new_email = validate_email_input_optional("New Email Address: ")
         if new_email:
-            reservation["email"] = new_email
             print("✓ Email address updated")
         
         if not new_phone and not new_email:
             print("\nNo changes made.")
         else:
+            update_contact(reservation["id"], new_phone, new_email)
             print("\nContact information updated successfully!")
     
     elif update_choice == 2:
@@ -846,35 +4053,30 @@ def update_reservation():
             pause()
             return
         
+        # Only the nights the new date adds need checking - the rest are already this guest's
+        conflict = find_date_change_conflict(reservation, new_checkin, reservation["check_out_date"])
+        if conflict is not None:
+            print(f"Error: Room {reservation['room_number']} is booked by {conflict} on some of those nights.")
+            print("No changes made.")
+            pause()
+            return
+        
         new_checkin_time = validate_time_input("New Check-in Time (HH:MM): ")
         
-        # Recalculate nights and costs
+        # Keep the old values for comparison
         old_nights = reservation["nights"]
         old_total = reservation["total_cost"]
         
-        nights = calculate_nights(new_checkin, reservation["check_out_date"])
-        if nights < 1:
-            nights = 1
-        
-        reservation["check_in_date"] = new_checkin
-        reservation["check_in_time"] = new_checkin_time
-        reservation["nights"] = nights
-        reservation["total_cost"] = reservation["price_per_night"] * nights
-        
-        # Recalculate balance
-        reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
-        
-        # Update payment status
-        if reservation["balance"] <= 0:
-            reservation["payment_status"] = "Paid"
-            reservation["balance"] = 0
-        elif reservation["total_paid"] > 0:
-            reservation["payment_status"] = "Partial"
-        else:
-            reservation["payment_status"] = "Pending"
+        try:
+            change_dates(reservation["id"], check_in=new_checkin, check_in_time=new_checkin_time)
+        except EngineError as error:
+            print(f"\nError: {error.message}")
+            print("No changes made.")
+            pause()
+            return
         
         print("\n✓ Check-in date updated successfully!")
-        print(f"  Nights: {old_nights} → {nights}")
+        print(f"  Nights: {old_nights} → {reservation['nights']}")
         print(f"  Total Cost: ₱{old_total:,.2f} → ₱{reservation['total_cost']:,.2f}")
         print(f"  Balance: ₱{reservation['balance']:,.2f}")
         print(f"  Payment Status: {reservation['payment_status']}")
@@ -888,39 +4090,30 @@ def update_reservation():
             new_checkout = validate_date_input("New Check-out Date (DD/MM/YYYY): ")
             if compare_dates(new_checkout, reservation["check_in_date"]) <= 0:
                 print("Error: Check-out date must be after check-in date. Please try again.")
-            else:
+                continue
+            
+            # Only the nights the new date adds need checking - the rest are already this guest's
+            conflict = find_date_change_conflict(reservation, reservation["check_in_date"], new_checkout)
+            if conflict is None:
                 break
+            print(f"Error: Room {reservation['room_number']} is booked by {conflict} on some of those nights. Please try again.")
         
         new_checkout_time = validate_time_input("New Check-out Time (HH:MM): ")
         
-        # Calculate old values for comparison
+        # Keep the old values for comparison
         old_nights = reservation["nights"]
         old_total = reservation["total_cost"]
         
-        # Recalculate costs
-        nights = calculate_nights(reservation["check_in_date"], new_checkout)
-        if nights < 1:
-            nights = 1
-        
-        reservation["check_out_date"] = new_checkout
-        reservation["check_out_time"] = new_checkout_time
-        reservation["nights"] = nights
-        reservation["total_cost"] = reservation["price_per_night"] * nights
-        
-        # Recalculate balance
-        reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
-        
-        # Update payment status if needed
-        if reservation["balance"] <= 0:
-            reservation["payment_status"] = "Paid"
-            reservation["balance"] = 0
-        elif reservation["total_paid"] > 0:
-            reservation["payment_status"] = "Partial"
-        else:
-            reservation["payment_status"] = "Pending"
+        try:
+            change_dates(reservation["id"], check_out=new_checkout, check_out_time=new_checkout_time)
+        except EngineError as error:
+            print(f"\nError: {error.message}")
+            print("No changes made.")
+            pause()
+            return
         
         print("\n✓ Check-out date updated successfully!")
-        print(f"  Nights: {old_nights} → {nights}")
+        print(f"  Nights: {old_nights} → {reservation['nights']}")
         print(f"  Total Cost: ₱{old_total:,.2f} → ₱{reservation['total_cost']:,.2f}")
         print(f"  Balance: ₱{reservation['balance']:,.2f}")
         print(f"  Payment Status: {reservation['payment_status']}")
@@ -946,34 +4139,20 @@ def update_reservation():
             print(f"\nAvailable {reservation['room_type']} Rooms:")
             
             # Find room type key
-            room_type_key = None
-            for key, info in room_types.items():
-                if info["type"] == reservation["room_type"]:
-                    room_type_key = key
-                    break
+            room_type_key = get_room_type_key(reservation["room_type"])
             
             if not room_type_key:
                 print("Error: Could not determine room type.")
                 pause()
                 return
             
-            # Get available rooms
+            # Get rooms that are free for this reservation's nights
             available = []
-            for room in available_rooms[room_type_key]:
+            for room in find_available_rooms(room_type_key, reservation["check_in_date"], reservation["check_out_date"], ignore_id=reservation["id"]):
                 if room == reservation["room_number"]:
                     continue  # Skip current room
-                
-                # Check if room has any active reservations
-                is_available = True
-                if room in room_reservations and room_reservations[room]:
-                    for res in room_reservations[room]:
-                        if res["status"] == "Active" and res["id"] != reservation["id"]:
-                            is_available = False
-                            break
-                
-                if is_available:
-                    available.append(room)
-                    print(f"  - Room {room}")
+                available.append(room)
+                print(f"  - Room {room}")
             
             if not available:
                 print("\nNo other rooms available for this type.")
@@ -987,22 +4166,12 @@ def update_reservation():
             elif new_room not in available:
                 print(f"Error: Room {new_room} is not available.")
             else:
-                # Update room in dictionary structure
                 old_room = reservation["room_number"]
-                
-                # Remove from old room
-                if old_room in room_reservations:
-                    room_reservations[old_room] = [r for r in room_reservations[old_room] if r["id"] != reservation["id"]]
-                
-                # Add to new room
-                if new_room not in room_reservations:
-                    room_reservations[new_room] = []
-                room_reservations[new_room].append(reservation)
-                
-                # Update reservation
-                reservation["room_number"] = new_room
-                
-                print(f"\n✓ Room changed from {old_room} to {new_room}")
+                try:
+                    change_room(reservation["id"], new_room)
+                    print(f"\n✓ Room changed from {old_room} to {new_room}")
+                except EngineError as error:
+                    print(f"\nError: {error.message}")
         
         elif room_change_choice == 2:
             # Change to different room type
@@ -1028,21 +4197,11 @@ def update_reservation():
                     print("Please choose a room type with sufficient capacity or reduce guests first.")
                     continue
                 
-                # Show available rooms
+                # Show rooms that are free for this reservation's nights
                 print(f"\nAvailable {room_types[new_type_key]['type']} Rooms:")
-                available = []
-                for room in available_rooms[new_type_key]:
-                    # Check if room has any active reservations
-                    is_available = True
-                    if room in room_reservations and room_reservations[room]:
-                        for res in room_reservations[room]:
-                            if res["status"] == "Active":
-                                is_available = False
-                                break
-                    
-                    if is_available:
-                        available.append(room)
-                        print(f"  - Room {room}")
+                available = find_available_rooms(new_type_key, reservation["check_in_date"], reservation["check_out_date"], ignore_id=reservation["id"])
+                for room in available:
+                    print(f"  - Room {room}")
                 
                 if not available:
                     print(f"\nNo rooms available for {room_types[new_type_key]['type']}.")
@@ -1060,8 +4219,9 @@ def update_reservation():
                 old_rate = reservation["price_per_night"]
                 old_total = reservation["total_cost"]
                 
-                new_rate = room_types[new_type_key]["price"]
-                new_total = new_rate * reservation["nights"]
+                # The new room type is priced from today's rate calendar (average rate per night)
+                new_total = get_stay_price(new_type_key, reservation["check_in_date"], reservation["check_out_date"])
+                new_rate = new_total / reservation["nights"]
                 
                 # Show cost comparison
                 print("\n" + "=" * 50)
@@ -1087,31 +4247,11 @@ def update_reservation():
                     print("Room type change cancelled.")
                     break
                 
-                # Update room in dictionary structure
-                if old_room in room_reservations:
-                    room_reservations[old_room] = [r for r in room_reservations[old_room] if r["id"] != reservation["id"]]
-                
-                if new_room not in room_reservations:
-                    room_reservations[new_room] = []
-                room_reservations[new_room].append(reservation)
-                
-                # Update reservation
-                reservation["room_number"] = new_room
-                reservation["room_type"] = room_types[new_type_key]["type"]
-                reservation["price_per_night"] = new_rate
-                reservation["total_cost"] = new_total
-                
-                # Recalculate balance
-                reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
-                
-                # Update payment status
-                if reservation["balance"] <= 0:
-                    reservation["payment_status"] = "Paid"
-                    reservation["balance"] = 0
-                elif reservation["total_paid"] > 0:
-                    reservation["payment_status"] = "Partial"
-                else:
-                    reservation["payment_status"] = "Pending"
+                try:
+                    change_room(reservation["id"], new_room)
+                except EngineError as error:
+                    print(f"\nError: {error.message}")
+                    break
                 
                 print("\n✓ Room type changed successfully!")
                 print(f"  New Room: {new_room} - {room_types[new_type_key]['type']}")
@@ -1132,11 +4272,7 @@ def update_reservation():
             print("Update cancelled.")
         else:
             # Check room capacity
-            room_type_key = None
-            for key, info in room_types.items():
-                if info["type"] == reservation["room_type"]:
-                    room_type_key = key
-                    break
+            room_type_key = get_room_type_key(reservation["room_type"])
             
             if room_type_key and new_num > room_types[room_type_key]["capacity"]:
                 print(f"\n❌ Error: Current room can only accommodate {room_types[room_type_key]['capacity']} guest(s).")
@@ -1146,7 +4282,7 @@ def update_reservation():
                 print("2. Reduce number of guests")
             else:
                 old_num = reservation["num_guests"]
-                reservation["num_guests"] = new_num
+                change_guests(reservation["id"], new_num)
                 print(f"\n✓ Number of guests updated: {old_num} → {new_num}")
     
     elif update_choice == 6:
@@ -1161,9 +4297,12 @@ def update_reservation():
         
         confirm = validate_string_input("\nAre you sure you want to cancel this reservation? (yes/no): ", min_length=2, max_length=3)
         if confirm.lower() == "yes":
-            reservation["status"] = "Cancelled"
-            print("\n✓ Reservation cancelled successfully!")
-            print("Room is now available for new bookings.")
+            try:
+                cancel(reservation["id"])
+                print("\n✓ Reservation cancelled successfully!")
+                print("Room is now available for new bookings.")
+            except EngineError as error:
+                print(f"\nError: {error.message}")
         else:
             print("\nCancellation aborted.")
     
@@ -1190,13 +4329,6 @@ def delete_reservation():
     if not reservation:
         return
     
-    # Find index for deletion
-    index = -1
-    for idx, res in enumerate(reservations_list):
-        if res["id"] == reservation["id"]:
-            index = idx
-            break
-    
     # Display reservation details
     print("\n")
     print_separator()
@@ -1219,14 +4351,7 @@ def delete_reservation():
         pause()
         return
     
-    # Delete from Linear structure (List)
-    reservations_list.pop(index)
-    
-    # Delete from Non-Linear structure (Dictionary)
-    room_num = reservation["room_number"]
-    if room_num in room_reservations:
-        # Remove from room's reservation list
-        room_reservations[room_num] = [r for r in room_reservations[room_num] if r["id"] != reservation["id"]]
+    delete(reservation["id"])
     
     print("\nReservation deleted successfully!")
     pause()
@@ -1241,7 +4366,7 @@ def search_reservations():
     clear_screen()
     print_header("SEARCH RESERVATIONS")
     
-    if not reservations_list:
+    if not count_reservations():
         print("\nNo reservations found in the system.")
         pause()
         return
@@ -1252,9 +4377,10 @@ def search_reservations():
     print("3. By Room Number")
     print("4. By Status (Active/Cancelled)")
     print("5. By Date Range")
+    print("6. Arrivals & Departures on a Date")
     print("0. Cancel / Go Back to Main Menu")
     
-    search_choice = validate_integer_input("\nSelect search method (0-5): ", min_val=0, max_val=5)
+    search_choice = validate_integer_input("\nSelect search method (0-6): ", min_val=0, max_val=6)
     
     if search_choice == 0:
         return
@@ -1264,21 +4390,36 @@ def search_reservations():
     if search_choice == 1:
         # Search by reservation ID - allows letters and numbers like RES1000
         res_id = validate_string_input("Enter Reservation ID: ", min_length=4, max_length=20, allow_numbers=True)
-        for res in reservations_list:
-            if res_id.lower() in res["id"].lower():
-                results.append(res)
+        if db_connection is not None:
+            # Exact ID first (uses the primary key), then partial matches
+            results = db_query_reservations("id = ?", (res_id.strip().upper(),))
+            if not results:
+                results = db_query_reservations("id LIKE ?", (f"%{res_id}%",))
+        else:
+            # Exact ID straight from the index - only look through everything for a partial ID
+            reservation = get_reservation(res_id)
+            if reservation is not None:
+                results.append(reservation)
+            else:
+                for res in reservations_list:
+                    if res_id.lower() in res["id"].lower():
+                        results.append(res)
     
     elif search_choice == 2:
-        # Linear search by name (partial match)
+        # Search by name (partial match)
         name = validate_string_input("Enter Guest Name (or part of it): ", min_length=2, max_length=50)
-        for res in reservations_list:
-            if name.lower() in res["guest_name"].lower():
-                results.append(res)
+        if db_connection is not None:
+            results = db_query_reservations("guest_name LIKE ?", (f"%{name}%",))
+        else:
+            # Uses the trigram name index instead of checking every reservation
+            results = search_guest_names(name)
     
     elif search_choice == 3:
         # Search using Non-Linear structure (Dictionary)
         room_num = validate_integer_input("Enter Room Number: ", min_val=101, max_val=999)
-        if room_num in room_reservations:
+        if db_connection is not None:
+            results = db_query_reservations("room_number = ?", (room_num,))
+        elif room_num in room_reservations:
             results = room_reservations[room_num]
     
     elif search_choice == 4:
@@ -1294,9 +4435,10 @@ def search_reservations():
         
         status = "Active" if status_choice == 1 else "Cancelled"
         
-        for res in reservations_list:
-            if res["status"] == status:
-                results.append(res)
+        if db_connection is not None:
+            results = db_query_reservations("status = ?", (status,))
+        else:
+            results = get_reservations_with_status(status)
     
     elif search_choice == 5:
         # Search by date range
@@ -1304,11 +4446,34 @@ def search_reservations():
         start_date = validate_date_input("Start Date (DD/MM/YYYY): ")
         end_date = validate_date_input("End Date (DD/MM/YYYY): ")
         
-        for res in reservations_list:
-            # Check if check-in date is within range
-            if (compare_dates(res["check_in_date"], start_date) >= 0 and 
-                compare_dates(res["check_in_date"], end_date) <= 0):
-                results.append(res)
+        if db_connection is not None:
+            results = db_query_reservations("check_in_date BETWEEN ? AND ?", (start_date, end_date), "check_in_date, rowid")
+        else:
+            # Binary search in the check-in date index (results come out in check-in order)
+            results = get_reservations_between(checkin_index, start_date, end_date)
+    
+    elif search_choice == 6:
+        # Who arrives and who leaves on one day (active bookings only)
+        day = validate_date_input("Date (DD/MM/YYYY): ")
+        
+        if db_connection is not None:
+            arrivals = db_query_reservations("check_in_date = ? AND status = 'Active'", (day,))
+            departures = db_query_reservations("check_out_date = ? AND status = 'Active'", (day,))
+        else:
+            arrivals = [res for res in get_reservations_between(checkin_index, day, day) if res["status"] == "Active"]
+            departures = [res for res in get_reservations_between(checkout_index, day, day) if res["status"] == "Active"]
+        
+        for heading, group in (("ARRIVALS", arrivals), ("DEPARTURES", departures)):
+            print("\n")
+            print_separator()
+            print(f"{heading} ON {format_date(day)}: {len(group)}")
+            print_separator()
+            for res in group:
+                display_reservation_summary(res)
+                print_separator()
+        
+        pause()
+        return
     
     # Display results
     print("\n")
@@ -1328,13 +4493,13 @@ def search_reservations():
 def sort_reservations():
     """
     SORT Operation - Organizes reservations in different orders
-    Can sort by name, room number, cost, or check-in date
-    Uses bubble sort (comparing neighbors and swapping them)
+    Can sort by name, room number, cost, check-in date, or room then check-in date
+    Uses Python's built-in sort with a key (O(n log n)) and remembers each sorted order
     """
     clear_screen()
     print_header("SORT RESERVATIONS")
     
-    if not reservations_list:
+    if not count_reservations():
         print("\nNo reservations found in the system.")
         pause()
         return
@@ -1348,59 +4513,32 @@ def sort_reservations():
     print("6. By Total Cost (High to Low)")
     print("7. By Check-in Date (Earliest First)")
     print("8. By Check-in Date (Latest First)")
+    print("9. By Room Number, then Check-in Date")
     print("0. Cancel / Go Back to Main Menu")
     
-    sort_choice = validate_integer_input("\nSelect sorting method (0-8): ", min_val=0, max_val=8)
+    sort_choice = validate_integer_input("\nSelect sorting method (0-9): ", min_val=0, max_val=9)
     
     if sort_choice == 0:
         return
     
-    # Create a copy of the list to sort
-    sorted_list = []
-    for res in reservations_list:
-        sorted_list.append(res)
-    
-    # Bubble Sort implementation (demonstration of sorting algorithm)
-    n = len(sorted_list)
-    
-    for i in range(n):
-        for j in range(0, n - i - 1):
-            swap = False
-            
-            if sort_choice == 1:  # Name A-Z
-                if sorted_list[j]["guest_name"].lower() > sorted_list[j + 1]["guest_name"].lower():
-                    swap = True
-            
-            elif sort_choice == 2:  # Name Z-A
-                if sorted_list[j]["guest_name"].lower() < sorted_list[j + 1]["guest_name"].lower():
-                    swap = True
-            
-            elif sort_choice == 3:  # Room ascending
-                if sorted_list[j]["room_number"] > sorted_list[j + 1]["room_number"]:
-                    swap = True
-            
-            elif sort_choice == 4:  # Room descending
-                if sorted_list[j]["room_number"] < sorted_list[j + 1]["room_number"]:
-                    swap = True
-            
-            elif sort_choice == 5:  # Cost low to high
-                if sorted_list[j]["total_cost"] > sorted_list[j + 1]["total_cost"]:
-                    swap = True
-            
-            elif sort_choice == 6:  # Cost high to low
-                if sorted_list[j]["total_cost"] < sorted_list[j + 1]["total_cost"]:
-                    swap = True
-            
-            elif sort_choice == 7:  # Date earliest
-                if compare_dates(sorted_list[j]["check_in_date"], sorted_list[j + 1]["check_in_date"]) > 0:
-                    swap = True
-            
-            elif sort_choice == 8:  # Date latest
-                if compare_dates(sorted_list[j]["check_in_date"], sorted_list[j + 1]["check_in_date"]) < 0:
-                    swap = True
-            
-            if swap:
-                sorted_list[j], sorted_list[j + 1] = sorted_list[j + 1], sorted_list[j]
+    if db_connection is not None:
+        # Let the database do the sorting (rowid keeps ties in the order they were made)
+        sql_orders = {
+            1: "guest_name COLLATE NOCASE ASC, rowid",
+            2: "guest_name COLLATE NOCASE DESC, rowid",
+            3: "room_number ASC, rowid",
+            4: "room_number DESC, rowid",
+            5: "total_cost ASC, rowid",
+            6: "total_cost DESC, rowid",
+            7: "check_in_date ASC, rowid",
+            8: "check_in_date DESC, rowid",
+            9: "room_number ASC, check_in_date ASC, rowid"
+        }
+        sorted_list = db_query_reservations(order_by=sql_orders[sort_choice])
+    else:
+        # Key-based sort, remembered until a change touches the fields we sort by
+        fields, descending = sort_orders[sort_choice]
+        sorted_list = get_sorted_view(fields, descending)
     
     # Display sorted results
     sort_names = {
@@ -1411,7 +4549,8 @@ def sort_reservations():
         5: "Total Cost (Low to High)",
         6: "Total Cost (High to Low)",
         7: "Check-in Date (Earliest First)",
-        8: "Check-in Date (Latest First)"
+        8: "Check-in Date (Latest First)",
+        9: "Room Number, then Check-in Date"
     }
     
     print("\n")
@@ -1445,10 +4584,13 @@ def process_payment():
         return
     
     # Show unpaid/partially paid reservations first
-    unpaid = []
-    for res in reservations_list:
-        if res["status"] == "Active" and res["payment_status"] != "Paid":
-            unpaid.append(res)
+    # (active bookings in every payment status group except "Paid", straight from the indexes)
+    active_ids = status_index.get("Active", set())
+    unpaid_ids = set()
+    for payment_status, ids in payment_status_index.items():
+        if payment_status != "Paid":
+            unpaid_ids |= ids & active_ids
+    unpaid = get_reservations_by_ids(unpaid_ids)
     
     if not unpaid:
         print("\nAll active reservations are fully paid!")
@@ -1520,41 +4662,12 @@ def process_payment():
     if not notes:
         notes = "N/A"
     
-    # Generate payment ID
-    pay_id = generate_payment_id()
-    
-    # Create payment record
-    payment = {
-        "id": pay_id,
-        "reservation_id": reservation["id"],
-        "guest_name": reservation["guest_name"],
-        "amount": payment_amount,
-        "payment_method": payment_method,
-        "reference": reference,
-        "payment_date": payment_date,
-        "payment_time": payment_time,
-        "notes": notes,
-        "status": "Completed"
-    }
-    
-    # Add to Linear Structure (List)
-    payments_list.append(payment)
-    
-    # Add to Non-Linear Structure (Dictionary by reservation ID)
-    if reservation["id"] not in reservation_payments:
-        reservation_payments[reservation["id"]] = []
-    reservation_payments[reservation["id"]].append(payment)
-    
-    # Update reservation payment status
-    reservation["total_paid"] += payment_amount
-    reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
-    
-    # Update payment status
-    if reservation["balance"] <= 0:
-        reservation["payment_status"] = "Paid"
-        reservation["balance"] = 0
-    elif reservation["total_paid"] > 0:
-        reservation["payment_status"] = "Partial"
+    try:
+        payment = pay(reservation["id"], payment_amount, payment_method, payment_date, payment_time, reference, notes)
+    except EngineError as error:
+        print(f"\nError: {error.message}")
+        pause()
+        return
     
     # Display payment confirmation
     print("\n")
@@ -1574,23 +4687,26 @@ def view_payments():
     clear_screen()
     print_header("VIEW ALL PAYMENTS")
     
-    if not payments_list:
+    # With a database, older payments aren't in memory, so read them all from there
+    all_payments = db_query_payments() if db_connection is not None else payments_list
+    
+    if not all_payments:
         print("\nNo payments found in the system.")
         pause()
         return
     
-    print(f"\nTotal Payments: {len(payments_list)}")
+    print(f"\nTotal Payments: {len(all_payments)}")
     
     # Calculate total revenue
     total_revenue = 0
-    for payment in payments_list:
+    for payment in all_payments:
         if payment["status"] == "Completed":
             total_revenue += payment["amount"]
     
     print(f"Total Revenue Collected: ₱{total_revenue:,.2f}")
     print_separator()
     
-    for payment in payments_list:
+    for payment in all_payments:
         display_payment_summary_line(payment)
         print_separator()
     
@@ -1629,10 +4745,14 @@ def view_reservation_payments():
     print("PAYMENT HISTORY")
     print_separator()
     
-    if reservation["id"] not in reservation_payments or not reservation_payments[reservation["id"]]:
+    if db_connection is not None:
+        payments = db_query_payments("reservation_id = ?", (reservation["id"],))
+    else:
+        payments = reservation_payments.get(reservation["id"], [])
+    
+    if not payments:
         print("No payments recorded for this reservation.")
     else:
-        payments = reservation_payments[reservation["id"]]
         for idx, payment in enumerate(payments, 1):
             print(f"\nPayment #{idx}")
             display_payment_details(payment)
@@ -1655,11 +4775,8 @@ def add_additional_charges():
         pause()
         return
     
-    # Show active reservations
-    active = []
-    for res in reservations_list:
-        if res["status"] == "Active":
-            active.append(res)
+    # Show active reservations (from the status index)
+    active = get_reservations_with_status("Active")
     
     if not active:
         print("\nNo active reservations found.")
@@ -1715,13 +4832,12 @@ def add_additional_charges():
     description = validate_string_input("Description: ", min_length=2, max_length=100, allow_numbers=True)
     amount = validate_float_input("Amount (₱): ", min_val=0.01)
     
-    # Update reservation
-    reservation["additional_charges"] += amount
-    reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
-    
-    # Update payment status if balance increased
-    if reservation["payment_status"] == "Paid" and reservation["balance"] > 0:
-        reservation["payment_status"] = "Partial"
+    try:
+        add_charge(reservation["id"], amount)
+    except EngineError as error:
+        print(f"\nError: {error.message}")
+        pause()
+        return
     
     print("\n")
     print_separator()
@@ -1752,9 +4868,14 @@ def issue_refund():
         return
     
     # Show cancelled reservations with payments
+    # (only cancelled bookings whose payment status says money came in can qualify)
+    cancelled_ids = status_index.get("Cancelled", set())
+    candidate_ids = set()
+    for payment_status in ("Paid", "Partial", "Partial Refund"):
+        candidate_ids |= payment_status_index.get(payment_status, set()) & cancelled_ids
     cancelled = []
-    for res in reservations_list:
-        if res["status"] == "Cancelled" and res.get("total_paid", 0) > 0:
+    for res in get_reservations_by_ids(candidate_ids):
+        if res.get("total_paid", 0) > 0:
             cancelled.append(res)
     
     if not cancelled:
@@ -1848,45 +4969,20 @@ def issue_refund():
     refund_date = validate_date_input("Refund Date (DD/MM/YYYY): ")
     refund_time = validate_time_input("Refund Time (HH:MM): ")
     
-    # Generate payment ID for refund (negative payment)
-    pay_id = generate_payment_id()
-    
-    # Create refund record (stored as negative payment)
-    refund = {
-        "id": pay_id,
-        "reservation_id": reservation["id"],
-        "guest_name": reservation["guest_name"],
-        "amount": -refund_amount,  # Negative amount for refund
-        "payment_method": refund_method,
-        "reference": reference,
-        "payment_date": refund_date,
-        "payment_time": refund_time,
-        "notes": f"REFUND - {refund_choice} option",
-        "status": "Refunded"
-    }
-    
-    # Add to payment structures
-    payments_list.append(refund)
-    if reservation["id"] not in reservation_payments:
-        reservation_payments[reservation["id"]] = []
-    reservation_payments[reservation["id"]].append(refund)
-    
-    # Update reservation
-    reservation["total_paid"] -= refund_amount
-    reservation["balance"] = (reservation["total_cost"] + reservation["additional_charges"]) - reservation["total_paid"]
-    
-    # Update payment status
-    if reservation["total_paid"] <= 0:
-        reservation["payment_status"] = "Refunded"
-    else:
-        reservation["payment_status"] = "Partial Refund"
+    try:
+        refund_payment = refund(reservation["id"], refund_amount, refund_method, refund_date, refund_time,
+                                reference, f"REFUND - {refund_choice} option")
+    except EngineError as error:
+        print(f"\nError: {error.message}")
+        pause()
+        return
     
     # Display refund confirmation
     print("\n")
     print_separator()
     print("REFUND PROCESSED SUCCESSFULLY!")
     print_separator()
-    print(f"Refund ID: {refund['id']}")
+    print(f"Refund ID: {refund_payment['id']}")
     print(f"Amount Refunded: ₱{refund_amount:,.2f}")
     print(f"Refund Method: {refund_method}")
     print(f"Reference: {reference}")
@@ -1904,7 +5000,7 @@ def payment_reports():
     clear_screen()
     print_header("PAYMENT REPORTS")
     
-    if not payments_list:
+    if not count_payments():
         print("\nNo payment data available.")
         pause()
         return
@@ -1914,9 +5010,11 @@ def payment_reports():
     print("2. Payment Method Analysis")
     print("3. Outstanding Balances")
     print("4. Refund Report")
+    print("5. Revenue for a Date Range (by method & room type)")
+    print("6. Monthly Revenue for a Year")
     print("0. Cancel / Go Back to Main Menu")
     
-    report_choice = validate_integer_input("\nSelect report (0-4): ", min_val=0, max_val=4)
+    report_choice = validate_integer_input("\nSelect report (0-6): ", min_val=0, max_val=6)
     
     if report_choice == 0:
         return
@@ -1929,10 +5027,62 @@ def payment_reports():
         display_outstanding_balances()
     elif report_choice == 4:
         display_refund_report()
+    elif report_choice == 5:
+        display_date_range_revenue()
+    elif report_choice == 6:
+        display_monthly_revenue()
     
     pause()
 
 
+def get_payment_summary():
+    """
+    Overall payment numbers - money received and refunded, and how many reservations
+    are in each payment status. Returns a dictionary (amounts in pesos)
+    """
+    summary = {
+        "total_payments": 0,
+        "total_refunds": 0,
+        "net_revenue": 0,
+        "transaction_count": 0,
+        "payment_count": 0,
+        "status_counts": {"Paid": 0, "Partial": 0, "Pending": 0, "Refunded": 0}
+    }
+    status_counts = summary["status_counts"]
+    
+    if db_connection is not None:
+        # Let the database add everything up
+        total_payments, total_refunds, transaction_count, payment_count = db_connection.execute(
+            "SELECT COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0), "
+            "COALESCE(SUM(CASE WHEN amount <= 0 THEN -amount END), 0), "
+            "COUNT(*), COUNT(CASE WHEN amount > 0 THEN 1 END) FROM payments"
+        ).fetchone()
+        summary["total_payments"] = total_payments
+        summary["total_refunds"] = total_refunds
+        summary["net_revenue"] = total_payments - total_refunds
+        summary["transaction_count"] = transaction_count
+        summary["payment_count"] = payment_count
+        
+        group_sizes = db_connection.execute("SELECT payment_status, COUNT(*) FROM reservations GROUP BY payment_status")
+    else:
+        # Straight from the running totals - no need to go through every payment
+        summary["total_payments"] = ledger["payments_total"] / 100
+        summary["total_refunds"] = ledger["refunds_total"] / 100
+        summary["net_revenue"] = (ledger["payments_total"] - ledger["refunds_total"]) / 100
+        summary["transaction_count"] = ledger["transaction_count"]
+        summary["payment_count"] = ledger["payment_count"]
+        
+        # Each payment status group already knows how big it is
+        group_sizes = [(payment_status, len(ids)) for payment_status, ids in payment_status_index.items()]
+    
+    for payment_status, count in group_sizes:
+        if "Refund" in payment_status:
+            status_counts["Refunded"] += count
+        elif payment_status in status_counts:
+            status_counts[payment_status] = count
+    return summary
+
+
 def display_payment_summary_report():
     """Shows overall stats about all payments - total collected, refunded, etc"""
     print("\n")
@@ -1940,45 +5090,23 @@ def display_payment_summary_report():
     print("OVERALL PAYMENT SUMMARY")
     print_separator()
     
-    total_payments = 0
-    total_refunds = 0
-    total_revenue = 0
-    
-    for payment in payments_list:
-        if payment["amount"] > 0:
-            total_payments += payment["amount"]
-            total_revenue += payment["amount"]
-        else:
-            total_refunds += abs(payment["amount"])
-            total_revenue += payment["amount"]  # Subtract refunds
-    
-    paid_count = 0
-    partial_count = 0
-    pending_count = 0
-    refunded_count = 0
-    
-    for res in reservations_list:
-        if res["payment_status"] == "Paid":
-            paid_count += 1
-        elif res["payment_status"] == "Partial":
-            partial_count += 1
-        elif res["payment_status"] == "Pending":
-            pending_count += 1
-        elif "Refund" in res["payment_status"]:
-            refunded_count += 1
+    summary = get_payment_summary()
+    total_payments = summary["total_payments"]
+    payment_count = summary["payment_count"]
+    status_counts = summary["status_counts"]
     
     print(f"\nTotal Payments Received: ₱{total_payments:,.2f}")
-    print(f"Total Refunds Issued: ₱{total_refunds:,.2f}")
-    print(f"Net Revenue: ₱{total_revenue:,.2f}")
-    print(f"\nTotal Transactions: {len(payments_list)}")
-    print(f"Average Payment: ₱{total_payments / len([p for p in payments_list if p['amount'] > 0]):,.2f}" if any(p['amount'] > 0 for p in payments_list) else "N/A")
+    print(f"Total Refunds Issued: ₱{summary['total_refunds']:,.2f}")
+    print(f"Net Revenue: ₱{summary['net_revenue']:,.2f}")
+    print(f"\nTotal Transactions: {summary['transaction_count']}")
+    print(f"Average Payment: ₱{total_payments / payment_count:,.2f}" if payment_count > 0 else "N/A")
     
     print("\n")
     print("Payment Status Distribution:")
-    print(f"  Fully Paid: {paid_count} reservations")
-    print(f"  Partially Paid: {partial_count} reservations")
-    print(f"  Pending Payment: {pending_count} reservations")
-    print(f"  Refunded: {refunded_count} reservations")
+    print(f"  Fully Paid: {status_counts['Paid']} reservations")
+    print(f"  Partially Paid: {status_counts['Partial']} reservations")
+    print(f"  Pending Payment: {status_counts['Pending']} reservations")
+    print(f"  Refunded: {status_counts['Refunded']} reservations")
 
 
 def display_payment_method_analysis():
@@ -1991,14 +5119,16 @@ def display_payment_method_analysis():
     method_totals = {}
     method_counts = {}
     
-    for payment in payments_list:
-        if payment["amount"] > 0:  # Only count actual payments, not refunds
-            method = payment["payment_method"]
-            if method not in method_totals:
-                method_totals[method] = 0
-                method_counts[method] = 0
-            method_totals[method] += payment["amount"]
-            method_counts[method] += 1
+    if db_connection is not None:
+        query = "SELECT payment_method, SUM(amount), COUNT(*) FROM payments WHERE amount > 0 GROUP BY payment_method"
+        for method, amount, count in db_connection.execute(query):
+            method_totals[method] = amount
+            method_counts[method] = count
+    else:
+        # The running totals only count actual payments, not refunds
+        for method, cents in ledger["method_totals"].items():
+            method_totals[method] = cents / 100
+            method_counts[method] = ledger["method_counts"][method]
     
     if not method_totals:
         print("\nNo payment data available.")
@@ -2024,75 +5154,305 @@ def display_payment_method_analysis():
         percentage = (amount / total * 100) if total > 0 else 0
         print(f"{method:<20} {count:<10} ₱{amount:>15,.2f}   {percentage:>6.2f}%")
     
-    print_separator()
-    print(f"{'TOTAL':<20} {sum(method_counts.values()):<10} ₱{total:>15,.2f}   100.00%")
+    print_separator()
+    print(f"{'TOTAL':<20} {sum(method_counts.values()):<10} ₱{total:>15,.2f}   100.00%")
+
+
+def display_outstanding_balances():
+    """
+    Shows which reservations still owe money, biggest balance first
+    Either just the top few (like the top 50) or the whole list one page at a time
+    """
+    print("\n")
+    print_separator()
+    print("OUTSTANDING BALANCES")
+    print_separator()
+    
+    outstanding_count = len(outstanding_index["entries"])
+    
+    if not outstanding_count:
+        print("\nNo outstanding balances! All active reservations are paid.")
+        return
+    
+    print(f"\nTotal Outstanding: ₱{outstanding_index['total'] / 100:,.2f}")
+    print(f"Number of Reservations: {outstanding_count}")
+    print_separator()
+    
+    print("\n1. Top Balances (choose how many)")
+    print("2. Full List (page by page)")
+    list_choice = validate_integer_input("Select option (1-2): ", min_val=1, max_val=2)
+    
+    if list_choice == 1:
+        top_count = validate_integer_input(f"How many (1-{outstanding_count}): ", min_val=1, max_val=outstanding_count)
+        page_size = top_count
+    else:
+        page_size = 20
+    
+    start = 0
+    while start < outstanding_count:
+        print(f"\n{'Reservation':<15} {'Guest':<25} {'Total':<15} {'Paid':<15} {'Balance':<15}")
+        print_separator()
+        
+        for res in get_outstanding_page(start, page_size):
+            total = res["total_cost"] + res["additional_charges"]
+            print(f"{res['id']:<15} {res['guest_name']:<25} ₱{total:>12,.2f} ₱{res['total_paid']:>12,.2f} ₱{res['balance']:>12,.2f}")
+        
+        start += page_size
+        if list_choice == 1 or start >= outstanding_count:
+            break
+        
+        print_separator()
+        print(f"Showing {start} of {outstanding_count}")
+        more = input("Press Enter for the next page (or type 0 to stop): ").strip()
+        if more == "0":
+            break
+
+
+def display_refund_report():
+    """Shows all the refunds we've given out"""
+    print("\n")
+    print_separator()
+    print("REFUND REPORT")
+    print_separator()
+    
+    refunds = []
+    total_refunded = 0
+    
+    # With a database, only refunds are read (the database finds them for us)
+    all_payments = db_query_payments("amount < 0") if db_connection is not None else payments_list
+    
+    for payment in all_payments:
+        if payment["amount"] < 0:  # Refunds are negative amounts
+            refunds.append(payment)
+            total_refunded += abs(payment["amount"])
+    
+    if not refunds:
+        print("\nNo refunds have been issued.")
+        return
+    
+    print(f"\nTotal Refunds Issued: ₱{total_refunded:,.2f}")
+    print(f"Number of Refunds: {len(refunds)}")
+    print_separator()
+    
+    print(f"\n{'Refund ID':<15} {'Reservation':<15} {'Guest':<25} {'Amount':<15}")
+    print_separator()
+    
+    for refund in refunds:
+        print(f"{refund['id']:<15} {refund['reservation_id']:<15} {refund['guest_name']:<25} ₱{abs(refund['amount']):>12,.2f}")
+
+
+def get_money_by_method(first_day, last_day):
+    """
+    Money received and refunded between two days (by payment date), for each payment method
+    Returns {method: (received, refunded)} in centavos
+    """
+    money = {}
+    if db_connection is not None:
+        # The database has the whole payment history (uses the payment date index)
+        query = ("SELECT payment_method, COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0), "
+                 "COALESCE(SUM(CASE WHEN amount < 0 THEN -amount END), 0) FROM payments "
+                 "WHERE payment_date BETWEEN ? AND ? GROUP BY payment_method")
+        for method, received, refunded in db_connection.execute(query, (first_day, last_day)):
+            money[method] = (to_cents(received), to_cents(refunded))
+    else:
+        for method in payment_methods.values():
+            received = get_rollup_total(("payments", method), first_day, last_day)
+            refunded = get_rollup_total(("refunds", method), first_day, last_day)
+            if received or refunded:
+                money[method] = (received, refunded)
+    return money
+
+
+def get_room_revenue(first_day, last_day):
+    """Room revenue earned by active bookings for the nights between two days, per room type (centavos)"""
+    revenue = {}
+    for info in room_types.values():
+        revenue[info["type"]] = get_rollup_total(("room_nights", info["type"]), first_day, last_day)
+    return revenue
+
+
+def get_occupancy(first_night, last_night):
+    """
+    Occupancy engine - sweeps the nights from first_night to last_night (both included) once
+    Each room type starts from its value on the first night (from the prefix sums), then each
+    next night just adds that day's change from the difference buckets
+    Returns a list of (night, {room type name: (rooms booked, room revenue in centavos)})
+    """
+    sweeps = []
+    for info in room_types.values():
+        room_type = info["type"]
+        sweeps.append({
+            "type": room_type,
+            "rooms": get_rollup_total(("rooms_booked", room_type), first_night, first_night),
+            "revenue": get_rollup_total(("room_nights", room_type), first_night, first_night),
+            "room_changes": rollups.get(("rooms_booked", room_type), {}),
+            "rate_changes": rollups.get(("room_nights", room_type), {})
+        })
+    
+    nights = []
+    for night in range(first_night, last_night + 1):
+        if night > first_night:
+            for sweep in sweeps:
+                sweep["rooms"] += sweep["room_changes"].get(night, 0)
+                sweep["revenue"] += sweep["rate_changes"].get(night, 0)
+        nights.append((night, {sweep["type"]: (sweep["rooms"], sweep["revenue"]) for sweep in sweeps}))
+    return nights
+
+
+def get_date_range_revenue(first_day, last_day):
+    """
+    Money collected per payment method (by payment date) and room revenue earned per
+    room type (nights stayed) between two days. Returns a dictionary (amounts in pesos)
+    """
+    if last_day < first_day:
+        raise EngineError("invalid_dates", "End date must not be before start date.")
+    money = get_money_by_method(first_day, last_day)
+    by_method = {}
+    for method in payment_methods.values():
+        received, refunded = money.get(method, (0, 0))
+        by_method[method] = {"received": received / 100, "refunded": refunded / 100, "net": (received - refunded) / 100}
+    room_revenue = {}
+    for room_type, cents in get_room_revenue(first_day, last_day).items():
+        room_revenue[room_type] = cents / 100
+    return {"money_by_method": by_method, "room_revenue": room_revenue}
+
+
+def get_monthly_revenue(year):
+    """
+    Money collected and room revenue earned in each month of a year, from the month buckets
+    (one lookup per month and series). Returns a list of 12 dictionaries (amounts in pesos)
+    """
+    if year < 2026 or year > 2035:
+        raise EngineError("invalid_dates", "The year must be 2026 to 2035.")
+    
+    months = []
+    days_in_month = get_days_in_month(year)
+    for month in range(1, 13):
+        first_day = date_to_ordinal(1, month, year)
+        received = 0
+        refunded = 0
+        if db_connection is not None:
+            # The database has the whole payment history (the buckets only the loaded part)
+            for method_received, method_refunded in get_money_by_method(first_day, first_day + days_in_month[month - 1] - 1).values():
+                received += method_received
+                refunded += method_refunded
+        else:
+            for method in payment_methods.values():
+                received += get_month_total(("payments", method), first_day)
+                refunded += get_month_total(("refunds", method), first_day)
+        room_revenue = 0
+        for info in room_types.values():
+            room_revenue += get_month_total(("room_nights", info["type"]), first_day)
+        
+        months.append({
+            "month": f"{month:02d}/{year}",
+            "received": received / 100,
+            "refunded": refunded / 100,
+            "net": (received - refunded) / 100,
+            "room_revenue": room_revenue / 100
+        })
+    return months
+
+
+def get_night_figures(rooms, cents, rooms_available):
+    """Occupancy %, ADR and RevPAR from rooms booked and room revenue (centavos) for one night"""
+    return {
+        "rooms_booked": rooms,
+        "occupancy_percent": rooms / rooms_available * 100 if rooms_available else 0,
+        "adr": cents / rooms / 100 if rooms else 0,
+        "revpar": cents / rooms_available / 100 if rooms_available else 0
+    }
+
+
+def get_occupancy_report(first_night, last_night):
+    """
+    Rooms booked, occupancy %, ADR and RevPAR for each night (at most 366 nights), for the
+    whole hotel and for each room type - the same numbers as the occupancy report screen
+    Returns a list with one dictionary per night (amounts in pesos)
+    """
+    if last_night < first_night or last_night - first_night >= 366:
+        raise EngineError("invalid_dates", "Last night must be on or after the first night, at most 366 nights later.")
+    
+    # How many rooms each type has (rooms, not reservations)
+    type_rooms = {}
+    for key, info in room_types.items():
+        type_rooms[info["type"]] = len(available_rooms[key])
+    
+    report = []
+    for night, types in get_occupancy(first_night, last_night):
+        night_report = {"night": format_date(night)}
+        night_report.update(get_night_figures(sum(rooms for rooms, cents in types.values()),
+                                              sum(cents for rooms, cents in types.values()),
+                                              sum(type_rooms.values())))
+        night_report["room_types"] = {}
+        for room_type, (rooms, cents) in types.items():
+            night_report["room_types"][room_type] = get_night_figures(rooms, cents, type_rooms[room_type])
+        report.append(night_report)
+    return report
 
 
-def display_outstanding_balances():
-    """Shows which reservations still owe money"""
+def display_date_range_revenue():
+    """Shows money collected (by payment method) and room revenue earned (by room type) between two dates"""
     print("\n")
     print_separator()
-    print("OUTSTANDING BALANCES")
+    print("REVENUE FOR A DATE RANGE")
     print_separator()
     
-    outstanding = []
-    total_outstanding = 0
-    
-    for res in reservations_list:
-        if res["balance"] > 0 and res["status"] == "Active":
-            outstanding.append(res)
-            total_outstanding += res["balance"]
-    
-    if not outstanding:
-        print("\nNo outstanding balances! All active reservations are paid.")
+    first_day = validate_date_input("Start Date (DD/MM/YYYY): ")
+    last_day = validate_date_input("End Date (DD/MM/YYYY): ")
+    if last_day < first_day:
+        print("Error: End date must not be before start date.")
         return
     
-    print(f"\nTotal Outstanding: ₱{total_outstanding:,.2f}")
-    print(f"Number of Reservations: {len(outstanding)}")
-    print_separator()
-    
-    # Sort by balance (highest first)
-    for i in range(len(outstanding)):
-        for j in range(len(outstanding) - i - 1):
-            if outstanding[j]["balance"] < outstanding[j + 1]["balance"]:
-                outstanding[j], outstanding[j + 1] = outstanding[j + 1], outstanding[j]
+    print(f"\nFrom {format_date(first_day)} to {format_date(last_day)}")
     
-    print(f"\n{'Reservation':<15} {'Guest':<25} {'Total':<15} {'Paid':<15} {'Balance':<15}")
+    money = get_money_by_method(first_day, last_day)
+    print("\nMoney Collected by Payment Method (by payment date):")
+    print_separator()
+    print(f"{'Method':<20} {'Received':>15} {'Refunded':>15} {'Net':>15}")
     print_separator()
+    total_received = 0
+    total_refunded = 0
+    for method in payment_methods.values():
+        received, refunded = money.get(method, (0, 0))
+        total_received += received
+        total_refunded += refunded
+        print(f"{method:<20} ₱{received / 100:>14,.2f} ₱{refunded / 100:>14,.2f} ₱{(received - refunded) / 100:>14,.2f}")
+    print_separator()
+    print(f"{'TOTAL':<20} ₱{total_received / 100:>14,.2f} ₱{total_refunded / 100:>14,.2f} ₱{(total_received - total_refunded) / 100:>14,.2f}")
     
-    for res in outstanding:
-        total = res["total_cost"] + res["additional_charges"]
-        print(f"{res['id']:<15} {res['guest_name']:<25} ₱{total:>12,.2f} ₱{res['total_paid']:>12,.2f} ₱{res['balance']:>12,.2f}")
+    revenue = get_room_revenue(first_day, last_day)
+    print("\nRoom Revenue Earned by Room Type (nights stayed, active bookings):")
+    print_separator()
+    for room_type, cents in revenue.items():
+        print(f"  {room_type:<25} ₱{cents / 100:>14,.2f}")
+    print_separator()
+    print(f"  {'TOTAL':<25} ₱{sum(revenue.values()) / 100:>14,.2f}")
 
 
-def display_refund_report():
-    """Shows all the refunds we've given out"""
+def display_monthly_revenue():
+    """Shows collected money and earned room revenue for each month of a year"""
     print("\n")
     print_separator()
-    print("REFUND REPORT")
+    print("MONTHLY REVENUE")
     print_separator()
     
-    refunds = []
-    total_refunded = 0
-    
-    for payment in payments_list:
-        if payment["amount"] < 0:  # Refunds are negative amounts
-            refunds.append(payment)
-            total_refunded += abs(payment["amount"])
-    
-    if not refunds:
-        print("\nNo refunds have been issued.")
-        return
+    year = validate_integer_input("Year (2026-2035): ", min_val=2026, max_val=2035)
     
-    print(f"\nTotal Refunds Issued: ₱{total_refunded:,.2f}")
-    print(f"Number of Refunds: {len(refunds)}")
+    print(f"\n{'Month':<10} {'Received':>15} {'Refunded':>15} {'Net':>15} {'Room Revenue':>15}")
     print_separator()
     
-    print(f"\n{'Refund ID':<15} {'Reservation':<15} {'Guest':<25} {'Amount':<15}")
-    print_separator()
+    # Add up in centavos so the year total doesn't pick up rounding errors
+    year_totals = [0, 0, 0]
+    for figures in get_monthly_revenue(year):
+        year_totals[0] += to_cents(figures["received"])
+        year_totals[1] += to_cents(figures["refunded"])
+        year_totals[2] += to_cents(figures["room_revenue"])
+        print(f"{figures['month']:<10} ₱{figures['received']:>14,.2f} ₱{figures['refunded']:>14,.2f} ₱{figures['net']:>14,.2f} ₱{figures['room_revenue']:>14,.2f}")
     
-    for refund in refunds:
-        print(f"{refund['id']:<15} {refund['reservation_id']:<15} {refund['guest_name']:<25} ₱{abs(refund['amount']):>12,.2f}")
+    print_separator()
+    received, refunded, room_revenue = year_totals
+    print(f"{'TOTAL':<10} ₱{received / 100:>14,.2f} ₱{refunded / 100:>14,.2f} ₱{(received - refunded) / 100:>14,.2f} ₱{room_revenue / 100:>14,.2f}")
 
 
 # ============================================================
@@ -2125,7 +5485,7 @@ def display_payment_summary_line(payment):
     status = "REFUND" if payment['amount'] < 0 else payment['status']
     print(f"ID: {payment['id']:<15} | Res: {payment['reservation_id']:<15} | Amount: {amount_str:>15}")
     print(f"Guest: {payment['guest_name']:<25} | Method: {payment['payment_method']:<15} | Status: {status}")
-    print(f"Date: {payment['payment_date']['formatted']} {payment['payment_time']['formatted']}")
+    print(f"Date: {format_date(payment['payment_date'])} {format_time(payment['payment_time'])}")
 
 
 def display_payment_details(payment):
@@ -2136,7 +5496,7 @@ def display_payment_details(payment):
     print(f"Amount: ₱{payment['amount']:,.2f}")
     print(f"Payment Method: {payment['payment_method']}")
     print(f"Reference: {payment['reference']}")
-    print(f"Date: {payment['payment_date']['formatted']} at {payment['payment_time']['formatted']}")
+    print(f"Date: {format_date(payment['payment_date'])} at {format_time(payment['payment_time'])}")
     print(f"Status: {payment['status']}")
     if payment['notes'] != "N/A":
         print(f"Notes: {payment['notes']}")
@@ -2154,7 +5514,7 @@ def display_payment_receipt(payment, reservation):
     print(f"Amount Paid: ₱{payment['amount']:,.2f}")
     print(f"Payment Method: {payment['payment_method']}")
     print(f"Reference: {payment['reference']}")
-    print(f"Date: {payment['payment_date']['formatted']} at {payment['payment_time']['formatted']}")
+    print(f"Date: {format_date(payment['payment_date'])} at {format_time(payment['payment_time'])}")
     print()
     print("Updated Billing:")
     print(f"  Total Bill: ₱{reservation['total_cost'] + reservation['additional_charges']:,.2f}")
@@ -2181,11 +5541,23 @@ def display_room_types():
         print(f"{key:<5} {info['type']:<25} {info['capacity']} guest(s)   ₱{info['price']:>10,.2f}")
 
 
+def display_quotes(check_in, check_out, num_guests):
+    """Shows the room types that are free for the stay and fit everyone, cheapest first (see get_quotes)"""
+    quotes = get_quotes(check_in, check_out, num_guests)
+    print(f"\nFree for {format_date(check_in)} - {format_date(check_out)}, {num_guests} guest(s) (cheapest first):")
+    if not quotes:
+        print("  No single room type fits - a group booking can split the guests over several rooms.")
+        return
+    for quote in quotes:
+        print(f"  {quote['room_type_key']}. {quote['room_type']:<22} {quote['free_rooms']} room(s) free   "
+              f"total ₱{quote['total_price']:>12,.2f}")
+
+
 def display_reservation_summary(reservation):
     """Shows just the main info about a reservation - guest, room, dates, cost"""
     print(f"ID: {reservation['id']:<15} | Guest: {reservation['guest_name']:<25}")
     print(f"Room: {reservation['room_number']:<12} | Type: {reservation['room_type']:<25}")
-    print(f"Check-in: {reservation['check_in_date']['formatted']:<12} | Nights: {reservation['nights']:<5} | Total: ₱{reservation['total_cost']:>10,.2f}")
+    print(f"Check-in: {format_date(reservation['check_in_date']):<12} | Nights: {reservation['nights']:<5} | Total: ₱{reservation['total_cost']:>10,.2f}")
     print(f"Status: {reservation['status']:<12} | Payment: {reservation['payment_status']}")
 
 
@@ -2193,6 +5565,8 @@ def display_reservation_details(reservation):
     """Shows EVERYTHING about a reservation - all guest info, room details, billing, etc"""
     print(f"Reservation ID: {reservation['id']}")
     print(f"Status: {reservation['status']}")
+    if reservation['group_id'] is not None:
+        print(f"Group Booking: {reservation['group_id']}")
     print()
     print("Guest Information:")
     print(f"  Name: {reservation['guest_name']}")
@@ -2201,13 +5575,13 @@ def display_reservation_details(reservation):
     print(f"  Number of Guests: {reservation['num_guests']}")
     print()
     print("Room Information:")
-    print(f"  Room Number: {reservation['room_number']}")
+    print(f"  Room Number: {reservation['room_number']}" + (" (picked by hand - kept in place)" if reservation['room_locked'] else ""))
     print(f"  Room Type: {reservation['room_type']}")
     print(f"  Price per Night: ₱{reservation['price_per_night']:,.2f}")
     print()
     print("Stay Information:")
-    print(f"  Check-in: {reservation['check_in_date']['formatted']} at {reservation['check_in_time']['formatted']}")
-    print(f"  Check-out: {reservation['check_out_date']['formatted']} at {reservation['check_out_time']['formatted']}")
+    print(f"  Check-in: {format_date(reservation['check_in_date'])} at {format_time(reservation['check_in_time'])}")
+    print(f"  Check-out: {format_date(reservation['check_out_date'])} at {format_time(reservation['check_out_time'])}")
     print(f"  Number of Nights: {reservation['nights']}")
     print()
     print("Billing Information:")
@@ -2231,7 +5605,7 @@ def generate_reports():
     clear_screen()
     print_header("SYSTEM REPORTS & STATISTICS")
     
-    if not reservations_list:
+    if not count_reservations():
         print("\nNo data available for reports.")
         pause()
         return
@@ -2240,9 +5614,11 @@ def generate_reports():
     print("1. Occupancy Report")
     print("2. Revenue Report")
     print("3. Guest Statistics")
+    print("4. Room Assignment Optimizer")
+    print("5. Rate Calendar")
     print("0. Cancel / Go Back to Main Menu")
     
-    report_choice = validate_integer_input("\nSelect report (0-3): ", min_val=0, max_val=3)
+    report_choice = validate_integer_input("\nSelect report (0-5): ", min_val=0, max_val=5)
     
     if report_choice == 0:
         return
@@ -2253,45 +5629,184 @@ def generate_reports():
         display_revenue_report()
     elif report_choice == 3:
         display_guest_statistics()
+    elif report_choice == 4:
+        display_room_optimizer()
+    elif report_choice == 5:
+        display_rate_calendar()
     
     pause()
 
 
 def display_occupancy_report():
-    """Shows how many rooms are filled vs empty - helps see if hotel is doing well"""
+    """
+    Shows how full the hotel is night by night for a date window
+    Occupancy % = rooms booked / rooms we have
+    ADR (average daily rate) = room revenue / rooms booked
+    RevPAR (revenue per available room) = room revenue / rooms we have
+    Everything comes from one sweep over the nights (see get_occupancy)
+    """
     print("\n")
     print_separator()
     print("OCCUPANCY REPORT")
     print_separator()
     
-    total_rooms = 0
-    occupied_rooms = 0
+    first_night = validate_date_input("First Night (DD/MM/YYYY): ")
+    last_night = validate_date_input("Last Night (DD/MM/YYYY): ")
+    if last_night < first_night:
+        print("Error: Last night must not be before the first night.")
+        return
+    if last_night - first_night >= 366:
+        print("Error: Please pick a window of at most 366 nights.")
+        return
+    
+    # How many rooms each type has (rooms, not reservations)
+    type_rooms = {}
+    for key, info in room_types.items():
+        type_rooms[info["type"]] = len(available_rooms[key])
+    total_rooms = sum(type_rooms.values())
+    
+    nights = get_occupancy(first_night, last_night)
+    
+    print(f"\nTotal Rooms: {total_rooms}")
+    print(f"\n{'Night':<12} {'Booked':>10} {'Occupancy':>10} {'ADR':>14} {'RevPAR':>14}")
+    print_separator()
+    
+    type_totals = {}
+    for room_type in type_rooms:
+        type_totals[room_type] = [0, 0]
+    
+    for night, types in nights:
+        booked = 0
+        revenue = 0
+        for room_type, (rooms, cents) in types.items():
+            booked += rooms
+            revenue += cents
+            type_totals[room_type][0] += rooms
+            type_totals[room_type][1] += cents
+        
+        occupancy = booked / total_rooms * 100 if total_rooms else 0
+        adr = revenue / booked / 100 if booked else 0
+        revpar = revenue / total_rooms / 100 if total_rooms else 0
+        print(f"{format_date(night):<12} {f'{booked}/{total_rooms}':>10} {occupancy:>9.2f}% ₱{adr:>12,.2f} ₱{revpar:>12,.2f}")
+    
+    print("\nOccupancy by Room Type (whole window):")
+    print_separator()
+    print(f"{'Room Type':<22} {'Room-Nights':>14} {'Occupancy':>10} {'ADR':>12} {'RevPAR':>12}")
+    print_separator()
+    for room_type, (rooms_sold, cents) in type_totals.items():
+        rooms_available = type_rooms[room_type] * len(nights)
+        occupancy = rooms_sold / rooms_available * 100 if rooms_available else 0
+        adr = cents / rooms_sold / 100 if rooms_sold else 0
+        revpar = cents / rooms_available / 100 if rooms_available else 0
+        print(f"{room_type:<22} {f'{rooms_sold}/{rooms_available}':>14} {occupancy:>9.2f}% ₱{adr:>10,.2f} ₱{revpar:>10,.2f}")
+
+
+def display_room_optimizer():
+    """
+    Shows how much tidier the room calendars would get if future bookings were moved
+    between rooms of the same type (see optimize_room_assignments), then moves them if the user agrees
+    """
+    print("\n")
+    print_separator()
+    print("ROOM ASSIGNMENT OPTIMIZER")
+    print_separator()
+    
+    first_night = validate_date_input("First Night (DD/MM/YYYY): ")
+    horizon = validate_integer_input("How many nights ahead (1-366, usually 90): ", min_val=1, max_val=366)
     
-    for key in available_rooms:
-        total_rooms += len(available_rooms[key])
+    report = optimize_room_assignments(first_night, horizon, apply=False)
     
-    # Count occupied rooms (with active reservations)
-    occupied_set = []
-    for res in reservations_list:
-        if res["status"] == "Active" and res["room_number"] not in occupied_set:
-            occupied_set.append(res["room_number"])
-            occupied_rooms += 1
+    print(f"\nBookings checking in {report['first_night']} - {report['last_night']}: {report['stays_considered']}")
+    print(f"\n{'Room Type':<22} {'Gaps':>11} {'Orphan Nights':>15} {'Longest Gap':>13} {'Moves':>7}")
+    print_separator()
+    for room_type, figures in list(report["room_types"].items()) + [("TOTAL", report)]:
+        before = figures["before"]
+        after = figures["after"]
+        print(f"{room_type:<22} {before['free_gaps']:>4} -> {after['free_gaps']:<4} "
+              f"{before['orphan_nights']:>6} -> {after['orphan_nights']:<5} "
+              f"{before['longest_gap']:>4} -> {after['longest_gap']:<4} {figures['moved']:>7}")
+    print_separator()
     
-    occupancy_rate = (occupied_rooms / total_rooms * 100) if total_rooms > 0 else 0
+    if not report["moved"]:
+        print("\nThe rooms are already assigned as well as the optimizer can do.")
+        return
     
-    print(f"Total Rooms: {total_rooms}")
-    print(f"Occupied Rooms: {occupied_rooms}")
-    print(f"Available Rooms: {total_rooms - occupied_rooms}")
-    print(f"Occupancy Rate: {occupancy_rate:.2f}%")
+    confirm = validate_string_input(f"\nMove {report['moved']} booking(s) to their new rooms? (yes/no): ", min_length=2, max_length=3)
+    if confirm.lower() != "yes":
+        print("\nNo bookings were moved.")
+        return
     
-    print("\nOccupancy by Room Type:")
-    for key, info in room_types.items():
-        total = len(available_rooms[key])
-        occupied = 0
-        for res in reservations_list:
-            if res["status"] == "Active" and res["room_type"] == info["type"]:
-                occupied += 1
-        print(f"  {info['type']}: {occupied}/{total} occupied")
+    report = optimize_room_assignments(first_night, horizon)
+    print(f"\n✓ {report['moved']} booking(s) moved. Orphan nights: {report['before']['orphan_nights']} -> {report['after']['orphan_nights']}")
+
+
+def display_rate_calendar():
+    """Shows the rate rules in use and each room type's price for every night of a window"""
+    print("\n")
+    print_separator()
+    print("RATE CALENDAR")
+    print_separator()
+    
+    if rate_rules:
+        print("\nRate rules (edit them in the rates file or with the set_rates batch operation):")
+        for rule in rate_rules:
+            if rule["kind"] == "weekday":
+                when = ", ".join(rule["weekdays"])
+            else:
+                when = f"{rule['first_day']} - {rule['last_day']}"
+            types = ", ".join(rule["room_types"]) if rule.get("room_types") else "all"
+            print(f"  {rule.get('name', ''):<18} {rule['kind']:<8} {when:<25} {rule['percent']:+}%   room types: {types}")
+    else:
+        print("\nNo rate rules - every night has the normal price.")
+    
+    first_night = validate_date_input("\nFirst Night (DD/MM/YYYY): ")
+    count = validate_integer_input("How many nights (1-31): ", min_val=1, max_val=31)
+    
+    print(f"\n{'Night':<12} {'Day':<5}" + "".join(f"{'Type ' + key:>12}" for key in room_types))
+    print_separator()
+    for night in range(first_night, first_night + count):
+        rates = "".join(f"{get_stay_price(key, night, night + 1):>12,.2f}" for key in room_types)
+        print(f"{format_date(night):<12} {weekday_names[(night - 1) % 7]:<5}{rates}")
+    print_separator()
+
+
+def get_revenue_summary():
+    """
+    Booked revenue - how many reservations there are (active / cancelled) and what they're
+    worth, overall and per room type. Returns a dictionary (amounts in pesos)
+    """
+    summary = {
+        "reservation_count": 0,
+        "active_count": 0,
+        "cancelled_count": 0,
+        "total_revenue": 0,
+        "active_revenue": 0,
+        "type_revenues": {}
+    }
+    type_revenues = summary["type_revenues"]
+    
+    if db_connection is not None:
+        query = ("SELECT room_type, status = 'Active', COUNT(*), SUM(total_cost) "
+                 "FROM reservations GROUP BY room_type, status = 'Active'")
+        for room_type, is_active, count, revenue in db_connection.execute(query):
+            summary["reservation_count"] += count
+            summary["total_revenue"] += revenue
+            type_revenues[room_type] = type_revenues.get(room_type, 0) + revenue
+            if is_active:
+                summary["active_revenue"] += revenue
+            else:
+                summary["cancelled_count"] += count
+    else:
+        # Straight from the running totals
+        summary["reservation_count"] = ledger["reservation_count"]
+        summary["total_revenue"] = ledger["revenue_total"] / 100
+        summary["active_revenue"] = ledger["active_revenue"] / 100
+        summary["cancelled_count"] = ledger["reservation_count"] - ledger["status_counts"].get("Active", 0)
+        for room_type, cents in ledger["type_revenues"].items():
+            type_revenues[room_type] = cents / 100
+    
+    summary["active_count"] = summary["reservation_count"] - summary["cancelled_count"]
+    return summary
 
 
 def display_revenue_report():
@@ -2301,32 +5816,22 @@ def display_revenue_report():
     print("REVENUE REPORT")
     print_separator()
     
-    total_revenue = 0
-    active_revenue = 0
-    cancelled_count = 0
-    
-    for res in reservations_list:
-        total_revenue += res["total_cost"]
-        if res["status"] == "Active":
-            active_revenue += res["total_cost"]
-        else:
-            cancelled_count += 1
+    summary = get_revenue_summary()
+    reservation_count = summary["reservation_count"]
+    total_revenue = summary["total_revenue"]
     
-    print(f"Total Reservations: {len(reservations_list)}")
-    print(f"Active Reservations: {len(reservations_list) - cancelled_count}")
-    print(f"Cancelled Reservations: {cancelled_count}")
+    print(f"Total Reservations: {reservation_count}")
+    print(f"Active Reservations: {summary['active_count']}")
+    print(f"Cancelled Reservations: {summary['cancelled_count']}")
     print()
     print(f"Total Revenue (All): ₱{total_revenue:,.2f}")
-    print(f"Active Revenue: ₱{active_revenue:,.2f}")
-    print(f"Average per Reservation: ₱{total_revenue / len(reservations_list):,.2f}" if reservations_list else "N/A")
+    print(f"Active Revenue: ₱{summary['active_revenue']:,.2f}")
+    print(f"Average per Reservation: ₱{total_revenue / reservation_count:,.2f}" if reservation_count else "N/A")
     
     # Revenue by room type
     print("\nRevenue by Room Type:")
     for key, info in room_types.items():
-        type_revenue = 0
-        for res in reservations_list:
-            if res["room_type"] == info["type"]:
-                type_revenue += res["total_cost"]
+        type_revenue = summary["type_revenues"].get(info["type"], 0)
         if type_revenue > 0:
             print(f"  {info['type']}: ₱{type_revenue:,.2f}")
 
@@ -2338,20 +5843,13 @@ def display_guest_statistics():
     print("GUEST STATISTICS")
     print_separator()
     
-    total_guests = 0
-    guest_count_distribution = {}
-    
-    for res in reservations_list:
-        if res["status"] == "Active":
-            total_guests += res["num_guests"]
-            
-            if res["num_guests"] not in guest_count_distribution:
-                guest_count_distribution[res["num_guests"]] = 0
-            guest_count_distribution[res["num_guests"]] += 1
+    # Straight from the running totals (active reservations only)
+    total_guests = ledger["active_guests"]
+    guest_count_distribution = ledger["guest_count_distribution"]
     
     print(f"Total Guests (Active Reservations): {total_guests}")
     
-    active_count = len(reservations_list) - sum(1 for r in reservations_list if r['status'] == 'Cancelled')
+    active_count = ledger["reservation_count"] - ledger["status_counts"].get("Cancelled", 0)
     if active_count > 0:
         print(f"Average Guests per Reservation: {total_guests / active_count:.2f}")
     else:
@@ -2365,6 +5863,677 @@ def display_guest_statistics():
         print("  No active reservations")
 
 
+# ============================================================
+# BENCHMARKS
+# ============================================================
+
+def build_dict_reservations(count):
+    """Builds reservations the old way: a 19-key dict with nested date/time dicts"""
+    records = []
+    for i in range(count):
+        records.append({
+            "id": f"RES{1000 + i}",
+            "guest_name": f"Guest Number {i}",
+            "phone": f"0917{i:07d}",
+            "email": f"guest{i}@example.com",
+            "num_guests": 2,
+            "room_type": "Standard Double",
+            "room_number": 201 + i % 6,
+            "check_in_date": {"day": 1, "month": 3, "year": 2026, "formatted": f"01/03/{2026 + i % 10}"},
+            "check_out_date": {"day": 4, "month": 3, "year": 2026, "formatted": f"04/03/{2026 + i % 10}"},
+            "check_in_time": {"hour": 14, "minute": 0, "formatted": f"{14 + i % 10}:00"},
+            "check_out_time": {"hour": 12, "minute": 0, "formatted": f"{12 - i % 10:02d}:00"},
+            "nights": 3,
+            "price_per_night": 2500,
+            "total_cost": 7500.0 + i,
+            "additional_charges": 0.0,
+            "total_paid": 0.0,
+            "balance": 7500.0 + i,
+            "payment_status": "Pending",
+            "status": "Active"
+        })
+    return records
+
+
+def build_slotted_reservations(count):
+    """Builds the same reservations as Reservation records (ints for dates and times)"""
+    check_in = date_to_ordinal(1, 3, 2026)
+    records = []
+    for i in range(count):
+        records.append(Reservation(
+            id=f"RES{1000 + i}",
+            guest_name=f"Guest Number {i}",
+            phone=f"0917{i:07d}",
+            email=f"guest{i}@example.com",
+            num_guests=2,
+            room_type="Standard Double",
+            room_number=201 + i % 6,
+            check_in_date=check_in + i % 3650,
+            check_out_date=check_in + i % 3650 + 3,
+            check_in_time=840 + i % 600,
+            check_out_time=720 - i % 600,
+            nights=3,
+            price_per_night=2500,
+            total_cost=7500.0 + i,
+            balance=7500.0 + i
+        ))
+    return records
+
+
+def measure_bytes_per_record(builder, count):
+    """Builds count records with tracemalloc running and returns the bytes used per record"""
+    tracemalloc.start()
+    try:
+        records = builder(count)
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del records
+    return used / count
+
+
+def benchmark_record_memory(count=1000000):
+    """
+    Compares how much memory one reservation takes as a dict vs as a Reservation record
+    Run with: python hotel_management_system_with_payment.py --benchmark-memory [count]
+    """
+    print_header("RESERVATION MEMORY BENCHMARK")
+    print(f"\nRecords per run: {count:,}")
+    
+    dict_bytes = measure_bytes_per_record(build_dict_reservations, count)
+    slotted_bytes = measure_bytes_per_record(build_slotted_reservations, count)
+    
+    print_separator()
+    print(f"{'Record Type':<30} {'Bytes/Record':>15} {'Total (MB)':>15}")
+    print_separator()
+    print(f"{'dict + nested dicts (before)':<30} {dict_bytes:>15,.1f} {dict_bytes * count / 1048576:>15,.1f}")
+    print(f"{'Reservation (__slots__)':<30} {slotted_bytes:>15,.1f} {slotted_bytes * count / 1048576:>15,.1f}")
+    print_separator()
+    print(f"Memory saved: {dict_bytes / slotted_bytes:.1f}x smaller per reservation")
+
+
+def find_double_bookings():
+    """
+    Looks for active reservations that share a room on the same night
+    Goes through each room's reservations by check-in date (without trusting the calendars),
+    remembering the stay that ends last so far
+    Returns a list of (room, reservation ID, reservation ID) for every clash found
+    """
+    clashes = []
+    for room, reservations in room_reservations.items():
+        active = sorted([res for res in reservations if res.status == "Active"], key=lambda res: res.check_in_date)
+        latest = None
+        for res in active:
+            if latest is not None and res.check_in_date < latest.check_out_date:
+                clashes.append((room, latest.id, res.id))
+            if latest is None or res.check_out_date > latest.check_out_date:
+                latest = res
+    return clashes
+
+
+def booking_worker(number, attempts, first_night, start_line, results):
+    """
+    One booker thread for benchmark_concurrent_booking
+    Waits at start_line so every thread starts together, then keeps booking the same
+    two weeks (half the time asking for a particular room) and cancels every 10th booking
+    so rooms keep freeing up and being fought over again
+    Every change is committed to the journal before the next attempt, like a front desk
+    waiting for "saved" before telling the guest
+    """
+    booked = 0
+    rejected = 0
+    start_line.wait()
+    for attempt in range(attempts):
+        room_type_key = str(1 + (number + attempt) % 5)
+        check_in = first_night + (number * 7 + attempt * 3) % 14
+        room_number = None
+        if attempt % 2:
+            rooms = available_rooms[room_type_key]
+            room_number = rooms[(number + attempt) % len(rooms)]
+        try:
+            reservation = book("Stress Tester", "09170000000", "stress@test.com", 1, room_type_key,
+                               check_in, check_in + 1 + attempt % 3, room_number)
+            booked += 1
+            commit_changes()
+            if attempt % 10 == 0:
+                cancel(reservation.id)
+                commit_changes()
+        except EngineError:
+            rejected += 1
+    results[number] = (booked, rejected)
+
+
+def benchmark_concurrent_booking(threads=32, attempts=300):
+    """
+    Stress test: lots of threads book the same few rooms for the same two weeks at once
+    Afterwards every room is checked for double bookings and the running totals are recounted
+    Run with: python hotel_management_system_with_payment.py --benchmark-booking [threads]
+    (the journal goes to a scratch folder that's removed afterwards - the hotel's data isn't touched)
+    """
+    print_header("CONCURRENT BOOKING STRESS TEST")
+    print(f"\nBooker threads: {threads}, attempts per thread: {attempts:,}")
+    
+    folder = tempfile.mkdtemp()
+    journal_path = os.path.join(folder, JOURNAL_FILE)
+    start_persistence(journal_path, None)
+    first_night = date_to_ordinal(1, 3, 2026)
+    start_line = threading.Barrier(threads)
+    results = [None] * threads
+    workers = [threading.Thread(target=booking_worker, args=(number, attempts, first_night, start_line, results))
+               for number in range(threads)]
+    
+    # Switch between threads as often as possible, so any race would show up
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(0.000001)
+    started = time.perf_counter()
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        stop_persistence()
+        os.remove(journal_path)
+        os.rmdir(folder)
+    seconds = time.perf_counter() - started
+    
+    booked = sum(result[0] for result in results)
+    rejected = sum(result[1] for result in results)
+    clashes = find_double_bookings()
+    mismatches = verify_ledger()
+    
+    print_separator()
+    print(f"Booked: {booked:,}   Rejected (room taken): {rejected:,}")
+    print(f"Time: {seconds:.2f}s ({threads * attempts / seconds:,.0f} attempts/sec, {booked / seconds:,.0f} bookings saved/sec)")
+    print(f"Double bookings found: {len(clashes)}")
+    for room, first_id, second_id in clashes[:10]:
+        print(f"  Room {room}: {first_id} and {second_id} overlap")
+    print(f"Running totals match a full recount: {'yes' if not mismatches else 'NO - ' + ', '.join(mismatches)}")
+    print_separator()
+
+
+def add_benchmark_rooms(total_rooms):
+    """Adds made-up rooms (numbered from 1000 up) to the room types in turn until the hotel has total_rooms"""
+    type_keys = list(available_rooms)
+    count = sum(len(rooms) for rooms in available_rooms.values())
+    number = 1000
+    while count < total_rooms:
+        type_key = type_keys[count % len(type_keys)]
+        available_rooms[type_key].append(number)
+        room_bits[number] = (type_key, 1 << (len(available_rooms[type_key]) - 1))
+        number += 1
+        count += 1
+
+
+def benchmark_room_optimizer(total_rooms=1000, horizon=90):
+    """
+    Times the room assignment optimizer on a big made-up hotel
+    Fills the next horizon nights with stays put in random rooms (not locked, so they can
+    still move), then runs optimize_room_assignments over them
+    Run with: python hotel_management_system_with_payment.py --benchmark-assign [rooms]
+    (nothing is saved - the rooms and bookings only live in memory while the test runs)
+    """
+    print_header("ROOM ASSIGNMENT OPTIMIZER BENCHMARK")
+    add_benchmark_rooms(total_rooms)
+    first_night = date_to_ordinal(1, 3, 2026)
+    type_keys = list(available_rooms)
+    picker = random.Random(2026)
+    
+    started = time.perf_counter()
+    for _ in range(total_rooms * horizon // 3):
+        check_in = first_night + picker.randrange(horizon)
+        check_out = check_in + picker.choice((1, 1, 2, 2, 3, 3, 4, 5, 7))
+        room_type_key = picker.choice(type_keys)
+        free = find_available_rooms(room_type_key, check_in, check_out)
+        if free:
+            book("Benchmark Guest", "09170000000", "bench@test.com", 1, room_type_key,
+                 check_in, check_out, picker.choice(free), lock_room=False)
+    print(f"\nRooms: {total_rooms:,}, nights: {horizon}, bookings: {len(reservations_list):,} "
+          f"(made in {time.perf_counter() - started:.2f}s)")
+    
+    started = time.perf_counter()
+    report = optimize_room_assignments(first_night, horizon)
+    seconds = time.perf_counter() - started
+    
+    print_separator()
+    print(f"{'':<16} {'Gaps':>8} {'Orphan Nights':>15} {'Longest Gap':>13} {'Empty Rooms':>13}")
+    for side in ("before", "after"):
+        figures = report[side]
+        print(f"{side.capitalize():<16} {figures['free_gaps']:>8,} {figures['orphan_nights']:>15,} "
+              f"{figures['longest_gap']:>13} {figures['empty_rooms']:>13}")
+    print_separator()
+    print(f"Bookings moved: {report['moved']:,} of {report['stays_considered']:,} in {seconds:.2f}s")
+    print(f"Double bookings found: {len(find_double_bookings())}")
+    mismatches = verify_ledger()
+    print(f"Running totals match a full recount: {'yes' if not mismatches else 'NO - ' + ', '.join(mismatches)}")
+    print_separator()
+
+
+# ============================================================
+# BATCH MODE (NO MENUS)
+# ============================================================
+# Runs a script of engine operations with no menus, prompts or pauses, for night
+# audits and data fixes. Run with:
+#   python hotel_management_system_with_payment.py --batch [script] [--db [path]]
+# The script is read from a file (or from stdin if it's left out or is "-"), one
+# operation per line, written either as JSON:
+#   {"op": "book", "guest_name": "Ann Lee", "num_guests": 1, "room_type_key": "1", ...}
+# or as a simple command - the operation name, then name=value pairs (use quotes around
+# values with spaces):
+#   book guest_name="Ann Lee" num_guests=1 room_type_key=1 check_in=01/03/2026 check_out=05/03/2026
+# The names are the engine function's parameters. Empty lines and lines starting with # are skipped.
+# Every operation writes one JSON line to stdout: {"line": 3, "ok": true, "result": {...}}
+# or {"line": 3, "ok": false, "error": "room_unavailable", "message": "..."}
+
+# Operation name -> engine function
+batch_operations = {
+    "book": book,
+    "group_book": book_group,
+    "pay": pay,
+    "charge": add_charge,
+    "refund": refund,
+    "change_dates": change_dates,
+    "change_room": change_room,
+    "change_guests": change_guests,
+    "update_contact": update_contact,
+    "cancel": cancel,
+    "delete": delete,
+    "query": query,
+    "quote": get_quotes,
+    "set_rates": set_rate_rules,
+    "rates": get_nightly_rates,
+    "payment_summary": get_payment_summary,
+    "revenue_summary": get_revenue_summary,
+    "outstanding": get_outstanding_page,
+    "date_range_revenue": get_date_range_revenue,
+    "monthly_revenue": get_monthly_revenue,
+    "occupancy": get_occupancy_report,
+    "optimize_rooms": optimize_room_assignments
+}
+
+# The same few dates and times come up over and over in a script, so each
+# text <-> number conversion is only worked out once
+batch_conversions = {}
+
+
+def parse_batch_date(value):
+    """parse_date, remembering the answer for next time"""
+    key = ("date", value)
+    if key not in batch_conversions:
+        batch_conversions[key] = parse_date(value)
+    return batch_conversions[key]
+
+
+def parse_batch_time(value):
+    """parse_time, remembering the answer for next time"""
+    key = ("time", value)
+    if key not in batch_conversions:
+        batch_conversions[key] = parse_time(value)
+    return batch_conversions[key]
+
+
+def parse_batch_flag(value):
+    """Turns yes/no, true/false or 1/0 into True or False"""
+    if value.lower() in ("yes", "true", "1"):
+        return True
+    if value.lower() in ("no", "false", "0"):
+        return False
+    raise ValueError(f"Expected yes or no, got {value}")
+
+
+def format_batch_date(ordinal):
+    """format_date, remembering the answer for next time"""
+    if ordinal not in batch_conversions:
+        batch_conversions[ordinal] = format_date(ordinal)
+    return batch_conversions[ordinal]
+
+
+# Values that aren't plain text get converted: dates from DD/MM/YYYY, times from HH:MM
+batch_field_types = {
+    "num_guests": int, "party_size": int, "room_number": int, "new_room": int,
+    "start": int, "count": int, "horizon": int, "year": int, "apply": parse_batch_flag,
+    "lock_room": parse_batch_flag,
+    "amount": float,
+    "check_in": parse_batch_date, "check_out": parse_batch_date,
+    "check_in_from": parse_batch_date, "check_in_to": parse_batch_date,
+    "payment_date": parse_batch_date, "refund_date": parse_batch_date,
+    "first_day": parse_batch_date, "last_day": parse_batch_date,
+    "first_night": parse_batch_date, "last_night": parse_batch_date,
+    "check_in_time": parse_batch_time, "check_out_time": parse_batch_time,
+    "payment_time": parse_batch_time, "refund_time": parse_batch_time
+}
+
+# Record fields that hold day numbers or minutes, shown as DD/MM/YYYY and HH:MM in the results
+date_fields = ("check_in_date", "check_out_date", "payment_date")
+time_fields = ("check_in_time", "check_out_time", "payment_time")
+
+# Reads every field of a record in one go (much faster than one getattr per field)
+record_getters = {
+    Reservation: operator.attrgetter(*Reservation.__slots__),
+    Payment: operator.attrgetter(*Payment.__slots__)
+}
+
+# One JSON writer for all the result lines (json.dumps with options makes a new one every time)
+batch_encoder = json.JSONEncoder(ensure_ascii=False)
+
+# Save (commit) after this many operations, so a crash halfway through a long script
+# only loses the last few
+BATCH_COMMIT_EVERY = 1000
+
+
+def parse_batch_line(line):
+    """
+    Turns one script line into (operation name, {parameter: value})
+    Raises ValueError if the line can't be understood
+    """
+    if line.startswith("{"):
+        fields = json.loads(line)
+        if not isinstance(fields, dict):
+            raise ValueError("A JSON line must be an object.")
+        op = fields.pop("op", None)
+    else:
+        # Quotes are rare, so only use the (slower) shlex splitter when there are some
+        words = shlex.split(line) if '"' in line or "'" in line else line.split()
+        op = words[0]
+        fields = {}
+        for word in words[1:]:
+            name, equals, value = word.partition("=")
+            if not equals:
+                raise ValueError(f"Expected name=value, got {word}")
+            fields[name] = value
+    return op, fields
+
+
+def record_to_dict(record):
+    """A reservation or payment as a plain dictionary for the JSON results"""
+    values = dict(zip(record.__slots__, record_getters[type(record)](record)))
+    for field in date_fields:
+        if field in values:
+            values[field] = format_batch_date(values[field])
+    for field in time_fields:
+        if field in values:
+            values[field] = format_time(values[field])
+    return values
+
+
+def run_operation(op, fields):
+    """
+    Runs one operation by name with its parameters (text values are converted first)
+    Gives back {"ok": True, "result": ...} or {"ok": False, "error": code, "message": ...}
+    Records in the result are turned into plain dictionaries, ready for JSON
+    """
+    function = batch_operations.get(op)
+    if function is None:
+        return {"ok": False, "error": "bad_command", "message": f"Unknown operation: {op}"}
+    
+    try:
+        for name, value in fields.items():
+            convert = batch_field_types.get(name)
+            if convert is not None and isinstance(value, str):
+                fields[name] = convert(value)
+        result = function(**fields)
+        # (records are copied into dictionaries while holding the lock, so another thread
+        # can't change one halfway through - the engine call itself takes the locks it needs)
+        with engine_lock:
+            if isinstance(result, Record):
+                result = record_to_dict(result)
+            elif isinstance(result, list):
+                result = [record_to_dict(item) if isinstance(item, Record) else item for item in result]
+    except EngineError as error:
+        return {"ok": False, "error": error.code, "message": error.message}
+    except Exception as error:
+        # Bad dates or numbers, missing or unknown parameter names, and so on end up here
+        return {"ok": False, "error": "bad_command", "message": str(error)}
+    return {"ok": True, "result": result}
+
+
+def run_batch_line(line_number, line):
+    """Runs one script line and gives back its result as a dictionary"""
+    try:
+        op, fields = parse_batch_line(line)
+    except ValueError as error:
+        return {"line": line_number, "ok": False, "error": "bad_command", "message": str(error)}
+    result = {"line": line_number}
+    result.update(run_operation(op, fields))
+    return result
+
+
+def run_batch(script_path="-", db_path=None):
+    """
+    Runs every operation in a script and writes one JSON result line for each to stdout
+    A summary (operations, errors, operations per second) goes to stderr at the end
+    """
+    if db_path:
+        start_database(db_path)
+    else:
+        start_persistence()
+    
+    script = sys.stdin if script_path == "-" else open(script_path, encoding="utf-8")
+    output = sys.stdout
+    count = 0
+    errors = 0
+    started = time.perf_counter()
+    try:
+        for line_number, line in enumerate(script, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            
+            result = run_batch_line(line_number, line)
+            output.write(batch_encoder.encode(result) + "\n")
+            count += 1
+            if not result["ok"]:
+                errors += 1
+            if count % BATCH_COMMIT_EVERY == 0:
+                commit_changes()
+        
+        commit_changes()
+    finally:
+        if script is not sys.stdin:
+            script.close()
+        output.flush()
+        stop_database()
+        stop_persistence()
+    
+    seconds = time.perf_counter() - started
+    rate = count / seconds if seconds > 0 else 0
+    print(f"{count} operation(s), {errors} error(s) in {seconds:.2f}s ({rate:,.0f} operations/sec)", file=sys.stderr)
+    print_ledger_mismatches()
+
+
+def print_ledger_mismatches():
+    """With --verify-ledger, prints (to stderr) any running totals that don't match a full recount"""
+    if ledger_verify:
+        for mismatch in verify_ledger():
+            print(f"Ledger mismatch: {mismatch}", file=sys.stderr)
+
+
+# ============================================================
+# NETWORK SERVICE (SEVERAL TERMINALS AT ONCE)
+# ============================================================
+# Lets several front desks (and the booking website) work on the same data at the same
+# time. Run with:
+#   python hotel_management_system_with_payment.py --serve [port] [--db [path]]
+# Everything runs in one asyncio event loop, and each operation runs from start to finish
+# without stopping, so two requests can never get in each other's way halfway through.
+# Saving to disk happens in a background thread (see commit_regularly), so no desk waits for it.
+# Clients can talk to it in two ways on the same port:
+# - JSON lines: send operations exactly like batch mode lines (JSON or commands), one per
+#   line, and get one JSON line back for each, in the same order. Many lines can be sent
+#   without waiting for the answers (pipelining).
+# - HTTP: POST /book (or POST / with "op" in the body) with the parameters as a JSON body,
+#   or GET /query?status=Active for the operations that only read. Keep-alive connections
+#   and pipelined requests both work.
+# Backpressure: answers are only sent as fast as the client reads them. If a client stops
+# reading, we stop reading its requests (and the network pushes back on the client),
+# while every other connection keeps going.
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+
+# Longest request line (or HTTP header line) we accept, in bytes
+SERVICE_LINE_LIMIT = 64 * 1024
+
+# Most header lines we read for one HTTP request (a client can't keep sending them forever)
+SERVICE_HEADER_LIMIT = 100
+
+# Largest HTTP body we accept, in bytes
+SERVICE_BODY_LIMIT = 1024 * 1024
+
+# Once this many bytes of answers are waiting to be sent to a client, we wait for it to catch up
+SERVICE_WRITE_LIMIT = 256 * 1024
+
+# After this many requests in a row from one connection, let the other connections have a turn
+SERVICE_REQUESTS_PER_TURN = 64
+
+# Operations a plain GET may run (they never change anything)
+read_operations = {"query", "quote", "rates", "payment_summary", "revenue_summary", "outstanding", "date_range_revenue", "monthly_revenue", "occupancy"}
+
+# HTTP status for each error code (anything else is a business rule that said no)
+http_statuses = {"bad_command": 400, "not_found": 404, "not_allowed": 405}
+http_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict"}
+
+
+async def handle_http_request(request_line, reader, writer):
+    """
+    Answers one HTTP request (its first line has already been read)
+    Returns True if the connection stays open for more requests
+    """
+    parts = request_line.split()
+    headers = {}
+    header_lines = 0
+    while header_lines <= SERVICE_HEADER_LIMIT:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        header_lines += 1
+        name, colon, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    
+    length_text = headers.get("content-length", "0")
+    length = int(length_text) if length_text.isdigit() else -1
+    if len(parts) != 3 or header_lines > SERVICE_HEADER_LIMIT or length < 0 or length > SERVICE_BODY_LIMIT:
+        result = {"ok": False, "error": "bad_command", "message": "Bad HTTP request."}
+        keep_open = False
+    else:
+        method, target, version = parts
+        body = await reader.readexactly(length) if length else b""
+        path, question, query_string = target.partition("?")
+        op = path.strip("/")
+        keep_open = headers.get("connection", "").lower() != "close" if version == "HTTP/1.1" else \
+            headers.get("connection", "").lower() == "keep-alive"
+        try:
+            fields = json.loads(body) if body else {}
+            if not isinstance(fields, dict):
+                raise ValueError("The body must be a JSON object.")
+            fields.update(urllib.parse.parse_qsl(query_string))
+            if not op:
+                op = fields.pop("op", None)
+            if method == "GET" and op not in read_operations:
+                result = {"ok": False, "error": "not_allowed", "message": f"Use POST for {op}."}
+            elif method not in ("GET", "POST"):
+                result = {"ok": False, "error": "not_allowed", "message": f"Method {method} is not supported."}
+            else:
+                result = run_operation(op, fields)
+        except ValueError as error:
+            result = {"ok": False, "error": "bad_command", "message": str(error)}
+    
+    status = 200 if result["ok"] else http_statuses.get(result["error"], 409)
+    body = batch_encoder.encode(result).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {http_reasons[status]}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_open else 'close'}\r\n\r\n".encode("latin-1") + body
+    )
+    return keep_open
+
+
+async def handle_connection(reader, writer):
+    """Serves one client connection until it closes (see the notes at the top of this section)"""
+    writer.transport.set_write_buffer_limits(high=SERVICE_WRITE_LIMIT)
+    line_number = 0
+    requests_this_turn = 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line_number += 1
+            text = line.decode("utf-8").strip()
+            if not text or text.startswith("#"):
+                continue
+            
+            if text.startswith(("GET ", "POST ", "PUT ", "DELETE ")) and text.endswith(("HTTP/1.1", "HTTP/1.0")):
+                if not await handle_http_request(text, reader, writer):
+                    break
+            else:
+                writer.write(batch_encoder.encode(run_batch_line(line_number, text)).encode("utf-8") + b"\n")
+            
+            # Waits only if the client has fallen behind reading its answers
+            await writer.drain()
+            
+            requests_this_turn += 1
+            if requests_this_turn >= SERVICE_REQUESTS_PER_TURN:
+                requests_this_turn = 0
+                await asyncio.sleep(0)
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        # Client went away, or sent a line longer than SERVICE_LINE_LIMIT
+        pass
+    except asyncio.CancelledError:
+        # The service is shutting down
+        pass
+    finally:
+        writer.close()
+
+
+async def commit_regularly():
+    """
+    Group commit for the whole service: saves all waiting changes every JOURNAL_GROUP_SECONDS
+    The disk write runs in a worker thread, so every desk keeps being served while it happens
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(JOURNAL_GROUP_SECONDS)
+        await loop.run_in_executor(None, commit_changes)
+
+
+async def serve(host, port):
+    """Starts listening and keeps serving until the program is stopped"""
+    global journal_background
+    
+    server = await asyncio.start_server(handle_connection, host, port, limit=SERVICE_LINE_LIMIT)
+    journal_background = True
+    committer = asyncio.create_task(commit_regularly())
+    print(f"Hotel service listening on {host}:{port} (Ctrl+C to stop)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        committer.cancel()
+        journal_background = False
+
+
+def run_service(port=SERVICE_PORT, db_path=None, host=SERVICE_HOST):
+    """Loads the data, runs the network service, and saves everything when it's stopped"""
+    if db_path:
+        total = start_database(db_path)
+        print(f"Opened database {db_path}: {total} reservation(s) on file, {len(reservations_list)} loaded into memory")
+    else:
+        start_persistence()
+        print(f"Loaded {len(reservations_list)} reservation(s) and {len(payments_list)} payment(s)")
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        print("\nService stopped.")
+    finally:
+        print_ledger_mismatches()
+        commit_changes()
+        stop_database()
+        stop_persistence()
+
+
 # ============================================================
 # MAIN MENU
 # ============================================================
@@ -2415,14 +6584,14 @@ def display_about():
     print("  ✓ Pure Python: No external libraries used")
     print("  ✓ Input Validation: All inputs validated with re-prompting")
     print("  ✓ Manual Date/Time: Custom date and time handling")
-    print("  ✓ Sorting Algorithms: Bubble sort implementation")
+    print("  ✓ Sorting Algorithms: Key-based O(n log n) sorting with cached sorted views")
     print("  ✓ Search Algorithms: Linear search and dictionary lookups")
     print("  ✓ Payment System: Comprehensive payment tracking and management")
     
     print("\nDATA STRUCTURES USED:")
     print("  1. Lists (Linear): Reservation & payment storage")
     print("  2. Dictionaries (Non-Linear): Room-based & reservation-based indexing")
-    print("  3. Nested Dictionaries: Complex data representation")
+    print("  3. Slotted Record Classes: Compact reservation & payment records")
     
     print("\nFEATURES:")
     print("  • Multiple room types with different capacities and prices")
@@ -2445,17 +6614,27 @@ def display_about():
     pause()
 
 
-def main():
+def main(db_path=None):
     """
     This is where everything starts!
     Shows the menu and handles what happens when you pick options
     Has error handling so the program won't crash if something goes wrong
+    Keeps data in the journal, or in a SQLite database if db_path is given
     """
     try:
         print_header("WELCOME TO HOTEL MANAGEMENT SYSTEM")
         print("\nInitializing system...")
         print("Loading data structures...")
+        if db_path:
+            total = start_database(db_path)
+            print(f"Opened database {db_path}: {total} reservation(s) on file, {len(reservations_list)} loaded into memory...")
+        else:
+            replayed = start_persistence()
+            print(f"Recovered {len(reservations_list)} reservation(s) and {len(payments_list)} payment(s) from {replayed} journal changes...")
         print("Payment system ready...")
+        if ledger_verify:
+            print("Report totals will be checked against a full recount after every change...")
+            check_ledger()
         print("System ready!")
         pause()
         
@@ -2585,8 +6764,16 @@ def main():
                     print("Goodbye!")
                     print("\n" + "=" * 70)
                     break
+                
+                # Make sure whatever that option changed is safely on disk
+                commit_changes()
+                
+                # In --verify-ledger mode, double check the running totals against a full recount
+                if ledger_verify:
+                    check_ledger()
                     
             except KeyboardInterrupt:
+                commit_changes()
                 print("\n\n⚠️  Interrupted by user. Returning to main menu...")
                 pause()
             except Exception as e:
@@ -2601,6 +6788,9 @@ def main():
         print(f"\n❌ CRITICAL ERROR: {str(e)}")
         print("System must exit. Please restart the program.")
         pause()
+    finally:
+        stop_database()
+        stop_persistence()
 
 
 # ============================================================
@@ -2609,4 +6799,29 @@ def main():
 # This is the part that actually runs when you start the program
 
 if __name__ == "__main__":
-    main()
+    arguments = sys.argv[1:]
+    if "--verify-ledger" in arguments:
+        arguments.remove("--verify-ledger")
+        ledger_verify = True
+    
+    if arguments and arguments[0] == "--benchmark-memory":
+        benchmark_record_memory(int(arguments[1]) if len(arguments) > 1 else 1000000)
+    elif arguments and arguments[0] == "--benchmark-booking":
+        benchmark_concurrent_booking(int(arguments[1]) if len(arguments) > 1 else 32)
+    elif arguments and arguments[0] == "--benchmark-assign":
+        benchmark_room_optimizer(int(arguments[1]) if len(arguments) > 1 else 1000)
+    elif arguments and arguments[0] in ("--batch", "--serve"):
+        mode_arguments = arguments[1:]
+        db_path = None
+        if "--db" in mode_arguments:
+            position = mode_arguments.index("--db")
+            db_path = mode_arguments[position + 1] if position + 1 < len(mode_arguments) else DATABASE_FILE
+            del mode_arguments[position:position + 2]
+        if arguments[0] == "--batch":
+            run_batch(mode_arguments[0] if mode_arguments else "-", db_path)
+        else:
+            run_service(int(mode_arguments[0]) if mode_arguments else SERVICE_PORT, db_path)
+    elif arguments and arguments[0] == "--db":
+        main(arguments[1] if len(arguments) > 1 else DATABASE_FILE)
+    else:
+        main()